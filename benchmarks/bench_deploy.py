@@ -0,0 +1,210 @@
+"""
+Deploy load test against the local Fabric stand-in (fake_fabric.py): generates N synthetic regions,
+deploys them with get_deploy at each requested concurrency and reports regions per minute,
+requests per endpoint, 429s and time spent waiting.
+
+    python benchmarks/bench_deploy.py --regions 50 --concurrency 1 4 8 16 --lro-s 2 --max-rps 20
+
+Every concurrency level starts from an empty fake workspace, so each run creates all items;
+--updates adds a second, forced run that updates them. --refresh-workers 1 2 4 then refreshes the
+deployed models at each refresh concurrency and reports the refresh stage wall time. --workspaces N
+spreads the regions round-robin over N fake workspaces, each with the level's concurrency as its budget.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import asdict, replace
+from pathlib import Path
+from typing import Any, Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCH_DIR.parent / "scripts"
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from fake_fabric import FakeFabric, FakeFabricConfig  # noqa: E402
+from synthetic_template import TemplateSize, write_workspace  # noqa: E402
+
+
+def _assignment(plans, workspaces: int, concurrency: int):
+    from workspaces import Workspace, WorkspaceAssignment, assign_workspaces
+
+    if workspaces <= 1:
+        return WorkspaceAssignment()
+    catalog = {f"ws{i}": Workspace(f"ws{i}", f"bench-workspace-{i}", deploy_concurrency=concurrency) for i in range(workspaces)}
+    return WorkspaceAssignment(assign_workspaces([p.region_code for p in plans], catalog, {}, "round_robin"), catalog)
+
+
+def _run_deploy(fake: FakeFabric, plans, concurrency: int, workspaces: int, *, force: bool, verbose: bool) -> Dict[str, Any]:
+    from deploy import get_deploy
+
+    fake.reset_stats()
+    out = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stdout if verbose else out):
+        assignment = _assignment(plans, workspaces, concurrency)
+        # With several workspaces each one gets `concurrency` slots, as separate capacities would.
+        result = get_deploy(plans, max_workers=None if assignment.configured else concurrency, force=force, assignment=assignment)
+    wall_s = time.perf_counter() - start
+
+    server = fake.stats()
+    limiter_wait_s = sum(st["wait_s"] for st in result.stats.get("rate_limits", {}).values())
+    return {
+        "concurrency": concurrency,
+        "workspaces": max(1, workspaces),
+        "mode": "update" if force else "create",
+        "regions": len(plans),
+        "failed": len(result.failures),
+        "wall_s": round(wall_s, 3),
+        "regions_per_min": round(len(result.deployed) / wall_s * 60, 1) if wall_s else 0.0,
+        "requests": sum(server["requests"].values()),
+        "throttled": server["statuses"].get("429", 0),
+        "limiter_wait_s": round(limiter_wait_s, 3),
+        "operation_wait_s": result.stats.get("operation_wait_s", 0.0),
+        "operation_polls": result.stats.get("operation_polls", 0),
+        "token_requests": result.stats.get("token_requests", 0),
+        "unauthorized": server["statuses"].get("401", 0),
+        "bytes_sent": server["bytes_received"],
+        "server": server,
+        "rate_limits": result.stats.get("rate_limits", {}),
+        "failures": result.failures,
+        "changed_models": result.changed_models,
+        "region_workspaces": result.workspaces,
+    }
+
+
+def _run_refresh(fake: FakeFabric, models: Dict[str, str], concurrency: int, workspaces: Dict[str, Any], *, verbose: bool) -> Dict[str, Any]:
+    from refresh import refresh_models
+
+    fake.reset_stats()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if verbose else out):
+        result = refresh_models(models, concurrency=concurrency, workspaces=workspaces)
+    return {
+        "refresh_concurrency": concurrency,
+        "workspaces": len({ws.name for ws in workspaces.values()}),
+        "models": len(models),
+        "failed": len(result.failures),
+        "wall_s": round(result.wall_s, 3),
+        "max_refresh_s": round(max((o.duration_s for o in result.outcomes), default=0.0), 3),
+        "peak_server_refreshes": fake.stats()["peak_refreshes"],
+    }
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    config = FakeFabricConfig(
+        latency_ms=args.latency_ms,
+        lro_s=args.lro_s,
+        throttle_rate=args.throttle_rate,
+        max_rps=args.max_rps,
+        error_rate=args.error_rate,
+        lro_failure_rate=args.lro_failure_rate,
+        refresh_s=args.refresh_s,
+        refresh_capacity=args.refresh_capacity,
+        token_lifetime_s=args.token_lifetime_s,
+        seed=args.seed,
+    )
+    size = TemplateSize(tables=args.tables, report_json_kb=args.report_kb)
+    cwd = Path.cwd()
+    workspace = Path(tempfile.mkdtemp(prefix="pbip-deploy-bench-"))
+    results = []
+    refreshes = []
+    try:
+        write_workspace(workspace, size, args.regions)
+        os.chdir(workspace)
+        from config_reader import get_template_info
+        from models_manager import get_expected_reports
+        from report_creator import create_model_and_report
+
+        plans = get_expected_reports()
+        with contextlib.redirect_stdout(io.StringIO()):
+            generation = create_model_and_report(get_template_info(), plans, workers=4)
+        if not generation.ok:
+            raise RuntimeError(f"Generation failed: {generation.failures}")
+
+        for concurrency in args.concurrency:
+            # Fresh service and local state per level: every level creates the same items.
+            shutil.rmtree(workspace / ".state", ignore_errors=True)
+            with FakeFabric(replace(config)) as fake:
+                os.environ.update({
+                    "AZURE_TENANT_ID": "bench-tenant",
+                    "AZURE_CLIENT_ID": "bench-client",
+                    "AZURE_CLIENT_SECRET": "bench-secret",
+                    "FABRIC_WORKSPACE_ID": "bench-workspace",
+                    "FABRIC_API_BASE_URL": f"{fake.url}/v1",
+                    "POWERBI_API_BASE_URL": f"{fake.url}/v1.0/myorg",
+                    "AZURE_AUTHORITY_HOST": fake.url,
+                })
+                print(f"Deploying {args.regions} region(s) with concurrency {concurrency}", file=sys.stderr)
+                results.append(_run_deploy(fake, plans, concurrency, args.workspaces, force=False, verbose=args.verbose))
+                if args.updates:
+                    results.append(_run_deploy(fake, plans, concurrency, args.workspaces, force=True, verbose=args.verbose))
+                # Refresh concurrency is measured once, against the models of the first level.
+                if args.refresh_workers and not refreshes:
+                    for workers in args.refresh_workers:
+                        print(f"Refreshing {len(results[0]['changed_models'])} model(s) with {workers} refresh worker(s)", file=sys.stderr)
+                        refreshes.append(_run_refresh(fake, results[0]["changed_models"], workers, results[0]["region_workspaces"], verbose=args.verbose))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workspace, ignore_errors=True)
+    return results, refreshes
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'conc':>5} {'ws':>3} {'mode':<7} {'regions':>8} {'failed':>7} {'wall s':>8} {'regions/min':>12} {'requests':>9} {'429':>5} {'limiter wait s':>15} {'op wait s':>10}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['workspaces']:>3} {r['mode']:<7} {r['regions']:>8} {r['failed']:>7} {r['wall_s']:>8.1f} {r['regions_per_min']:>12.1f} "
+            f"{r['requests']:>9} {r['throttled']:>5} {r['limiter_wait_s']:>15.1f} {r['operation_wait_s']:>10.1f}"
+        )
+
+
+def print_refreshes(refreshes: List[Dict[str, Any]]) -> None:
+    print(f"{'refresh workers':>15} {'ws':>3} {'models':>7} {'failed':>7} {'wall s':>8} {'max refresh s':>14} {'peak on server':>15}")
+    for r in refreshes:
+        print(f"{r['refresh_concurrency']:>15} {r['workspaces']:>3} {r['models']:>7} {r['failed']:>7} {r['wall_s']:>8.1f} {r['max_refresh_s']:>14.1f} {r['peak_server_refreshes']:>15}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = FakeFabricConfig()
+    parser = argparse.ArgumentParser(description="Load-test get_deploy against a local Fabric stand-in.")
+    parser.add_argument("--regions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--workspaces", type=int, default=1, help="Spread the regions over this many workspaces.")
+    parser.add_argument("--updates", action="store_true", help="Also measure a forced update run after the create run.")
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--report-kb", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--lro-s", type=float, default=defaults.lro_s)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--max-rps", type=float, default=defaults.max_rps)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--lro-failure-rate", type=float, default=defaults.lro_failure_rate)
+    parser.add_argument("--refresh-workers", type=int, nargs="*", default=[], help="Also refresh the deployed models at each of these refresh concurrencies.")
+    parser.add_argument("--refresh-s", type=float, default=defaults.refresh_s)
+    parser.add_argument("--refresh-capacity", type=int, default=defaults.refresh_capacity, help="Refreshes per workspace that run at full speed at once.")
+    parser.add_argument("--token-lifetime-s", type=int, default=defaults.token_lifetime_s, help="Lifetime of the fake service's tokens; shorter than the run to exercise token refresh.")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    parser.add_argument("--verbose", action="store_true", help="Show deploy logs.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    results, refreshes = run(args)
+    print_results(results)
+    if refreshes:
+        print_refreshes(refreshes)
+    if args.output:
+        Path(args.output).write_text(json.dumps({"deploys": results, "refreshes": refreshes}, indent=2, default=asdict), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Generation benchmark: synthesizes a template of the requested size, generates N regions from it
+and records wall time, per-phase time, bytes read/written and peak RSS per case.
+
+    python benchmarks/bench_generation.py run --regions 10 100 1000 [--tables 20 --report-kb 200 --bookmarks 10]
+    python benchmarks/bench_generation.py compare benchmarks/results/<base>.json benchmarks/results/<head>.json
+
+Every case runs in a fresh subprocess with the synthetic workspace as working directory, so
+caches, RSS and I/O counters of one case never leak into another. Results are written to
+benchmarks/results/<commit>.json (suffixed with -dirty for uncommitted trees).
+"""
+import argparse
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+SCRIPTS_DIR = REPO_ROOT / "scripts"
+RESULTS_DIR = BENCH_DIR / "results"
+
+RESULTS_VERSION = 1
+
+# Metrics checked by `compare`; lower is better for all of them.
+COMPARED_METRICS = ("wall_s", "read_bytes", "write_bytes", "peak_rss_kb")
+
+
+def _io_counters() -> Dict[str, int]:
+    # rchar/wchar count all bytes passed to read/write syscalls, page cache included.
+    try:
+        lines = Path("/proc/self/io").read_text().splitlines()
+    except OSError:
+        return {}
+    fields = dict(line.split(": ", 1) for line in lines if ": " in line)
+    return {"read_bytes": int(fields.get("rchar", 0)), "write_bytes": int(fields.get("wchar", 0))}
+
+
+def _peak_rss_kb() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+class _Phases:
+    def __init__(self) -> None:
+        self.results: Dict[str, Dict[str, Any]] = {}
+
+    def run(self, name: str, fn, *args, **kwargs):
+        io_before = _io_counters()
+        start = time.perf_counter()
+        value = fn(*args, **kwargs)
+        wall_s = time.perf_counter() - start
+        io_after = _io_counters()
+        self.results[name] = {"wall_s": round(wall_s, 6), **{k: io_after[k] - io_before[k] for k in io_after}}
+        return value
+
+
+def run_case_in_process(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs one case in the current process; the working directory must be a synthetic workspace.
+    """
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from config_reader import get_template_info
+    from generation_manifest import hash_snapshot, load_manifest, record_regions, save_manifest, split_unchanged
+    from models_manager import get_expected_reports
+    from report_creator import create_model_and_report
+    from template_snapshot import load_template_snapshot
+
+    phases = _Phases()
+    start = time.perf_counter()
+    template = phases.run("config", get_template_info)
+    plans = phases.run("plan", get_expected_reports)
+    snapshot = phases.run("snapshot", load_template_snapshot, template)
+    template_hash = phases.run("template_hash", hash_snapshot, snapshot)
+    result = phases.run(
+        "generate", create_model_and_report, template, plans,
+        workers=spec["workers"], executor=spec["executor"], snapshot=snapshot, output_mode=spec["output_mode"],
+    )
+    if not result.ok:
+        raise RuntimeError(f"Generation failed: {result.failures}")
+
+    manifest = load_manifest()
+    phases.run("manifest", lambda: (record_regions(manifest, template, template_hash, plans), save_manifest(manifest)))
+    pending, _ = phases.run("incremental_check", split_unchanged, template, template_hash, plans, manifest)
+    if pending:
+        raise RuntimeError(f"{len(pending)} region(s) not recognised as unchanged right after generation")
+
+    totals = {k: sum(p.get(k, 0) for p in phases.results.values()) for k in ("read_bytes", "write_bytes")}
+    return {
+        "wall_s": round(time.perf_counter() - start, 6),
+        **totals,
+        "peak_rss_kb": _peak_rss_kb(),
+        "phases": phases.results,
+    }
+
+
+def _case_key(spec: Dict[str, Any]) -> str:
+    return f"{spec['template']}/n{spec['regions']}/w{spec['workers']}-{spec['executor']}-{spec['output_mode']}"
+
+
+def _run_case(spec: Dict[str, Any], keep: bool) -> Dict[str, Any]:
+    from synthetic_template import TemplateSize, write_workspace
+
+    workspace = Path(tempfile.mkdtemp(prefix="pbip-bench-"))
+    try:
+        write_workspace(workspace, TemplateSize(**spec["size"]), spec["regions"])
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "_case", json.dumps(spec)],
+            cwd=workspace, capture_output=True, text=True,
+        )
+        if proc.returncode:
+            raise RuntimeError(f"Case {_case_key(spec)} failed:\n{proc.stderr}")
+        # Generation logs go to stdout as well; the measurement is the last line.
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    finally:
+        if keep:
+            print(f"  workspace kept: {workspace}", file=sys.stderr)
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _commit_label() -> str:
+    commit = _git("rev-parse", "--short=12", "HEAD") or "unknown"
+    dirty = _git("status", "--porcelain", "--untracked-files=no", "--", "scripts")
+    return f"{commit}-dirty" if dirty else commit
+
+
+def cmd_run(args: argparse.Namespace) -> None:
+    from synthetic_template import TemplateSize
+
+    size = TemplateSize(tables=args.tables, columns_per_table=args.columns, report_json_kb=args.report_kb, bookmarks=args.bookmarks)
+    cases = []
+    for regions in args.regions:
+        for _ in range(args.repeat):
+            spec = {
+                "template": size.label(),
+                "size": vars(size),
+                "regions": regions,
+                "workers": args.workers,
+                "executor": args.executor,
+                "output_mode": args.output_mode,
+            }
+            print(f"Running {_case_key(spec)}", file=sys.stderr)
+            cases.append({"key": _case_key(spec), "spec": spec, "result": _run_case(spec, args.keep)})
+
+    label = _commit_label()
+    report = {
+        "version": RESULTS_VERSION,
+        "commit": label,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": cases,
+    }
+    out = Path(args.output) if args.output else RESULTS_DIR / f"{label}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    _print_cases(cases)
+    print(f"Results written to {out}")
+
+
+def _print_cases(cases: List[Dict[str, Any]]) -> None:
+    print(f"{'case':<48} {'wall s':>9} {'generate s':>11} {'read MB':>9} {'written MB':>11} {'peak RSS MB':>12}")
+    for case in cases:
+        r = case["result"]
+        print(
+            f"{case['key']:<48} {r['wall_s']:>9.3f} {r['phases']['generate']['wall_s']:>11.3f} "
+            f"{r.get('read_bytes', 0) / 1e6:>9.1f} {r.get('write_bytes', 0) / 1e6:>11.1f} {r['peak_rss_kb'] / 1024:>12.1f}"
+        )
+
+
+def _best_by_key(report: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    # With --repeat, the fastest run of a case is compared; slower runs are noise.
+    best: Dict[str, Dict[str, Any]] = {}
+    for case in report["cases"]:
+        current = best.get(case["key"])
+        if current is None or case["result"]["wall_s"] < current["wall_s"]:
+            best[case["key"]] = case["result"]
+    return best
+
+
+def cmd_compare(args: argparse.Namespace) -> None:
+    base = _best_by_key(json.loads(Path(args.base).read_text(encoding="utf-8")))
+    head = _best_by_key(json.loads(Path(args.head).read_text(encoding="utf-8")))
+
+    regressions = []
+    print(f"{'case':<48} {'metric':<12} {'base':>14} {'head':>14} {'change':>8}")
+    for key in sorted(set(base) & set(head)):
+        for metric in COMPARED_METRICS:
+            old, new = base[key].get(metric), head[key].get(metric)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            flag = ""
+            if change > args.threshold and new - old > (args.min_wall_s if metric == "wall_s" else 0):
+                flag = "  REGRESSION"
+                regressions.append((key, metric))
+            print(f"{key:<48} {metric:<12} {old:>14,.3f} {new:>14,.3f} {change:>+7.1%}{flag}")
+    for key in sorted(set(base) ^ set(head)):
+        print(f"{key:<48} only in {'base' if key in base else 'head'}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark region generation on synthetic templates.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run benchmark cases and store the results.")
+    run.add_argument("--regions", type=int, nargs="+", default=[10, 100], help="Numbers of regions to generate (default: 10 100).")
+    run.add_argument("--tables", type=int, default=20, help="TMDL tables in the synthetic model (default: 20).")
+    run.add_argument("--columns", type=int, default=12, help="Columns per table (default: 12).")
+    run.add_argument("--report-kb", type=int, default=200, help="Approximate size of report.json in KB (default: 200).")
+    run.add_argument("--bookmarks", type=int, default=10, help="Number of bookmarks (default: 10).")
+    run.add_argument("--workers", type=int, default=1, help="Generation workers (default: 1).")
+    run.add_argument("--executor", choices=("thread", "process"), default="thread")
+    run.add_argument("--output-mode", choices=("copy", "hardlink", "reflink"), default="copy")
+    run.add_argument("--repeat", type=int, default=1, help="Runs per case; compare uses the fastest (default: 1).")
+    run.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json).")
+    run.add_argument("--keep", action="store_true", help="Keep the synthetic workspaces for inspection.")
+    run.set_defaults(func=cmd_run)
+
+    compare = sub.add_parser("compare", help="Compare two results files; exits 1 on regressions.")
+    compare.add_argument("base")
+    compare.add_argument("head")
+    compare.add_argument("--threshold", type=float, default=0.10, help="Relative increase reported as a regression (default: 0.10).")
+    compare.add_argument("--min-wall-s", type=float, default=0.05, help="Ignore wall time increases smaller than this (default: 0.05).")
+    compare.set_defaults(func=cmd_compare)
+
+    case = sub.add_parser("_case")
+    case.add_argument("spec")
+    case.set_defaults(func=lambda a: print(json.dumps(run_case_in_process(json.loads(a.spec)))))
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    sys.path.insert(0, str(BENCH_DIR))
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Long-running operation scenarios against the local Fabric stand-in (fake_fabric.py): starts N
+operations per scenario and waits for them with one OperationTracker, through Running -> Succeeded,
+Running -> Failed and a deadline that passes while they are still running. Checks that every
+operation ends as expected, that polls follow the service's Retry-After rather than the tracker's
+default interval, and that only succeeded operations have a /result, then reports polls and wall
+time per scenario. Exits 1 when a scenario does not behave as expected.
+
+    python benchmarks/bench_operations.py --operations 50 --lro-s 2 --retry-after-s 1
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+BENCH_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCH_DIR.parent / "scripts"
+sys.path.insert(0, str(BENCH_DIR))
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+from fake_fabric import FakeFabric, FakeFabricConfig  # noqa: E402
+
+# Poll interval without Retry-After, far above the stand-in's: a scenario lasting that long ignored the header.
+DEFAULT_SLEEP_S = 30
+
+WORKSPACE_ID = "bench-workspace"
+
+
+def _client(fake: FakeFabric):
+    import requests
+    from token_provider import TokenProvider
+
+    session = requests.Session()
+
+    def fetch() -> Tuple[str, float]:
+        r = session.post(f"{fake.url}/bench-tenant/oauth2/v2.0/token", data={"grant_type": "client_credentials"}, timeout=30)
+        r.raise_for_status()
+        data = r.json()
+        return data["access_token"], float(data["expires_in"])
+
+    return session, TokenProvider(fetch)
+
+
+def _start_operation(fake: FakeFabric, session, token, display_name: str) -> str:
+    r = session.post(f"{fake.url}/v1/workspaces/{WORKSPACE_ID}/semanticModels", json={"displayName": display_name, "definition": {"parts": []}}, auth=token, timeout=30)
+    if r.status_code != 202 or not r.headers.get("Location"):
+        raise RuntimeError(f"Expected a long-running create (202 with Location), got {r.status_code}")
+    return r.headers["Location"]
+
+
+async def _wait_all(tracker, op_urls: List[str], timeout_s: int) -> List[Any]:
+    return await asyncio.gather(*(tracker.wait(url, timeout_s=timeout_s) for url in op_urls), return_exceptions=True)
+
+
+def _outcome(value: Any) -> str:
+    from fabric_operations import operation_status
+
+    if isinstance(value, BaseException):
+        return type(value).__name__
+    return operation_status(value).capitalize()
+
+
+def run_scenario(name: str, config: FakeFabricConfig, operations: int, timeout_s: int, expected: str) -> Dict[str, Any]:
+    from deploy import get_operation_result
+    from fabric_operations import OperationTracker
+
+    with FakeFabric(config) as fake:
+        session, token = _client(fake)
+        op_urls = [_start_operation(fake, session, token, f"{name}-{i}") for i in range(operations)]
+        tracker = OperationTracker(session, token, default_sleep_s=DEFAULT_SLEEP_S)
+        start = time.perf_counter()
+        outcomes = [_outcome(v) for v in asyncio.run(_wait_all(tracker, op_urls, timeout_s))]
+        wall_s = time.perf_counter() - start
+        results = [get_operation_result(session, token, url, timeout_s=30) for url in op_urls]
+
+    problems = []
+    unexpected = sorted({o for o in outcomes if o != expected})
+    if unexpected:
+        problems.append(f"ended {', '.join(unexpected)}")
+    if expected != "OperationTimeout" and tracker.poll_count <= operations:
+        # One poll per operation means the first poll already found it finished.
+        problems.append("no operation was seen running")
+    if wall_s >= DEFAULT_SLEEP_S:
+        problems.append("polls did not follow Retry-After")
+    with_result = sum(1 for r in results if r and r.get("id"))
+    if with_result != (operations if expected == "Succeeded" else 0):
+        problems.append(f"{with_result} of {operations} operation(s) have a /result")
+    return {
+        "scenario": name,
+        "operations": operations,
+        "expected": expected,
+        "outcomes": {o: outcomes.count(o) for o in sorted(set(outcomes))},
+        "polls": tracker.poll_count,
+        "with_result": with_result,
+        "wall_s": round(wall_s, 3),
+        "ok": not problems,
+        "problems": problems,
+    }
+
+
+def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    config = FakeFabricConfig(latency_ms=args.latency_ms, lro_s=args.lro_s, lro_retry_after_s=args.retry_after_s, seed=args.seed)
+    # The deadline passes while the operations are still running, after at least one Running poll.
+    deadline_s = max(1, int(args.lro_s) // 2)
+    deadline_config = replace(config, lro_s=max(config.lro_s, deadline_s + 2 * args.retry_after_s + 1))
+    scenarios = [
+        ("succeeded", config, 60, "Succeeded"),
+        ("failed", replace(config, lro_failure_rate=1.0), 60, "OperationFailed"),
+        ("deadline", deadline_config, deadline_s, "OperationTimeout"),
+    ]
+    results = []
+    for name, scenario_config, timeout_s, expected in scenarios:
+        print(f"Scenario {name}: {args.operations} operation(s)", file=sys.stderr)
+        results.append(run_scenario(name, scenario_config, args.operations, timeout_s, expected))
+    return results
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scenario':<10} {'ops':>5} {'expected':<17} {'polls':>6} {'/result':>8} {'wall s':>7}  result")
+    for r in results:
+        verdict = "ok" if r["ok"] else "FAILED: " + "; ".join(r["problems"])
+        print(f"{r['scenario']:<10} {r['operations']:>5} {r['expected']:<17} {r['polls']:>6} {r['with_result']:>8} {r['wall_s']:>7.1f}  {verdict}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = FakeFabricConfig()
+    parser = argparse.ArgumentParser(description="Drive OperationTracker through long-running operation outcomes against a local Fabric stand-in.")
+    parser.add_argument("--operations", type=int, default=10, help="Operations started and tracked at once per scenario.")
+    parser.add_argument("--lro-s", type=float, default=2.0)
+    parser.add_argument("--retry-after-s", type=int, default=defaults.lro_retry_after_s)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    results = run(args)
+    print_results(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""
+Local stand-in for the Fabric REST API and the Entra ID token endpoint, serving what deploy.py uses:
+
+    POST /{tenant}/oauth2/v2.0/token
+    GET  /v1/workspaces/{ws}/items[?type=...&continuationToken=...]
+    POST /v1/workspaces/{ws}/semanticModels | reports                       (create)
+    POST /v1/workspaces/{ws}/semanticModels | reports/{id}/updateDefinition
+    POST /v1/workspaces/{ws}/items/{id}/getDefinition
+    GET  /v1/operations/{id} and /v1/operations/{id}/result
+    POST /v1.0/myorg/groups/{ws}/datasets/{id}/refreshes                    (Power BI enhanced refresh)
+    GET  /v1.0/myorg/groups/{ws}/datasets/{id}/refreshes/{refresh id}
+
+Latency, long-running operation duration, refresh duration, token lifetime, 429 and failure rates
+are configurable. Requests with an unknown or expired bearer token are answered 401.
+Point deploy.py at it with FABRIC_API_BASE_URL=<url>/v1, POWERBI_API_BASE_URL=<url>/v1.0/myorg and
+AZURE_AUTHORITY_HOST=<url>.
+
+    python benchmarks/fake_fabric.py --port 8765 --latency-ms 40 --lro-s 2 --throttle-rate 0.05
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+@dataclass
+class FakeFabricConfig:
+    latency_ms: float = 20.0
+    latency_jitter_ms: float = 10.0
+    lro_s: float = 1.0
+    lro_retry_after_s: int = 1
+    page_size: int = 100
+    throttle_rate: float = 0.0
+    max_rps: Optional[float] = None
+    throttle_retry_after_s: int = 2
+    error_rate: float = 0.0
+    lro_failure_rate: float = 0.0
+    refresh_s: float = 2.0
+    refresh_capacity: int = 2
+    token_lifetime_s: int = 3599
+    seed: Optional[int] = None
+
+
+@dataclass
+class _Operation:
+    done_at: float
+    failed: bool
+    result: Optional[Dict[str, Any]]
+
+
+@dataclass
+class _Refresh:
+    done_at: float
+    failed: bool
+    workspace: str = ""
+
+
+_ITEM_KINDS = {"semanticModels": "SemanticModel", "reports": "Report"}
+
+# Local-only folders the service does not keep in a definition.
+_LOCAL_ONLY = (".pbi/", "DAXQueries/", "TMDLScripts/")
+
+
+def _as_stored(parts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Definition parts as the service returns them from getDefinition: without local-only files and
+    with JSON parts re-serialized.
+    """
+    stored = []
+    for part in parts:
+        if part["path"].startswith(_LOCAL_ONLY):
+            continue
+        if part["path"].endswith((".json", ".pbir", ".pbism", ".platform")):
+            try:
+                data = json.loads(base64.b64decode(part["payload"]).decode("utf-8-sig"))
+                part = {**part, "payload": base64.b64encode(json.dumps(data, indent=2).encode("utf-8")).decode("ascii")}
+            except ValueError:
+                pass
+        stored.append(part)
+    return stored
+
+_ROUTES: List[Tuple[str, "re.Pattern[str]"]] = [
+    ("token", re.compile(r"^/[^/]+/oauth2/v2\.0/token$")),
+    ("list_items", re.compile(r"^/v1/workspaces/(?P<ws>[^/]+)/items$")),
+    ("create_item", re.compile(r"^/v1/workspaces/(?P<ws>[^/]+)/(?P<kind>semanticModels|reports)$")),
+    ("update_definition", re.compile(r"^/v1/workspaces/(?P<ws>[^/]+)/(?P<kind>semanticModels|reports)/(?P<id>[^/]+)/updateDefinition$")),
+    ("get_definition", re.compile(r"^/v1/workspaces/(?P<ws>[^/]+)/items/(?P<id>[^/]+)/getDefinition$")),
+    ("operation_result", re.compile(r"^/v1/operations/(?P<op>[^/]+)/result$")),
+    ("operation", re.compile(r"^/v1/operations/(?P<op>[^/]+)$")),
+    ("refresh", re.compile(r"^/v1\.0/myorg/groups/(?P<ws>[^/]+)/datasets/(?P<id>[^/]+)/refreshes$")),
+    ("refresh_status", re.compile(r"^/v1\.0/myorg/groups/(?P<ws>[^/]+)/datasets/(?P<id>[^/]+)/refreshes/(?P<refresh>[^/]+)$")),
+]
+
+
+class FakeFabric:
+    """
+    In-memory workspaces served over HTTP from a background thread. Counters of requests per
+    endpoint and status, and of request bytes received, are available from stats().
+
+    A refresh takes `refresh_s`, stretched in proportion when more than `refresh_capacity` refreshes
+    run at once in its workspace, like a capacity that is saturated.
+    """
+
+    def __init__(self, config: Optional[FakeFabricConfig] = None, *, host: str = "127.0.0.1", port: int = 0) -> None:
+        self.config = config or FakeFabricConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._items: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._definitions: Dict[str, List[Dict[str, Any]]] = {}
+        self._operations: Dict[str, _Operation] = {}
+        self._refreshes: Dict[str, _Refresh] = {}
+        self._tokens: Dict[str, float] = {}
+        self._peak_refreshes = 0
+        self._recent: Deque[float] = deque()
+        self._requests: Counter = Counter()
+        self._statuses: Counter = Counter()
+        self._bytes_received = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeFabric":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-fabric", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeFabric":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": dict(sorted(self._requests.items())),
+                "statuses": {str(k): v for k, v in sorted(self._statuses.items())},
+                "bytes_received": self._bytes_received,
+                "items": sum(len(items) for items in self._items.values()),
+                "peak_refreshes": self._peak_refreshes,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._requests.clear()
+            self._statuses.clear()
+            self._bytes_received = 0
+            self._peak_refreshes = 0
+
+    # --- request handling ---
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                fake._handle(self, "GET")
+
+            def do_POST(self) -> None:
+                fake._handle(self, "POST")
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        length = int(handler.headers.get("Content-Length") or 0)
+        body = handler.rfile.read(length) if length else b""
+        parsed = urlparse(handler.path)
+
+        route, match = next(((name, m) for name, pattern in _ROUTES if (m := pattern.match(parsed.path))), (None, None))
+        cfg = self.config
+        with self._lock:
+            self._requests[f"{method} {route or 'unknown'}"] += 1
+            self._bytes_received += length
+            delay = max(0.0, cfg.latency_ms + self._random.uniform(-cfg.latency_jitter_ms, cfg.latency_jitter_ms)) / 1000
+        time.sleep(delay)
+
+        if route is None:
+            return self._send(handler, 404, {"errorCode": "EntityNotFound"})
+        if route != "token" and not self._authorized(handler):
+            return self._send(handler, 401, {"errorCode": "TokenExpired"})
+        if route != "token" and self._throttled():
+            return self._send(handler, 429, {"errorCode": "RequestBlocked"}, {"Retry-After": str(cfg.throttle_retry_after_s)})
+        if method == "POST" and route != "token" and self._chance(cfg.error_rate):
+            return self._send(handler, 500, {"errorCode": "InternalError"})
+
+        try:
+            status, payload, headers = getattr(self, f"_{route}")(method, match.groupdict(), parse_qs(parsed.query), body, handler)
+        except (KeyError, ValueError) as exc:
+            status, payload, headers = 400, {"errorCode": "BadRequest", "message": str(exc)}, {}
+        self._send(handler, status, payload, headers)
+
+    def _send(self, handler: BaseHTTPRequestHandler, status: int, payload: Any = None, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        with self._lock:
+            self._statuses[status] += 1
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def _authorized(self, handler: BaseHTTPRequestHandler) -> bool:
+        token = (handler.headers.get("Authorization") or "").removeprefix("Bearer ")
+        with self._lock:
+            return time.monotonic() < self._tokens.get(token, 0.0)
+
+    def _throttled(self) -> bool:
+        if self._chance(self.config.throttle_rate):
+            return True
+        if not self.config.max_rps:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and now - self._recent[0] >= 1.0:
+                self._recent.popleft()
+            if len(self._recent) >= self.config.max_rps:
+                return True
+            self._recent.append(now)
+        return False
+
+    def _start_operation(self, handler: BaseHTTPRequestHandler, result: Optional[Dict[str, Any]], success_status: int) -> Tuple[int, Any, Dict[str, str]]:
+        cfg = self.config
+        failed = self._chance(cfg.lro_failure_rate)
+        if cfg.lro_s <= 0 and not failed:
+            return success_status, result, {}
+        op_id = str(uuid.uuid4())
+        with self._lock:
+            self._operations[op_id] = _Operation(time.monotonic() + cfg.lro_s, failed, result)
+        host = handler.headers.get("Host")
+        return 202, None, {"Location": f"http://{host}/v1/operations/{op_id}", "x-ms-operation-id": op_id, "Retry-After": str(cfg.lro_retry_after_s)}
+
+    # --- endpoints ---
+
+    def _token(self, method, params, query, body, handler):
+        token = f"fake-{uuid.uuid4()}"
+        with self._lock:
+            self._tokens[token] = time.monotonic() + self.config.token_lifetime_s
+        return 200, {"token_type": "Bearer", "expires_in": self.config.token_lifetime_s, "access_token": token}, {}
+
+    def _list_items(self, method, params, query, body, handler):
+        with self._lock:
+            items = list(self._items.get(params["ws"], {}).values())
+        item_type = (query.get("type") or [None])[0]
+        if item_type:
+            items = [i for i in items if i["type"] == item_type]
+        start = int((query.get("continuationToken") or ["0"])[0])
+        page = items[start:start + self.config.page_size]
+        data: Dict[str, Any] = {"value": page}
+        if start + self.config.page_size < len(items):
+            data["continuationToken"] = str(start + self.config.page_size)
+        return 200, data, {}
+
+    def _create_item(self, method, params, query, body, handler):
+        request = json.loads(body)
+        item = {"id": str(uuid.uuid4()), "type": _ITEM_KINDS[params["kind"]], "displayName": request["displayName"], "workspaceId": params["ws"]}
+        with self._lock:
+            workspace = self._items.setdefault(params["ws"], {})
+            if any(i["displayName"] == item["displayName"] and i["type"] == item["type"] for i in workspace.values()):
+                return 400, {"errorCode": "ItemDisplayNameAlreadyInUse"}, {}
+            workspace[item["id"]] = item
+            self._definitions[item["id"]] = _as_stored(request["definition"]["parts"])
+        return self._start_operation(handler, item, 201)
+
+    def _update_definition(self, method, params, query, body, handler):
+        request = json.loads(body)
+        with self._lock:
+            if params["id"] not in self._items.get(params["ws"], {}):
+                return 404, {"errorCode": "ItemNotFound"}, {}
+            self._definitions[params["id"]] = _as_stored(request["definition"]["parts"])
+        return self._start_operation(handler, None, 200)
+
+    def _get_definition(self, method, params, query, body, handler):
+        with self._lock:
+            if params["id"] not in self._items.get(params["ws"], {}):
+                return 404, {"errorCode": "ItemNotFound"}, {}
+            parts = self._definitions.get(params["id"], [])
+        return self._start_operation(handler, {"definition": {"parts": parts}}, 200)
+
+    def _operation(self, method, params, query, body, handler):
+        with self._lock:
+            op = self._operations.get(params["op"])
+        if op is None:
+            return 404, {"errorCode": "OperationNotFound"}, {}
+        if time.monotonic() < op.done_at:
+            return 200, {"status": "Running", "percentComplete": None}, {"Retry-After": str(self.config.lro_retry_after_s)}
+        if op.failed:
+            return 200, {"status": "Failed", "error": {"errorCode": "InjectedFailure"}}, {}
+        return 200, {"status": "Succeeded", "percentComplete": 100}, {}
+
+    def _operation_result(self, method, params, query, body, handler):
+        with self._lock:
+            op = self._operations.get(params["op"])
+        if op is None or op.result is None or time.monotonic() < op.done_at or op.failed:
+            return 400, {"errorCode": "OperationHasNoResult"}, {}
+        return 200, op.result, {}
+
+    def _refresh(self, method, params, query, body, handler):
+        if method != "POST":
+            return 405, {"errorCode": "MethodNotAllowed"}, {}
+        cfg = self.config
+        failed = self._chance(cfg.lro_failure_rate)
+        now = time.monotonic()
+        with self._lock:
+            if params["id"] not in self._items.get(params["ws"], {}):
+                return 404, {"errorCode": "ItemNotFound"}, {}
+            # Every workspace stands for its own capacity.
+            running = 1 + sum(1 for r in self._refreshes.values() if r.done_at > now and r.workspace == params["ws"])
+            self._peak_refreshes = max(self._peak_refreshes, running)
+            refresh_id = str(uuid.uuid4())
+            self._refreshes[refresh_id] = _Refresh(now + cfg.refresh_s * max(1.0, running / max(1, cfg.refresh_capacity)), failed, params["ws"])
+        host = handler.headers.get("Host")
+        location = f"http://{host}/v1.0/myorg/groups/{params['ws']}/datasets/{params['id']}/refreshes/{refresh_id}"
+        return 202, None, {"Location": location, "x-ms-request-id": refresh_id}
+
+    def _refresh_status(self, method, params, query, body, handler):
+        with self._lock:
+            refresh = self._refreshes.get(params["refresh"])
+        if refresh is None:
+            return 404, {"errorCode": "RefreshNotFound"}, {}
+        if time.monotonic() < refresh.done_at:
+            return 200, {"status": "Unknown", "extendedStatus": "InProgress"}, {"Retry-After": str(self.config.lro_retry_after_s)}
+        if refresh.failed:
+            return 200, {"status": "Failed", "extendedStatus": "Failed", "messages": [{"code": "InjectedFailure", "type": "Error"}]}, {}
+        return 200, {"status": "Completed", "extendedStatus": "Completed"}, {}
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    defaults = FakeFabricConfig()
+    parser = argparse.ArgumentParser(description="Local stand-in for the Fabric REST API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms)
+    parser.add_argument("--latency-jitter-ms", type=float, default=defaults.latency_jitter_ms)
+    parser.add_argument("--lro-s", type=float, default=defaults.lro_s, help="Duration of long-running operations; 0 answers create/update synchronously.")
+    parser.add_argument("--lro-retry-after-s", type=int, default=defaults.lro_retry_after_s)
+    parser.add_argument("--page-size", type=int, default=defaults.page_size)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate, help="Probability of answering any API request with 429.")
+    parser.add_argument("--max-rps", type=float, default=defaults.max_rps, help="Answer 429 above this many API requests per second.")
+    parser.add_argument("--throttle-retry-after-s", type=int, default=defaults.throttle_retry_after_s)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Probability of answering a POST with 500.")
+    parser.add_argument("--lro-failure-rate", type=float, default=defaults.lro_failure_rate, help="Probability of a long-running operation or refresh failing.")
+    parser.add_argument("--refresh-s", type=float, default=defaults.refresh_s, help="Duration of a semantic model refresh on an idle capacity.")
+    parser.add_argument("--refresh-capacity", type=int, default=defaults.refresh_capacity, help="Refreshes per workspace that run at full speed at once; more slow all of them down.")
+    parser.add_argument("--token-lifetime-s", type=int, default=defaults.token_lifetime_s, help="expires_in of issued tokens; later requests with the token are answered 401.")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeFabricConfig:
+    return FakeFabricConfig(**{k: getattr(args, k) for k in asdict(FakeFabricConfig())})
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    fake = FakeFabric(config_from_args(args), host=args.host, port=args.port).start()
+    print(f"Fake Fabric listening on {fake.url} (FABRIC_API_BASE_URL={fake.url}/v1, POWERBI_API_BASE_URL={fake.url}/v1.0/myorg, AZURE_AUTHORITY_HOST={fake.url})", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
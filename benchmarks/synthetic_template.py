@@ -0,0 +1,199 @@
+import json
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List
+
+
+PARAMETER_NAME = "Parameter1"
+TEMPLATE_PARAMETER_VALUE = "TEMPLATE"
+REGION_PREFIX = "Bench_"
+
+# Fixed namespace, so the same sizes always produce byte-identical templates.
+_ID_NAMESPACE = uuid.UUID("0b1e5c3a-52c4-4c39-9d8e-6f0a4b7c2e11")
+
+
+@dataclass(frozen=True)
+class TemplateSize:
+    tables: int = 20
+    columns_per_table: int = 12
+    report_json_kb: int = 200
+    bookmarks: int = 10
+    pages: int = 3
+    visuals_per_page: int = 8
+
+    def label(self) -> str:
+        return f"t{self.tables}-r{self.report_json_kb}k-b{self.bookmarks}"
+
+
+def _id(*parts: Any) -> str:
+    return str(uuid.uuid5(_ID_NAMESPACE, ":".join(str(p) for p in parts)))
+
+
+def _hex_id(*parts: Any) -> str:
+    return _id(*parts).replace("-", "")[:20]
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def _write_text(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def _platform(item_type: str, name: str) -> Dict[str, Any]:
+    return {
+        "$schema": "https://developer.microsoft.com/json-schemas/fabric/gitIntegration/platformProperties/2.0.0/schema.json",
+        "metadata": {"type": item_type, "displayName": name},
+        "config": {"version": "2.0", "logicalId": _id("platform", item_type)},
+    }
+
+
+def _table_tmdl(index: int, columns: int) -> str:
+    name = f"Table_{index:04d}"
+    lines = [f"table {name}", f"\tlineageTag: {_id('table', index)}", ""]
+    for c in range(columns):
+        lines += [
+            f"\tcolumn Column_{c:03d}",
+            "\t\tdataType: string",
+            f"\t\tlineageTag: {_id('column', index, c)}",
+            "\t\tsummarizeBy: none",
+            f"\t\tsourceColumn: Column_{c:03d}",
+            "",
+            "\t\tannotation SummarizationSetBy = Automatic",
+            "",
+        ]
+    lines += [
+        f"\tmeasure 'Rows {name}' = COUNTROWS('{name}')",
+        f"\t\tlineageTag: {_id('measure', index)}",
+        "",
+        f"\tpartition {name} = m",
+        "\t\tmode: import",
+        "\t\tsource =",
+        "\t\t\t\tlet",
+        '\t\t\t\t    Source = Sql.Database("bench-sql.example.com", "sales"),',
+        f'\t\t\t\t    Data = Value.NativeQuery(Source, "SELECT * FROM sales.{name.lower()} WHERE Region = \'" & {PARAMETER_NAME} & "\'")',
+        "\t\t\t\tin",
+        "\t\t\t\t    Data",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def _write_model(root: Path, size: TemplateSize) -> None:
+    _write_json(root / ".platform", _platform("SemanticModel", "template"))
+    _write_json(root / "definition.pbism", {"version": "4.2", "settings": {}})
+    definition = root / "definition"
+    _write_text(definition / "database.tmdl", "database\n\tcompatibilityLevel: 1600\n")
+    refs = "".join(f"ref table Table_{i:04d}\n" for i in range(size.tables))
+    _write_text(definition / "model.tmdl", f"model Model\n\tculture: en-US\n\tdefaultPowerBIDataSourceVersion: powerBI_V3\n\n{refs}")
+    _write_text(
+        definition / "expressions.tmdl",
+        f'expression {PARAMETER_NAME} = "{TEMPLATE_PARAMETER_VALUE}" meta [IsParameterQuery=true, Type="Text", IsParameterQueryRequired=true]\n'
+        f"\tlineageTag: {_id('parameter')}\n\tqueryGroup: Parm\n",
+    )
+    for i in range(size.tables):
+        _write_text(definition / "tables" / f"Table_{i:04d}.tmdl", _table_tmdl(i, size.columns_per_table))
+
+
+def _visual(page: int, index: int) -> Dict[str, Any]:
+    return {
+        "name": _hex_id("visual", page, index),
+        "position": {"x": 20 * index, "y": 40, "z": index, "width": 300, "height": 200},
+        "visual": {
+            "visualType": "tableEx",
+            "query": {"queryState": {"Values": {"projections": [
+                {"field": {"Column": {"Expression": {"SourceRef": {"Entity": f"Table_{index:04d}"}}, "Property": "Column_000"}}}
+            ]}}},
+        },
+    }
+
+
+def _resource(n: int) -> Dict[str, Any]:
+    return {"name": f"Resource_{n:05d}", "type": "CustomVisual", "items": [{"name": _id("resource", n), "path": f"resources/{n:05d}.json", "type": 201}]}
+
+
+def _report_json(size: TemplateSize) -> Dict[str, Any]:
+    # Real report.json files are dominated by theme and resource definitions; pad with those.
+    report: Dict[str, Any] = {
+        "themeCollection": {"baseTheme": {"name": "CY25SU10", "type": "SharedResources"}},
+        "resourcePackages": [],
+        "settings": {"useStylableVisualContainerHeader": True},
+    }
+    target = size.report_json_kb * 1024
+    empty = len(json.dumps(report, indent=2))
+    entry_size = len(json.dumps({**report, "resourcePackages": [_resource(0), _resource(1)]}, indent=2)) - len(json.dumps({**report, "resourcePackages": [_resource(0)]}, indent=2))
+    count = max(0, (target - empty) // entry_size)
+    report["resourcePackages"] = [_resource(n) for n in range(count)]
+    return report
+
+
+def _write_report(root: Path, size: TemplateSize) -> None:
+    _write_json(root / ".platform", _platform("Report", "template"))
+    _write_json(root / "definition.pbir", {
+        "$schema": "https://developer.microsoft.com/json-schemas/fabric/item/report/definitionProperties/2.0.0/schema.json",
+        "version": "4.0",
+        "datasetReference": {"byPath": {"path": "../template.SemanticModel"}},
+    })
+    definition = root / "definition"
+    _write_json(definition / "version.json", {"version": "2.0.0"})
+    _write_json(definition / "report.json", _report_json(size))
+
+    page_ids = [_hex_id("page", p) for p in range(size.pages)]
+    _write_json(definition / "pages" / "pages.json", {"pageOrder": page_ids, "activePageName": page_ids[0] if page_ids else ""})
+    for p, page_id in enumerate(page_ids):
+        _write_json(definition / "pages" / page_id / "page.json", {"name": page_id, "displayName": f"Page {p + 1}", "width": 1280, "height": 720})
+        for v in range(size.visuals_per_page):
+            visual = _visual(p, v)
+            _write_json(definition / "pages" / page_id / "visuals" / visual["name"] / "visual.json", visual)
+
+    bookmark_ids = [_hex_id("bookmark", b) for b in range(size.bookmarks)]
+    _write_json(definition / "bookmarks" / "bookmarks.json", {"items": [{"name": b} for b in bookmark_ids]})
+    for b, bookmark_id in enumerate(bookmark_ids):
+        _write_json(definition / "bookmarks" / f"{bookmark_id}.bookmark.json", {
+            "name": bookmark_id,
+            "displayName": f"Bookmark {b + 1}",
+            "explorationState": {"activeSection": page_ids[b % len(page_ids)] if page_ids else "", "filters": {}},
+        })
+
+
+def region_codes(count: int) -> List[str]:
+    return [f"R{i:04d}" for i in range(count)]
+
+
+def write_workspace(root: Path, size: TemplateSize, regions: int) -> None:
+    """
+    Lays out a complete generation workspace under `root` (config/ and template/, same layout as
+    the repository), so the generation scripts can run with `root` as the working directory.
+    """
+    _write_model(root / "template" / "template.SemanticModel", size)
+    _write_report(root / "template" / "template.Report", size)
+    _write_json(root / "config" / "template_report_config", {
+        "base_path": "template",
+        "model_attributes": {
+            "template_model": "template/template.SemanticModel",
+            "model_platform": "template/template.SemanticModel/.platform",
+            "model_definition": "template/template.SemanticModel/definition/expressions.tmdl",
+        },
+        "report_attributes": {
+            "template_report": "template/template.Report",
+            "report_platform": "template/template.Report/.platform",
+            "report_definition": "template/template.Report/definition.pbir",
+        },
+        "parameter_name": PARAMETER_NAME,
+    })
+    _write_json(root / "config" / "regions", {
+        "regions": region_codes(regions),
+        "naming": {"prefix": REGION_PREFIX},
+        "paths": {
+            "expected_model_path": ".SemanticModel",
+            "expected_report_path": ".Report",
+            "model_platform": ".SemanticModel/.platform",
+            "model_definition": ".SemanticModel/definition/expressions.tmdl",
+            "expected_report_platform": ".Report/.platform",
+            "expected_report_definition": ".Report/definition.pbir",
+        },
+    })
@@ -0,0 +1,148 @@
+import json
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from config_reader import CONFIG_FILE
+from models_manager import REGION_CONFIG_FILE
+
+
+SCRIPT_POLICIES = ("all", "none")
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# Keys of config/regions that are read per region; a change to any other key affects every region.
+_PER_REGION_KEYS = ("regions", "region_settings")
+
+
+@dataclass
+class ChangeScope:
+    """
+    Regions a run regenerates and redeploys. `regions` None means every region; `reasons` tells
+    why each region is in scope ("*" for every region).
+    """
+    regions: Optional[Set[str]] = field(default_factory=set)
+    reasons: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def everything(self) -> bool:
+        return self.regions is None
+
+    def add(self, region: str, reason: str) -> None:
+        if self.regions is not None:
+            self.regions.add(region)
+            self.reasons.setdefault(region, reason)
+
+    def add_all(self, reason: str) -> None:
+        self.regions = None
+        self.reasons = {"*": self.reasons.get("*", reason)}
+
+    def filter(self, plans: List[Any]) -> List[Any]:
+        if self.regions is None:
+            return plans
+        return [p for p in plans if p.region_code in self.regions]
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError) as exc:
+        detail = (getattr(exc, "stderr", None) or str(exc)).strip()
+        raise ValueError(f"git {' '.join(args)} failed: {detail}") from exc
+
+
+def split_range(diff_range: str) -> Tuple[str, Optional[str]]:
+    """
+    Base and head commits of "BASE..HEAD", "BASE...HEAD" (from their merge base) or "BASE"
+    (head None: the working tree).
+    """
+    if "..." in diff_range:
+        base, head = diff_range.split("...", 1)
+        head = head or "HEAD"
+        return _git("merge-base", base or "HEAD", head).strip(), head
+    if ".." in diff_range:
+        base, head = diff_range.split("..", 1)
+        return base or "HEAD", head or "HEAD"
+    return diff_range, None
+
+
+def changed_files(base: str, head: Optional[str] = None) -> List[str]:
+    """
+    Paths changed between `base` and `head` (or the working tree, untracked files included),
+    relative to the current directory.
+    """
+    revisions = [base] if head is None else [base, head]
+    output = _git("diff", "--name-only", "--relative", *revisions, "--")
+    if head is None:
+        output += _git("ls-files", "--others", "--exclude-standard")
+    return [line for line in output.splitlines() if line]
+
+
+def _load_at(revision: Optional[str], path: Path) -> Dict[str, Any]:
+    if revision is None:
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+    try:
+        return json.loads(_git("show", f"{revision}:./{path.as_posix()}") or "{}")
+    except ValueError:
+        # Not in that revision (added or removed by the range).
+        return {}
+
+
+def diff_region_config(scope: ChangeScope, old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """
+    Regions affected by a change of config/regions: added regions and regions whose
+    region_settings entry changed. Shared sections (naming, paths, workspaces...) affect all.
+    """
+    for key in sorted((set(old) | set(new)) - set(_PER_REGION_KEYS)):
+        if old.get(key) != new.get(key):
+            scope.add_all(f"`{key}` changed in {REGION_CONFIG_FILE.as_posix()}")
+    old_regions, new_regions = old.get("regions", []), new.get("regions", [])
+    if new.get("workspaces") and new.get("workspace_sharding") == "round_robin" and old_regions != new_regions:
+        # Round-robin assignment follows the region list order.
+        scope.add_all("region list changed with round_robin workspace sharding")
+    old_settings, new_settings = old.get("region_settings") or {}, new.get("region_settings") or {}
+    for region in new_regions:
+        if region not in old_regions:
+            scope.add(region, "added")
+        elif old_settings.get(region) != new_settings.get(region):
+            scope.add(region, "region_settings changed")
+
+
+def _is_under(path: Path, directories: Iterable[Path]) -> bool:
+    return any(path == d or d in path.parents for d in directories)
+
+
+def affected_regions(diff_range: str, template_paths: Iterable[Path | str], script_policy: str = "all") -> ChangeScope:
+    """
+    Regions affected by the changes in `diff_range`: a change under the template or to the template
+    config affects every region, a change of config/regions only the regions it touches, and a
+    change under scripts/ every region or none, depending on `script_policy`. Other files (e.g.
+    generated region folders) affect nothing.
+    """
+    if script_policy not in SCRIPT_POLICIES:
+        raise ValueError(f"Unknown script change policy `{script_policy}`, expected one of: {', '.join(SCRIPT_POLICIES)}")
+    base, head = split_range(diff_range)
+    templates = [Path(p).resolve() for p in template_paths]
+    region_config = REGION_CONFIG_FILE.resolve()
+    scope = ChangeScope()
+    for rel_path in changed_files(base, head):
+        path = Path(rel_path).resolve()
+        if path == region_config:
+            diff_region_config(scope, _load_at(base, REGION_CONFIG_FILE), _load_at(head, REGION_CONFIG_FILE))
+        elif path == CONFIG_FILE.resolve() or _is_under(path, templates):
+            scope.add_all(f"{rel_path} changed")
+        elif _is_under(path, [SCRIPTS_DIR]) and script_policy == "all":
+            scope.add_all(f"{rel_path} changed")
+    return scope
+
+
+def explicit_scope(regions: Iterable[str], known: Iterable[str]) -> ChangeScope:
+    known = set(known)
+    unknown = sorted(set(regions) - known)
+    if unknown:
+        raise ValueError(f"Unknown region(s): {', '.join(unknown)}")
+    scope = ChangeScope()
+    for region in regions:
+        scope.add(region, "requested")
+    return scope
@@ -1,7 +1,8 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Callable
-import re
+from typing import Any, Dict, Callable
+import tmdl
+from template_index import find_parameter
 from utils import load_data, get_nested
 from pprint import pprint
 
@@ -32,6 +33,11 @@ class PowerBiTemplateConfig:
     template_report_metadata_name: str
     template_report_metadata_model_reference: str
 
+    # "region_predicates" section: per-table region filters (see region_predicates.parse_region_predicates).
+    region_predicates: Dict[str, Any] = field(default_factory=dict)
+    # "dax_lint" section: rule severities and the severity that fails generation (see dax_lint.parse_lint_options).
+    dax_lint: Dict[str, Any] = field(default_factory=dict)
+
 
 def get_all_pbi_attributes(config_path: Path = CONFIG_FILE, loader: Callable = load_data) -> Dict[str, str | Path]:
     data = loader(config_path)
@@ -44,6 +50,8 @@ def get_all_pbi_attributes(config_path: Path = CONFIG_FILE, loader: Callable = l
         "report_platform": Path(get_nested(data, "report_attributes", "report_platform", default="missing_attribute")),
         "report_definition": Path(get_nested(data, "report_attributes", "report_definition", default="missing_attribute")),
         "parameter_name": get_nested(data, "parameter_name", default=""),
+        "region_predicates": get_nested(data, "region_predicates", default={}),
+        "dax_lint": get_nested(data, "dax_lint", default={}),
     }
 
 
@@ -67,16 +75,16 @@ def get_report_metadata(report_platform_path: Path, report_definition_path: Path
 
 
 def get_template_model_parameter(model_definition_path: Path, parm: str) -> str | None:
-    pattern = rf'{re.escape(parm)}\s*=\s*"([^"]+)"'
     with model_definition_path.open("r", encoding="utf-8") as f:
-        text = f.read()
+        doc = tmdl.parse(f.read())
 
-    match = re.search(pattern, text)
-    if not match:
+    expression = doc.find("expression", parm)
+    parameter = find_parameter(doc, expression) if expression else None
+    if not parameter:
         raise ValueError(
             f"Nie znaleziono parametru `{parm}` w pliku {model_definition_path}"
         )
-    return match.group(1)
+    return parameter.value
 
 
 def get_template_info() -> PowerBiTemplateConfig:
@@ -104,6 +112,8 @@ def get_template_info() -> PowerBiTemplateConfig:
         template_report_metadata_type=report_metadata["type"],
         template_report_metadata_name=report_metadata["name"],
         template_report_metadata_model_reference=report_metadata["model_reference_path"],
+        region_predicates=all_pbi_attributes["region_predicates"],
+        dax_lint=all_pbi_attributes["dax_lint"],
     )
 
 if __name__ == "__main__":
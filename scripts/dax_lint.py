@@ -0,0 +1,322 @@
+import argparse
+import json
+import re
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Set, Tuple
+
+import tmdl
+from template_index import TemplateIndex
+from utils import die, log
+
+
+SEVERITIES = ("info", "warning", "error")
+
+# Rule id -> (default severity, description).
+RULES = {
+    "DAX001": ("warning", "FILTER iterates a whole table"),
+    "DAX002": ("warning", "FILTER over ALLSELECTED"),
+    "DAX003": ("warning", "iterator nested in the row context of another iterator"),
+    "DAX004": ("warning", "ALL() / REMOVEFILTERS() over the whole model"),
+    "DAX005": ("info", "repeated sub-expression"),
+    "DAX006": ("info", "CALCULATE nested in CALCULATE"),
+}
+
+ITERATORS = frozenset({
+    "ADDCOLUMNS", "AVERAGEX", "CONCATENATEX", "COUNTAX", "COUNTX", "FILTER", "GENERATE", "GENERATEALL",
+    "MAXX", "MINX", "PRODUCTX", "RANKX", "SELECTCOLUMNS", "SUMX",
+})
+
+CALCULATE_FUNCTIONS = frozenset({"CALCULATE", "CALCULATETABLE"})
+
+# Table functions FILTER can be given instead of the table itself; over a table they still return every row.
+_TABLE_WRAPPERS = frozenset({"ALL", "ALLNOBLANKROW", "ALLSELECTED", "VALUES", "DISTINCT", "ALLEXCEPT"})
+
+# Calls shorter than this many tokens (e.g. `MAX([x])`) are not reported as repeated.
+MIN_REPEATED_TOKENS = 6
+
+_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|--[^\n]*|/\*.*?\*/)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<column>(?:'(?:[^']|'')+'|[A-Za-z_][A-Za-z0-9_]*)?\[(?:[^\]]|\]\])+\])
+  | (?P<table>'(?:[^']|'')+')
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_.]*)
+  | (?P<op>&&|\|\||<=|>=|<>|==|[-+*/^&=<>!,(){}])
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    text: str
+    offset: int
+
+
+@dataclass
+class Call:
+    """
+    A function call: tokens[open - 1] is the name, tokens[open] "(" and tokens[close] ")".
+    `args` are (first, end) token ranges; `parent_arg` is the argument of `parent` holding the call.
+    """
+    name: str
+    open: int
+    close: int
+    args: List[Tuple[int, int]] = field(default_factory=list)
+    parent: Optional["Call"] = None
+    parent_arg: int = 0
+
+    def ancestors(self) -> Iterator[Tuple["Call", int]]:
+        call = self
+        while call.parent is not None:
+            yield call.parent, call.parent_arg
+            call = call.parent
+
+
+@dataclass(frozen=True)
+class LintFinding:
+    rule: str
+    severity: str
+    table: str
+    measure: str
+    rel_path: str
+    line: int
+    message: str
+
+    @property
+    def location(self) -> str:
+        return f"{self.rel_path}:{self.line}"
+
+
+@dataclass
+class LintOptions:
+    fail_on: Optional[str] = "error"
+    severities: Dict[str, str] = field(default_factory=dict)
+
+    def severity(self, rule: str) -> str:
+        return self.severities.get(rule, RULES[rule][0])
+
+
+@dataclass
+class LintResult:
+    findings: List[LintFinding] = field(default_factory=list)
+
+    def failing(self, fail_on: Optional[str]) -> List[LintFinding]:
+        if not fail_on:
+            return []
+        threshold = SEVERITIES.index(fail_on)
+        return [f for f in self.findings if SEVERITIES.index(f.severity) >= threshold]
+
+    def summary(self) -> str:
+        counts = {s: sum(1 for f in self.findings if f.severity == s) for s in SEVERITIES}
+        return ", ".join(f"{counts[s]} {s}" for s in reversed(SEVERITIES))
+
+
+def parse_lint_options(config: Mapping[str, Any]) -> LintOptions:
+    """
+    Options from the "dax_lint" section of the template config, e.g.
+    {"fail_on": "warning", "severities": {"DAX005": "off", "DAX004": "error"}}. "fail_on": null only reports.
+    """
+    config = config or {}
+    options = LintOptions(fail_on=config.get("fail_on", "error"), severities=dict(config.get("severities") or {}))
+    if options.fail_on is not None and options.fail_on not in SEVERITIES:
+        raise ValueError(f"Unknown fail_on severity `{options.fail_on}`, expected one of: {', '.join(SEVERITIES)}")
+    for rule, severity in options.severities.items():
+        if rule not in RULES:
+            raise ValueError(f"Unknown DAX lint rule `{rule}`, expected one of: {', '.join(RULES)}")
+        if severity not in SEVERITIES + ("off",):
+            raise ValueError(f"Unknown severity `{severity}` for `{rule}`, expected one of: {', '.join(SEVERITIES + ('off',))}")
+    return options
+
+
+def tokenize(expression: str) -> List[Token]:
+    tokens = []
+    for match in _TOKEN.finditer(expression):
+        kind = match.lastgroup
+        if kind in ("comment", "space"):
+            continue
+        tokens.append(Token(kind, match.group(0), match.start()))
+    for i, token in enumerate(tokens[:-1]):
+        if token.kind == "name" and tokens[i + 1].text == "(":
+            tokens[i] = Token("function", token.text.upper(), token.offset)
+    return tokens
+
+
+def parse_calls(tokens: List[Token]) -> List[Call]:
+    """
+    Every function call of the token list, outermost first, with its arguments and parent.
+    Unbalanced parentheses end the open calls at the end of the expression.
+    """
+    calls: List[Call] = []
+    stack: List[Tuple[Optional[Call], int]] = []
+    for i, token in enumerate(tokens):
+        if token.text in ("(", "{"):
+            call = None
+            if token.text == "(" and i > 0 and tokens[i - 1].kind == "function":
+                parent = next((c for c, _ in reversed(stack) if c is not None), None)
+                call = Call(tokens[i - 1].text, i, len(tokens), parent=parent, parent_arg=len(parent.args) if parent else 0)
+                calls.append(call)
+            stack.append((call, i + 1))
+        elif token.text == "," and stack and stack[-1][0] is not None:
+            call, first = stack[-1]
+            call.args.append((first, i))
+            stack[-1] = (call, i + 1)
+        elif token.text in (")", "}") and stack:
+            call, first = stack.pop()
+            if call is not None:
+                if i > first or call.args:
+                    call.args.append((first, i))
+                call.close = i
+    for call, first in stack:
+        if call is not None:
+            call.args.append((first, len(tokens)))
+    return calls
+
+
+def _call_text(tokens: List[Token], call: Call) -> str:
+    return " ".join(t.text for t in tokens[call.open - 1:call.close + 1])
+
+
+def _single_call(calls: List[Call], first: int, end: int) -> Optional[Call]:
+    """
+    The call spanning exactly the tokens [first, end), if any.
+    """
+    return next((c for c in calls if c.open - 1 == first and c.close == end - 1), None)
+
+
+def _is_table(token: Token, tables: Set[str]) -> bool:
+    if token.kind == "table":
+        return tmdl.unquote(token.text).lower() in tables
+    return token.kind == "name" and token.text.lower() in tables
+
+
+def _lint_expression(expression: str, tables: Set[str], calculate_measures: Set[str]) -> Iterator[Tuple[str, int, str]]:
+    """
+    (rule, offset, message) of every finding in one DAX expression.
+    """
+    tokens = tokenize(expression)
+    calls = parse_calls(tokens)
+
+    for call in calls:
+        offset = tokens[call.open - 1].offset
+        first_arg = call.args[0] if call.args else None
+
+        if call.name == "FILTER" and first_arg:
+            single = tokens[first_arg[0]] if first_arg[1] - first_arg[0] == 1 else None
+            wrapper = _single_call(calls, *first_arg)
+            if single is not None and _is_table(single, tables):
+                yield "DAX001", offset, f"FILTER iterates every row of {single.text}; filter the columns instead (a column predicate in CALCULATE or KEEPFILTERS)"
+            elif wrapper and wrapper.name == "ALLSELECTED":
+                yield "DAX002", offset, f"FILTER over {_call_text(tokens, wrapper)} evaluates the condition for every selected value in each cell; use WINDOW or a column predicate with ALLSELECTED as a CALCULATE modifier"
+            elif wrapper and wrapper.name in _TABLE_WRAPPERS and wrapper.args and wrapper.args[0][1] - wrapper.args[0][0] == 1 and _is_table(tokens[wrapper.args[0][0]], tables):
+                yield "DAX001", offset, f"FILTER iterates every row of {_call_text(tokens, wrapper)}; filter the columns instead"
+
+        if call.name in ITERATORS:
+            outer = next(((parent, arg) for parent, arg in call.ancestors() if parent.name in ITERATORS and arg >= 1), None)
+            if outer:
+                yield "DAX003", offset, f"{call.name} runs for every row iterated by the enclosing {outer[0].name}"
+
+        if call.name in ("ALL", "REMOVEFILTERS") and not call.args:
+            yield "DAX004", offset, f"{call.name}() removes the filters of every table in the model; name the tables or columns to clear"
+
+        if call.name in CALCULATE_FUNCTIONS:
+            outer_calculate = next((parent for parent, _ in call.ancestors() if parent.name in CALCULATE_FUNCTIONS), None)
+            if outer_calculate:
+                yield "DAX006", offset, f"{call.name} inside {outer_calculate.name}; combine the filter arguments in one CALCULATE"
+            elif first_arg and first_arg[1] - first_arg[0] == 1 and tokens[first_arg[0]].text in calculate_measures:
+                yield "DAX006", offset, f"{call.name} over {tokens[first_arg[0]].text}, which is itself a CALCULATE; consider filtering the base measure once"
+
+    # Repeated calls, reported once and only when not part of a larger repeated call.
+    occurrences: Dict[str, List[Call]] = {}
+    for call in calls:
+        if call.close - call.open + 2 >= MIN_REPEATED_TOKENS:
+            occurrences.setdefault(_call_text(tokens, call), []).append(call)
+    repeated = {text: found for text, found in occurrences.items() if len(found) > 1}
+    spans = [(c.open, c.close) for found in repeated.values() for c in found]
+    for text, found in repeated.items():
+        if not all(any(start < c.open and c.close < end for start, end in spans) for c in found):
+            yield "DAX005", tokens[found[0].open - 1].offset, f"{text} is evaluated {len(found)} times; compute it once in a VAR"
+
+
+def _expression_first_line(doc: tmdl.TmdlDocument, obj: tmdl.TmdlObject) -> int:
+    declaration = doc.lines[obj.start].rstrip()
+    if not declaration.endswith("=") and not declaration.endswith("```"):
+        return obj.start
+    line = obj.start + 1
+    while line < obj.end and not doc.lines[line].strip():
+        line += 1
+    return line
+
+
+def _outermost_function(expression: str) -> Optional[str]:
+    tokens = tokenize(expression)
+    if tokens and tokens[0].text.upper() == "VAR":
+        # The result follows the last RETURN outside parentheses.
+        depth, last_return = 0, len(tokens) - 1
+        for i, token in enumerate(tokens):
+            depth += token.text in ("(", "{")
+            depth -= token.text in (")", "}")
+            if depth == 0 and token.kind == "name" and token.text.upper() == "RETURN":
+                last_return = i
+        tokens = tokens[last_return + 1:]
+    return tokens[0].text if tokens and tokens[0].kind == "function" else None
+
+
+def lint_model(index: TemplateIndex, options: Optional[LintOptions] = None) -> LintResult:
+    """
+    Lints every measure of the indexed model. Findings of rules set to "off" are dropped.
+    """
+    options = options or LintOptions()
+    tables = {name.lower() for name in index.tables}
+    calculate_measures = {
+        "[" + name.replace("]", "]]") + "]"
+        for (_, name), (_, obj) in index.measures.items()
+        if _outermost_function(obj.expression) in CALCULATE_FUNCTIONS
+    }
+
+    result = LintResult()
+    for (table, name), (rel_path, obj) in sorted(index.measures.items()):
+        doc = index.documents[rel_path]
+        first_line = _expression_first_line(doc, obj)
+        for rule, offset, message in _lint_expression(obj.expression, tables, calculate_measures):
+            severity = options.severity(rule)
+            if severity == "off":
+                continue
+            line = first_line + obj.expression.count("\n", 0, offset) + 1
+            result.findings.append(LintFinding(rule, severity, table, name, rel_path, line, message))
+    return result
+
+
+def log_findings(result: LintResult) -> None:
+    for finding in result.findings:
+        log(f"{finding.severity:<7} {finding.rule} {finding.location} [{finding.table}].[{finding.measure}]: {finding.message}")
+    log(f"DAX lint: {result.summary()}")
+
+
+def main(argv=None) -> None:
+    from config_reader import get_template_info
+    from template_snapshot import load_template_snapshot
+
+    parser = argparse.ArgumentParser(description="Lint the DAX measures of the template model for slow patterns.")
+    parser.add_argument("--fail-on", choices=SEVERITIES, default=None, help="Exit 1 when a finding has this severity or higher (default: the template config's dax_lint.fail_on).")
+    parser.add_argument("--json", action="store_true", help="Print the findings as JSON.")
+    args = parser.parse_args(argv)
+
+    template = get_template_info()
+    try:
+        options = parse_lint_options(template.dax_lint)
+    except ValueError as exc:
+        die(str(exc))
+    result = lint_model(load_template_snapshot(template).model_index, options)
+    if args.json:
+        print(json.dumps([asdict(f) for f in result.findings], indent=2, ensure_ascii=False))
+    else:
+        log_findings(result)
+    failing = result.failing(args.fail_on or options.fail_on)
+    if failing:
+        die(f"{len(failing)} DAX lint finding(s) at or above {args.fail_on or options.fail_on}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# Multiple of 3, so every chunk but the last base64-encodes without padding.
+CHUNK_SIZE = 3 * 64 * 1024
+
+# A part is read from disk (Path) or was rendered in memory (bytes).
+PartSource = Union[Path, bytes]
+
+
+def read_part(source: PartSource) -> bytes:
+    return source if isinstance(source, bytes) else source.read_bytes()
+
+
+def _part_size(source: PartSource) -> int:
+    return len(source) if isinstance(source, bytes) else source.stat().st_size
+
+
+def _b64_len(size: int) -> int:
+    return 4 * ((size + 2) // 3)
+
+
+def _file_digest(p: Path, chunk_size: int = CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with p.open("rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EncodedPartCache:
+    """
+    Content-addressed cache of base64-encoded parts, shared by all regions of a deploy run.
+
+    Most parts are byte-identical across regions, so each distinct content is hashed and encoded
+    once; only the files a region actually rewrites are encoded for that region. Digests of parts
+    held in memory (the template snapshot) are memoised per object, so they are hashed only once.
+    Parts larger than `max_part_bytes` are never stored, and nothing is added once the cache
+    holds `max_bytes` of encoded data.
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, max_part_bytes: int = 16 * 1024 * 1024) -> None:
+        self._max_bytes = max_bytes
+        self._max_part_bytes = max_part_bytes
+        self._encoded: Dict[str, bytes] = {}
+        self._digests: Dict[int, Tuple[bytes, str]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, source: PartSource) -> str:
+        if not isinstance(source, bytes):
+            return _file_digest(source)
+        with self._lock:
+            memo = self._digests.get(id(source))
+        if memo and memo[0] is source:
+            return memo[1]
+        digest = hashlib.sha256(source).hexdigest()
+        with self._lock:
+            self._digests[id(source)] = (source, digest)
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        with self._lock:
+            encoded = self._encoded.get(digest)
+            if encoded is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return encoded
+
+    def accepts(self, size: int) -> bool:
+        return size <= self._max_part_bytes and self._size + _b64_len(size) <= self._max_bytes
+
+    def put(self, digest: str, encoded: bytes) -> None:
+        with self._lock:
+            if digest not in self._encoded and self._size + len(encoded) <= self._max_bytes:
+                self._encoded[digest] = encoded
+                self._size += len(encoded)
+
+
+class DefinitionPayloadStream:
+    """
+    JSON body of a createItem / updateDefinition request, produced incrementally:
+    {"displayName": ..., "definition": {"parts": [{"path", "payload", "payloadType"}, ...]}}
+
+    Parts (files on disk or content rendered in memory) are base64-encoded chunk by chunk while
+    the body is sent, so memory use is bounded by the chunk size instead of the definition size.
+    With a shared EncodedPartCache, parts already encoded for another region are sent from the
+    cache. The body length is known up front (`len()`), which lets requests send a
+    Content-Length header instead of a chunked body. Each iteration starts over, so the body
+    can be re-sent on retry.
+    """
+
+    def __init__(self, display_name: str, files: List[Tuple[str, PartSource]], chunk_size: int = CHUNK_SIZE, cache: Optional[EncodedPartCache] = None) -> None:
+        if chunk_size % 3:
+            raise ValueError(f"chunk_size must be a multiple of 3, got {chunk_size}")
+        self._display_name = display_name
+        self._files = [(rel_path, source, _part_size(source)) for rel_path, source in files]
+        self._chunk_size = chunk_size
+        self._cache = cache
+        self._length = sum(len(piece) for piece in self._envelope()) + sum(_b64_len(size) for _, _, size in self._files)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        pieces = self._envelope()
+        yield next(pieces)
+        for _, source, size in self._files:
+            yield next(pieces)
+            yield from self._encode(source, size)
+            yield next(pieces)
+        yield next(pieces)
+
+    def _encode(self, source: PartSource, size: int) -> Iterator[bytes]:
+        chunks = self._encode_bytes(source) if isinstance(source, bytes) else self._encode_file(source, size)
+        if self._cache is None:
+            yield from chunks
+            return
+
+        digest = self._cache.digest(source)
+        encoded = self._cache.get(digest)
+        if encoded is not None:
+            yield encoded
+            return
+        if not self._cache.accepts(size):
+            yield from chunks
+            return
+
+        collected = []
+        for chunk in chunks:
+            collected.append(chunk)
+            yield chunk
+        self._cache.put(digest, b"".join(collected))
+
+    def _envelope(self) -> Iterator[bytes]:
+        yield b'{"displayName": ' + json.dumps(self._display_name).encode("utf-8") + b', "definition": {"parts": ['
+        for index, (rel_path, _, _) in enumerate(self._files):
+            separator = b", " if index else b""
+            yield separator + b'{"path": ' + json.dumps(rel_path).encode("utf-8") + b', "payload": "'
+            yield b'", "payloadType": "InlineBase64"}'
+        yield b"]}}"
+
+    def _encode_bytes(self, content: bytes) -> Iterator[bytes]:
+        view = memoryview(content)
+        for start in range(0, len(view), self._chunk_size):
+            yield base64.b64encode(view[start:start + self._chunk_size])
+
+    def _encode_file(self, p: Path, size: int) -> Iterator[bytes]:
+        remaining = size
+        with p.open("rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(self._chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield base64.b64encode(chunk)
+        if remaining or p.stat().st_size != size:
+            # The body length was announced up front; a short body would stall the request.
+            raise RuntimeError(f"{p} changed size while its definition payload was being sent")
@@ -1,18 +1,49 @@
+import asyncio
 import base64
+import dataclasses
+import functools
 import json
 import os
+import threading
 import time
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from urllib.parse import urlparse
 
 import requests
-from requests.adapters import HTTPAdapter
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
 from urllib3.util.retry import Retry
 
-from utils import die, load_json, save_json
+from definition_payload import DefinitionPayloadStream, EncodedPartCache, PartSource, read_part
+from deploy_state import DeployState, definitions_match, hash_part_digests, hash_parts
+from fabric_operations import OperationTracker
+from item_registry import ItemRegistry, platform_logical_id
+from region_output import write_if_changed
+from rate_limiter import AdaptiveRateLimiter, RateLimitedSession
+from template_snapshot import RenderedRegion
+from token_provider import TokenProvider
+from tracing import record_sleep, span
+from utils import die, json_to_bytes, log
+from workspaces import Workspace, WorkspaceAssignment, interleave, load_workspace_assignment
 
 FABRIC_BASE_URL = "https://api.fabric.microsoft.com/v1"
+AUTHORITY_URL = "https://login.microsoftonline.com"
+POWERBI_BASE_URL = "https://api.powerbi.com/v1.0/myorg"
+
+FABRIC_SCOPE = "https://api.fabric.microsoft.com/.default"
+POWERBI_SCOPE = "https://analysis.windows.net/powerbi/api/.default"
+
+# Threads (and connections) besides one per in-flight region: the tracker's concurrent polls
+# and the thread waiting for the next plan item.
+SUPPORT_THREADS = 9
+
+# Lifetime assumed when a token response has no expires_in (Entra ID tokens last one hour).
+DEFAULT_TOKEN_LIFETIME_S = 3599
+
+# Authorization is added per request by the TokenProvider passed as `auth`.
+JSON_HEADERS = {"Content-Type": "application/json"}
 
 
 @dataclass(frozen=True)
@@ -27,9 +58,20 @@ class Settings:
     op_default_sleep_s: int = 5
     retry_count: int = 3
     retry_backoff_s: float = 2.0
+    deploy_concurrency: int = 1
+    refresh_concurrency: int = 2
+    refresh_timeout_s: int = 4 * 3600
+    # Overridable to point a run at a local stand-in (benchmarks/fake_fabric.py).
+    api_base_url: str = FABRIC_BASE_URL
+    authority_url: str = AUTHORITY_URL
+    powerbi_base_url: str = POWERBI_BASE_URL
 
     @classmethod
-    def from_env(cls) -> "Settings":
+    def from_env(cls, *, workspace_required: bool = True) -> "Settings":
+        """
+        Settings from the environment. FABRIC_WORKSPACE_ID may be omitted (`workspace_required`
+        False) when the region config lists the workspaces to deploy to.
+        """
         tenant_id = os.getenv("AZURE_TENANT_ID")
         client_id = os.getenv("AZURE_CLIENT_ID")
         client_secret = os.getenv("AZURE_CLIENT_SECRET")
@@ -39,8 +81,9 @@ class Settings:
             "AZURE_TENANT_ID": tenant_id,
             "AZURE_CLIENT_ID": client_id,
             "AZURE_CLIENT_SECRET": client_secret,
-            "FABRIC_WORKSPACE_ID": workspace_id,
         }
+        if workspace_required:
+            required["FABRIC_WORKSPACE_ID"] = workspace_id
         missing = [k for k, v in required.items() if not v]
         if missing:
             die(f"Missing required environment variables: {', '.join(missing)}")
@@ -49,151 +92,298 @@ class Settings:
             tenant_id=tenant_id,
             client_id=client_id,
             client_secret=client_secret,
-            workspace_id=workspace_id,
+            workspace_id=workspace_id or "",
+            deploy_concurrency=int(os.getenv("FABRIC_DEPLOY_CONCURRENCY") or 1),
+            refresh_concurrency=int(os.getenv("FABRIC_REFRESH_CONCURRENCY") or 2),
+            api_base_url=(os.getenv("FABRIC_API_BASE_URL") or FABRIC_BASE_URL).rstrip("/"),
+            authority_url=(os.getenv("AZURE_AUTHORITY_HOST") or AUTHORITY_URL).rstrip("/"),
+            powerbi_base_url=(os.getenv("POWERBI_API_BASE_URL") or POWERBI_BASE_URL).rstrip("/"),
         )
 
 
-def _make_session(s: Settings) -> requests.Session:
-    session = requests.Session()
+class DeployError(RuntimeError):
+    pass
+
+
+@dataclass
+class DeployResult:
+    deployed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    failures: Dict[str, str] = field(default_factory=dict)
+    stats: Dict[str, Any] = field(default_factory=dict)
+    # Semantic model id per region whose model definition was deployed in this run.
+    changed_models: Dict[str, str] = field(default_factory=dict)
+    # Workspace each region was deployed to.
+    workspaces: Dict[str, Workspace] = field(default_factory=dict)
+    # Regions deployed from disk whose definition.pbir was rewritten (see _bind_report_to_model).
+    rewritten: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def make_session(s: Settings, limiter: Optional[AdaptiveRateLimiter] = None, *, base_url: Optional[str] = None, pool_size: Optional[int] = None) -> requests.Session:
+    """
+    Session with retries on 5xx. Throttling (429) of requests to `base_url` (default: the Fabric
+    API) is handled by the shared rate limiter, not here. The connection pool of each host keeps
+    `pool_size` connections (default: one per deploy slot plus SUPPORT_THREADS), so concurrent
+    requests reuse connections instead of opening and discarding extra ones.
+    """
+    session = RateLimitedSession(limiter or AdaptiveRateLimiter(), host=urlparse(base_url or s.api_base_url).netloc)
     retry = Retry(
         total=s.retry_count,
         backoff_factor=s.retry_backoff_s,
-        status_forcelist=(429, 500, 502, 503, 504),
+        status_forcelist=(500, 502, 503, 504),
         allowed_methods=("GET", "POST"),
         raise_on_status=False,
+        # urllib3 would otherwise still retry 429s that carry Retry-After, behind the limiter's back.
+        respect_retry_after_header=False,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    pool_maxsize = max(DEFAULT_POOLSIZE, pool_size or s.deploy_concurrency + SUPPORT_THREADS)
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=retry)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
     return session
 
 
-def get_fabric_access_token(s: Settings, session: Optional[requests.Session] = None) -> str:
-    sess = session or _make_session(s)
-    token_url = f"https://login.microsoftonline.com/{s.tenant_id}/oauth2/v2.0/token"
+def request_access_token(s: Settings, session: Optional[requests.Session] = None, scope: str = FABRIC_SCOPE) -> Tuple[str, float]:
+    """
+    New access token for `scope` and its lifetime in seconds. Raises DeployError on failure.
+    """
+    sess = session or make_session(s)
+    token_url = f"{s.authority_url}/{s.tenant_id}/oauth2/v2.0/token"
     data = {
         "client_id": s.client_id,
         "client_secret": s.client_secret,
         "grant_type": "client_credentials",
-        "scope": "https://api.fabric.microsoft.com/.default",
+        "scope": scope,
     }
 
-    r = sess.post(token_url, data=data, timeout=s.timeout_s)
+    with span("token.request", scope=scope):
+        r = sess.post(token_url, data=data, timeout=s.timeout_s)
     if not r.ok:
-        die(f"Failed to obtain access token. HTTP {r.status_code}\n\n{r.text}")
+        raise DeployError(f"Failed to obtain access token. HTTP {r.status_code}\n\n{r.text}")
 
     js = r.json()
     token = js.get("access_token")
     if not token:
-        die(f"Token response missing access_token: {json.dumps(js)}")
-    return token
-
+        raise DeployError(f"Token response missing access_token: {json.dumps(js)}")
+    return token, float(js.get("expires_in") or DEFAULT_TOKEN_LIFETIME_S)
 
-def headers(token: str) -> Dict[str, str]:
-    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-
-
-def _get_sleep_from_retry_after(value: Optional[str], default_s: int) -> int:
-    if not value:
-        return default_s
-    value = value.strip()
-    if value.isdigit():
-        return max(1, int(value))
-    return default_s
 
+def get_token_provider(s: Settings, session: Optional[requests.Session] = None, scope: str = FABRIC_SCOPE) -> TokenProvider:
+    """
+    Token provider for a whole run: the first token is fetched now (exiting when it cannot be
+    obtained), later ones shortly before the current one expires.
+    """
+    provider = TokenProvider(functools.partial(request_access_token, s, session, scope))
+    try:
+        provider.get()
+    except DeployError as exc:
+        die(str(exc))
+    return provider
 
-def wait_for_operation(session: requests.Session, token: str, op_url: str, *, timeout_s: int, default_sleep_s: int,) -> Dict[str, Any]:
-    deadline = time.time() + timeout_s
-    hdrs = {"Authorization": f"Bearer {token}"}
 
-    while True:
-        if time.time() > deadline:
-            raise RuntimeError(f"Operation did not finish within {timeout_s}s: {op_url}")
+def wait_for_operation(session: requests.Session, token: TokenProvider, op_url: str, *, timeout_s: int, default_sleep_s: int,) -> Dict[str, Any]:
+    tracker = OperationTracker(session, token, default_sleep_s=default_sleep_s)
+    return asyncio.run(tracker.wait(op_url, timeout_s=timeout_s))
 
-        r = session.get(op_url, headers=hdrs, timeout=60)
-        r.raise_for_status()
-        data = r.json()
 
-        status = (data.get("status") or data.get("state") or "").lower()
+def _operation_url(response: requests.Response) -> Optional[str]:
+    loc = response.headers.get("Location") or response.headers.get("location")
+    if loc and "/operations/" in loc:
+        return loc
+    return None
 
-        if status in ("succeeded", "success", "completed"):
-            return data
-        if status in ("failed", "cancelled", "canceled"):
-            raise RuntimeError(f"Operation failed: {data}")
 
-        sleep_s = _get_sleep_from_retry_after(r.headers.get("Retry-After"), default_sleep_s)
-        time.sleep(sleep_s)
+def get_operation_result(session: requests.Session, token: TokenProvider, op_url: str, *, timeout_s: int) -> Optional[Dict[str, Any]]:
+    """
+    Result of a succeeded long-running operation (the created item, the retrieved definition),
+    or None when the operation has no result.
+    """
+    r = session.get(f"{op_url.rstrip('/')}/result", auth=token, timeout=timeout_s)
+    if not r.ok:
+        return None
+    return r.json()
 
 
-def wait_if_async(session: requests.Session, token: str, response: requests.Response, s: Settings) -> None:
+async def await_if_async(tracker: OperationTracker, response: requests.Response, s: Settings) -> None:
     """
-    Waits only when response indicates async operation via Location: .../v1/operations/<id>.
+    Waits only when the response indicates an async operation (Location: .../v1/operations/<id>),
+    through the shared tracker.
     """
-    loc = response.headers.get("Location") or response.headers.get("location")
-    if loc and "/operations/" in loc:
-        wait_for_operation(
-            session=session,
-            token=token,
-            op_url=loc,
-            timeout_s=s.op_timeout_s,
-            default_sleep_s=s.op_default_sleep_s,
-        )
+    op_url = _operation_url(response)
+    if op_url:
+        await tracker.wait(op_url, timeout_s=s.op_timeout_s)
 
 
-def _iter_parts(root_dir: Path) -> Iterable[Dict[str, Any]]:
+def _iter_files(root_dir: Path) -> Iterable[Tuple[str, Path]]:
     for p in sorted(root_dir.rglob("*")):
         if p.is_dir():
             continue
-        rel_path = p.relative_to(root_dir).as_posix()
-        yield {
-            "path": rel_path,
-            "payload": base64.b64encode(p.read_bytes()).decode("utf-8"),
-            "payloadType": "InlineBase64",
-        }
+        yield p.relative_to(root_dir).as_posix(), p
 
 
-def _definition_payload(display_name: str, definition_dir: Path) -> Dict[str, Any]:
-    return {"displayName": display_name, "definition": {"parts": list(_iter_parts(definition_dir))}}
+def _definition_parts(definition: Path | Iterable[Tuple[str, PartSource]]) -> List[Tuple[str, PartSource]]:
+    """
+    Definition parts as (relative path, source) pairs, where the source is either the file on disk
+    or content already rendered in memory.
+    """
+    if isinstance(definition, Path):
+        return list(_iter_files(definition))
+    return list(definition)
+
+
+def _definition_payload(display_name: str, definition: Path | Iterable[Tuple[str, PartSource]], cache: Optional[EncodedPartCache] = None) -> DefinitionPayloadStream:
+    return DefinitionPayloadStream(display_name, _definition_parts(definition), cache=cache)
+
+
+def hash_definition(definition: Path | Iterable[Tuple[str, PartSource]], cache: Optional[EncodedPartCache] = None) -> str:
+    parts = _definition_parts(definition)
+    if cache is None:
+        return hash_parts((rel_path, read_part(source)) for rel_path, source in parts)
+    return hash_part_digests((rel_path, cache.digest(source)) for rel_path, source in parts)
+
+
+def get_remote_definition(s: Settings, token: TokenProvider, item_type: str, item_id: str, session: requests.Session) -> Optional[Dict[str, bytes]]:
+    """
+    Parts of the definition currently stored in Fabric by path, or None when it cannot be retrieved.
+    """
+    url = f"{s.api_base_url}/workspaces/{s.workspace_id}/items/{item_id}/getDefinition"
+    params = {"format": "TMDL"} if item_type == "SemanticModel" else None
+    r = session.post(url, headers=JSON_HEADERS, auth=token, params=params, timeout=s.timeout_s)
 
+    op_url = _operation_url(r)
+    if r.status_code == 202 and op_url:
+        wait_for_operation(session, token, op_url, timeout_s=s.op_timeout_s, default_sleep_s=s.op_default_sleep_s)
+        data = get_operation_result(session, token, op_url, timeout_s=s.timeout_s)
+    else:
+        data = r.json() if r.ok else None
+    if not data:
+        return None
 
-def patch_definition_for_api(path: Path, semantic_model_id: str) -> None:
-    data = load_json(path)
+    parts = (data.get("definition") or {}).get("parts", [])
+    return {p["path"]: base64.b64decode(p.get("payload", "")) for p in parts}
+
+
+def patch_definition_for_api(content: bytes, semantic_model_id: str) -> bytes:
+    data = json.loads(content)
     data["datasetReference"] = {
         "byConnection": {"connectionString": f"semanticmodelid={semantic_model_id}"}
     }
-    save_json(path, data)
-
+    return json_to_bytes(data)
 
-def get_workspace_items(s: Settings, token: str, session: requests.Session) -> List[Dict[str, Any]]:
-    url = f"{FABRIC_BASE_URL}/workspaces/{s.workspace_id}/items"
-    r = session.get(url, headers={"Authorization": f"Bearer {token}"}, timeout=s.timeout_s)
-    r.raise_for_status()
-    data = r.json()
-    return data.get("value", data)
 
+def _bind_report_to_model(ctx: "DeployContext", item, parts: List[Tuple[str, PartSource]], semantic_model_id: str) -> List[Tuple[str, PartSource]]:
+    """
+    Points definition.pbir at the deployed semantic model, in the payload parts, on disk and in
+    the rendered region, so the manifest records the bound file.
+    """
+    definition_rel = item.expected_report_definition.relative_to(item.expected_report_path).as_posix()
+    rendered = ctx.rendered.get(item.region_code)
+    bound: List[Tuple[str, PartSource]] = []
+    for rel_path, source in parts:
+        if rel_path == definition_rel:
+            source = patch_definition_for_api(read_part(source), semantic_model_id)
+            if write_if_changed(item.expected_report_definition, source) and rendered is None:
+                ctx.rewritten.add(item.region_code)
+            if rendered is not None:
+                rendered.report_overlay[rel_path] = source
+        bound.append((rel_path, source))
+    return bound
+
+
+def get_workspace_items(s: Settings, token: TokenProvider, session: requests.Session, *, item_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    url = f"{s.api_base_url}/workspaces/{s.workspace_id}/items"
+    params: Dict[str, str] = {"type": item_type} if item_type else {}
+    items: List[Dict[str, Any]] = []
 
-def get_existing_items(s: Settings, token: str, report_name: str, session: requests.Session) -> Dict[str, Optional[str]]:
-    items = get_workspace_items(s, token, session=session)
-    found: Dict[str, Optional[str]] = {"SemanticModel": None, "Report": None}
+    while True:
+        r = session.get(url, auth=token, params=params, timeout=s.timeout_s)
+        r.raise_for_status()
+        data = r.json()
+        if not isinstance(data, dict):
+            return data
+        items.extend(data.get("value", []))
 
-    for item in items:
-        if item.get("displayName") != report_name:
-            continue
-        t = item.get("type")
-        if t in found:
-            found[t] = item.get("id")
+        continuation_token = data.get("continuationToken")
+        if not continuation_token:
+            return items
+        params = {**params, "continuationToken": continuation_token}
 
-    return found
 
+class WorkspaceCatalog:
+    """
+    Index of the workspace items keyed by (displayName, type). All pages are listed on the first
+    lookup, so runs that know every item id from the registry never list the workspace. Afterwards
+    the index is updated in place as items are created, and only the items of a single type are
+    fetched again when a lookup misses.
+    """
 
-def resolve_item_id(s: Settings, token: str, display_name: str, item_type: str, session: requests.Session, *, attempts: int = 20, sleep_s: float = 2.0,) -> Optional[str]:
-    for _ in range(attempts):
-        items = get_workspace_items(s, token, session=session)
+    def __init__(self, s: Settings, token: TokenProvider, session: requests.Session) -> None:
+        self._s = s
+        self._token = token
+        self._session = session
+        self._items: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def load(self) -> "WorkspaceCatalog":
+        with span("catalog.load"):
+            items = get_workspace_items(self._s, self._token, session=self._session)
+        with self._lock:
+            self._items.clear()
+            self._index(items)
+            self._loaded = True
+        return self
+
+    def _ensure_loaded(self) -> None:
+        with self._load_lock:
+            if not self._loaded:
+                self.load()
+
+    def refresh(self, item_type: str) -> None:
+        self._ensure_loaded()
+        with span("catalog.refresh", item_type=item_type):
+            items = get_workspace_items(self._s, self._token, session=self._session, item_type=item_type)
+        with self._lock:
+            for key in [k for k in self._items if k[1] == item_type]:
+                del self._items[key]
+            self._index(items)
+
+    def get(self, display_name: str, item_type: str) -> Optional[str]:
+        self._ensure_loaded()
+        with self._lock:
+            return self._items.get((display_name, item_type))
+
+    def add(self, display_name: str, item_type: str, item_id: str) -> None:
+        with self._lock:
+            self._items[(display_name, item_type)] = item_id
+
+    def _index(self, items: Iterable[Dict[str, Any]]) -> None:
         for item in items:
-            if item.get("displayName") == display_name and item.get("type") == item_type:
-                return item.get("id")
-        time.sleep(sleep_s)
-    return None
+            name, item_type, item_id = item.get("displayName"), item.get("type"), item.get("id")
+            if name and item_type and item_id:
+                self._items[(name, item_type)] = item_id
+
+
+def resolve_item_id(catalog: WorkspaceCatalog, display_name: str, item_type: str, *, attempts: int = 20, sleep_s: float = 2.0,) -> Optional[str]:
+    with span("resolve_item_id", item_type=item_type):
+        return _resolve_item_id(catalog, display_name, item_type, attempts=attempts, sleep_s=sleep_s)
+
+
+def _resolve_item_id(catalog: WorkspaceCatalog, display_name: str, item_type: str, *, attempts: int, sleep_s: float) -> Optional[str]:
+    for attempt in range(attempts):
+        item_id = catalog.get(display_name, item_type)
+        if item_id:
+            return item_id
+        if attempt:
+            time.sleep(sleep_s)
+            record_sleep(sleep_s)
+        catalog.refresh(item_type)
+    return catalog.get(display_name, item_type)
 
 
 def _extract_id_from_response(r: requests.Response) -> Optional[str]:
@@ -219,94 +409,348 @@ def _extract_id_from_response(r: requests.Response) -> Optional[str]:
     return None
 
 
-def deploy_definition(url: str, definition_path: Path, headers_dict: Dict[str, str], display_name: str, *, session: Optional[requests.Session] = None, timeout_s: int = 180,) -> requests.Response:
+def deploy_definition(url: str, definition: Path | Iterable[Tuple[str, PartSource]], headers_dict: Dict[str, str], display_name: str, *, session: Optional[requests.Session] = None, timeout_s: int = 180, cache: Optional[EncodedPartCache] = None, auth: Optional[TokenProvider] = None,) -> requests.Response:
     sess = session or requests.Session()
-    payload = _definition_payload(display_name, definition_path)
-    return sess.post(url, headers=headers_dict, json=payload, timeout=timeout_s)
-
-
-def get_deploy(plan, deployer: Callable = deploy_definition) -> None:
-    s = Settings.from_env()
-    session = _make_session(s)
-    token = get_fabric_access_token(s, session=session)
+    payload = _definition_payload(display_name, definition, cache=cache)
+    return sess.post(url, headers=headers_dict, data=payload, auth=auth, timeout=timeout_s)
+
+
+@dataclass
+class DeployContext:
+    s: Settings
+    token: TokenProvider
+    session: requests.Session
+    catalog: WorkspaceCatalog
+    state: DeployState
+    registry: ItemRegistry
+    tracker: OperationTracker
+    deployer: Callable
+    part_cache: EncodedPartCache
+    rendered: Mapping[str, RenderedRegion] = field(default_factory=dict)
+    force: bool = False
+    verify_remote: bool = False
+    changed_models: Dict[str, str] = field(default_factory=dict)
+    rewritten: Set[str] = field(default_factory=set)
+    # Deploy slots of the workspace this context targets (see workspaces.Workspace.deploy_concurrency).
+    workspace: Optional[Workspace] = None
+    slots: Optional[asyncio.Semaphore] = None
+
+
+def _is_unchanged(ctx: DeployContext, item_type: str, item_id: str, display_name: str, definition_hash: str, parts: List[Tuple[str, PartSource]]) -> bool:
+    if ctx.force:
+        return False
+    recorded = ctx.state.get_hash(item_id)
+    if recorded is None and ctx.verify_remote:
+        remote = get_remote_definition(ctx.s, ctx.token, item_type, item_id, session=ctx.session)
+        if remote is not None and definitions_match({rel_path: read_part(source) for rel_path, source in parts}, remote):
+            ctx.state.record(item_id, item_type, display_name, definition_hash)
+            return True
+    return recorded == definition_hash
+
+
+class _StaleItemId(Exception):
+    def __init__(self, item_type: str) -> None:
+        super().__init__(item_type)
+        self.item_type = item_type
+
+
+async def _created_item_id(ctx: DeployContext, r: requests.Response, display_name: str, item_type: str) -> Optional[str]:
+    """
+    Id of an item created by createItem: from the 201 response body, or from the result of its
+    long-running operation once it succeeds. Falls back to a short workspace lookup.
+    """
+    op_url = _operation_url(r)
+    if op_url:
+        await ctx.tracker.wait(op_url, timeout_s=ctx.s.op_timeout_s)
+        created = await asyncio.to_thread(get_operation_result, ctx.session, ctx.token, op_url, timeout_s=ctx.s.timeout_s)
+        item_id = (created or {}).get("id")
+    else:
+        item_id = _extract_id_from_response(r)
+    if item_id:
+        return item_id
+    return await asyncio.to_thread(resolve_item_id, ctx.catalog, display_name, item_type, attempts=3, sleep_s=2.0)
+
+
+def _known_item_id(ctx: DeployContext, item, item_type: str) -> Tuple[Optional[str], bool]:
+    """
+    (item id, whether it came from the registry). The workspace is only listed for regions
+    the registry does not know.
+    """
+    item_id = ctx.registry.get_id(item.region_code, item_type)
+    if item_id:
+        return item_id, True
+    return ctx.catalog.get(item.report_name, item_type), False
 
-    for item in plan:
-        report_name = item.report_name
 
-        existing = get_existing_items(s, token, report_name, session=session)
-        existing_model_id = existing.get("SemanticModel")
-        existing_report_id = existing.get("Report")
+async def _deploy_region(ctx: DeployContext, item) -> bool:
+    """
+    Deploys the semantic model and then the report of one region. Returns False when both
+    were skipped because their definitions match the last deployed ones.
+    An item id from the registry that Fabric no longer knows (404) is forgotten, and the
+    region is deployed again with ids looked up in the workspace.
+    """
+    try:
+        return await _deploy_region_items(ctx, item)
+    except _StaleItemId as stale:
+        log(f"[{item.report_name}] Registered {stale.item_type} id not found in the workspace, looking it up")
+        ctx.registry.forget(item.region_code, stale.item_type)
+        return await _deploy_region_items(ctx, item)
+
+
+async def _deploy_region_items(ctx: DeployContext, item) -> bool:
+    # Blocking HTTP and file work runs in worker threads; operation waits go through the tracker.
+    s, token, session, catalog, deployer = ctx.s, ctx.token, ctx.session, ctx.catalog, ctx.deployer
+    report_name = item.report_name
+    changed = False
+
+    existing_model_id, model_registered = await asyncio.to_thread(_known_item_id, ctx, item, "SemanticModel")
+    existing_report_id, report_registered = await asyncio.to_thread(_known_item_id, ctx, item, "Report")
+
+    rendered = ctx.rendered.get(item.region_code)
+    if rendered:
+        model_parts, report_parts = list(rendered.model_parts()), list(rendered.report_parts())
+    else:
+        model_parts = await asyncio.to_thread(_definition_parts, item.expected_model_path)
+        report_parts = await asyncio.to_thread(_definition_parts, item.expected_report_path)
+
+    # --- Semantic Model ---
+    with span("deploy.semantic_model", item_type="SemanticModel"):
+        with span("definition.hash"):
+            model_hash = await asyncio.to_thread(hash_definition, model_parts, ctx.part_cache)
+        if existing_model_id and await asyncio.to_thread(_is_unchanged, ctx, "SemanticModel", existing_model_id, report_name, model_hash, model_parts):
+            log(f"[{report_name}] Semantic Model unchanged, skipping")
 
-        # --- Semantic Model ---
-        if existing_model_id:
-            url = f"{FABRIC_BASE_URL}/workspaces/{s.workspace_id}/semanticModels/{existing_model_id}/updateDefinition"
-            r = deployer(
-                url, item.expected_model_path, headers(token), report_name,
-                session=session, timeout_s=s.deploy_timeout_s
+            semantic_model_id = existing_model_id
+        elif existing_model_id:
+            url = f"{s.api_base_url}/workspaces/{s.workspace_id}/semanticModels/{existing_model_id}/updateDefinition"
+            r = await asyncio.to_thread(
+                deployer, url, model_parts, JSON_HEADERS, report_name,
+                session=session, auth=token, timeout_s=s.deploy_timeout_s
             )
+            if r.status_code == 404 and model_registered:
+                raise _StaleItemId("SemanticModel")
             if not r.ok:
-                die(f"Failed to update Semantic Model '{report_name}'. HTTP {r.status_code}\n\n{r.text}")
+                raise DeployError(f"Failed to update Semantic Model '{report_name}'. HTTP {r.status_code}\n\n{r.text}")
 
-            wait_if_async(session, token, r, s)
-            print("Updated Semantic Model")
+            await await_if_async(ctx.tracker, r, s)
+            log(f"[{report_name}] Updated Semantic Model")
 
             semantic_model_id = existing_model_id
+            changed = True
         else:
-            url = f"{FABRIC_BASE_URL}/workspaces/{s.workspace_id}/semanticModels"
-            r = deployer(
-                url, item.expected_model_path, headers(token), report_name,
-                session=session, timeout_s=s.deploy_timeout_s
+            url = f"{s.api_base_url}/workspaces/{s.workspace_id}/semanticModels"
+            r = await asyncio.to_thread(
+                deployer, url, model_parts, JSON_HEADERS, report_name,
+                session=session, auth=token, timeout_s=s.deploy_timeout_s
             )
             if not r.ok:
-                die(f"Failed to create Semantic Model '{report_name}'. HTTP {r.status_code}\n\n{r.text}")
+                raise DeployError(f"Failed to create Semantic Model '{report_name}'. HTTP {r.status_code}\n\n{r.text}")
 
-            wait_if_async(session, token, r, s)
-            print("Created Semantic Model")
+            semantic_model_id = await _created_item_id(ctx, r, report_name, "SemanticModel")
+            log(f"[{report_name}] Created Semantic Model")
 
-            semantic_model_id = (
-                resolve_item_id(s, token, report_name, "SemanticModel", session=session, attempts=25, sleep_s=2.0)
-                or _extract_id_from_response(r)
-            )
+            if semantic_model_id:
+                catalog.add(report_name, "SemanticModel", semantic_model_id)
+            changed = True
 
         if not semantic_model_id:
-            die(f"Could not resolve SemanticModel ID for '{report_name}' after deployment.")
-
-        patch_definition_for_api(item.expected_report_definition, semantic_model_id)
-        print(f"Binding report '{report_name}' to semantic model id: {semantic_model_id}")
+            raise DeployError(f"Could not resolve SemanticModel ID for '{report_name}' after deployment.")
+        ctx.registry.record(item.region_code, "SemanticModel", semantic_model_id, report_name, platform_logical_id(model_parts))
+        if changed:
+            ctx.state.record(semantic_model_id, "SemanticModel", report_name, model_hash)
+            ctx.changed_models[item.region_code] = semantic_model_id
+
+    # --- Report ---
+    with span("deploy.report", item_type="Report"):
+        report_parts = await asyncio.to_thread(_bind_report_to_model, ctx, item, report_parts, semantic_model_id)
+        log(f"[{report_name}] Binding report to semantic model id: {semantic_model_id}")
+
+        with span("definition.hash"):
+            report_hash = await asyncio.to_thread(hash_definition, report_parts, ctx.part_cache)
+        if existing_report_id and await asyncio.to_thread(_is_unchanged, ctx, "Report", existing_report_id, report_name, report_hash, report_parts):
+            log(f"[{report_name}] Report unchanged, skipping")
+            ctx.registry.record(item.region_code, "Report", existing_report_id, report_name, platform_logical_id(report_parts))
+            return changed
 
         if existing_report_id:
-            url = f"{FABRIC_BASE_URL}/workspaces/{s.workspace_id}/reports/{existing_report_id}/updateDefinition"
-            r2 = deployer(
-                url, item.expected_report_path, headers(token), report_name,
-                session=session, timeout_s=s.deploy_timeout_s
+            url = f"{s.api_base_url}/workspaces/{s.workspace_id}/reports/{existing_report_id}/updateDefinition"
+            r2 = await asyncio.to_thread(
+                deployer, url, report_parts, JSON_HEADERS, report_name,
+                session=session, auth=token, timeout_s=s.deploy_timeout_s
             )
+            if r2.status_code == 404 and report_registered:
+                raise _StaleItemId("Report")
             if not r2.ok:
-                die(
+                raise DeployError(
                     "Failed to update Report '{0}'. HTTP {1}\n\n"
                     "SemanticModelId used: {2}\n\nResponse:\n{3}".format(
                         report_name, r2.status_code, semantic_model_id, r2.text
                     )
                 )
 
-            wait_if_async(session, token, r2, s)  # <--- key addition
-            print("Updated Report")
+            await await_if_async(ctx.tracker, r2, s)  # <--- key addition
+            log(f"[{report_name}] Updated Report")
+
+            report_id = existing_report_id
         else:
-            url = f"{FABRIC_BASE_URL}/workspaces/{s.workspace_id}/reports"
-            r2 = deployer(
-                url, item.expected_report_path, headers(token), report_name,
-                session=session, timeout_s=s.deploy_timeout_s
+            url = f"{s.api_base_url}/workspaces/{s.workspace_id}/reports"
+            r2 = await asyncio.to_thread(
+                deployer, url, report_parts, JSON_HEADERS, report_name,
+                session=session, auth=token, timeout_s=s.deploy_timeout_s
             )
             if not r2.ok:
-                die(
+                raise DeployError(
                     "Failed to create Report '{0}'. HTTP {1}\n\n"
                     "SemanticModelId used: {2}\n\nResponse:\n{3}".format(
                         report_name, r2.status_code, semantic_model_id, r2.text
                     )
                 )
 
-            wait_if_async(session, token, r2, s)  # <--- key addition
-            print("Created Report")
+            report_id = await _created_item_id(ctx, r2, report_name, "Report")
+            log(f"[{report_name}] Created Report")
+
+            if report_id:
+                catalog.add(report_name, "Report", report_id)
+
+        if report_id:
+            ctx.registry.record(item.region_code, "Report", report_id, report_name, platform_logical_id(report_parts))
+            ctx.state.record(report_id, "Report", report_name, report_hash)
+        return True
 
 
-def deploy(plan, deployer: Callable = deploy_definition) -> None:
-    return get_deploy(plan, deployer=deployer)
+async def _run_region(ctx: DeployContext, item, result: DeployResult, slots: asyncio.Semaphore, queued: asyncio.Semaphore) -> None:
+    started = False
+    try:
+        # Workspace slot first: a region waiting on a busy workspace holds no run-wide slot.
+        async with ctx.slots, slots:
+            queued.release()
+            started = True
+            with span("deploy.region", region=item.region_code, workspace=ctx.workspace.name):
+                result.workspaces[item.region_code] = ctx.workspace
+                changed = await _deploy_region(ctx, item)
+    except Exception as exc:
+        result.failures[item.region_code] = f"{type(exc).__name__}: {exc}"
+        log(f"[{item.report_name}] Deploy failed")
+    else:
+        (result.deployed if changed else result.unchanged).append(item.region_code)
+    finally:
+        if not started:
+            queued.release()
+
+
+async def _deploy_all(contexts: Callable[[Any], DeployContext], plan: Iterable, workers: int) -> DeployResult:
+    loop = asyncio.get_running_loop()
+    # Threads only serve blocking HTTP/file calls: one per in-flight region and SUPPORT_THREADS.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers + SUPPORT_THREADS, thread_name_prefix="deploy"))
+
+    result = DeployResult()
+    slots = asyncio.Semaphore(workers)
+    # Regions pulled from the plan that have not started deploying yet.
+    queued = asyncio.Semaphore(workers)
+    tasks = []
+    items = iter(plan)
+    while True:
+        # The plan may be fed by a producer (pipelined generation), so items are pulled
+        # one at a time and only while fewer than `workers` regions are waiting for a slot.
+        await queued.acquire()
+        item = await asyncio.to_thread(next, items, None)
+        if item is None:
+            queued.release()
+            break
+        tasks.append(loop.create_task(_run_region(contexts(item), item, result, slots, queued)))
+    await asyncio.gather(*tasks)
+    return result
+
+
+def get_deploy(plan, deployer: Callable = deploy_definition, *, max_workers: Optional[int] = None, force: bool = False, verify_remote: bool = False, rendered: Optional[Mapping[str, RenderedRegion]] = None, assignment: Optional[WorkspaceAssignment] = None) -> DeployResult:
+    """
+    Deploys every region of the plan, which may be any iterable, including one that blocks while
+    regions are still being generated. Up to `max_workers` regions (default: Settings.deploy_concurrency)
+    are in flight at once; within a region the semantic model is always deployed before its report.
+    Items whose definition hash matches the deploy state are skipped unless `force` is set;
+    `verify_remote` compares against getDefinition when the state has no record of an item.
+    Regions present in `rendered` are deployed from memory instead of being read back from disk.
+
+    Regions are spread over the workspaces of `assignment` (default: the "workspaces" section of
+    the region config, or FABRIC_WORKSPACE_ID alone) and deployed to all of them in parallel, each
+    workspace within its own deploy_concurrency budget. Without `max_workers` the run-wide limit
+    is the sum of the budgets.
+    """
+    assignment = assignment if assignment is not None else load_workspace_assignment()
+    s = Settings.from_env(workspace_required=not assignment.configured)
+    budget = max(1, max_workers or s.deploy_concurrency)
+    workers = budget
+    if assignment.configured and not max_workers:
+        workers = sum(ws.deploy_concurrency or budget for ws in assignment.catalog.values())
+    limiter = AdaptiveRateLimiter()
+    session = make_session(s, limiter, pool_size=workers + SUPPORT_THREADS)
+    with span("deploy.token"):
+        token = get_token_provider(s, session=session)
+    if isinstance(plan, list):
+        plan = interleave(plan, assignment, s.workspace_id)
+    part_cache = EncodedPartCache()
+    if deployer is deploy_definition:
+        deployer = functools.partial(deploy_definition, cache=part_cache)
+    registry = ItemRegistry(s.workspace_id)
+    base = DeployContext(
+        s=s,
+        token=token,
+        session=session,
+        catalog=WorkspaceCatalog(s, token, session),
+        state=DeployState(),
+        registry=registry,
+        tracker=OperationTracker(session, token, default_sleep_s=s.op_default_sleep_s, request_timeout_s=s.timeout_s),
+        deployer=deployer,
+        part_cache=part_cache,
+        rendered=rendered if rendered is not None else {},
+        force=force,
+        verify_remote=verify_remote,
+    )
+
+    # One context per workspace, sharing the session, deploy state, tracker and part cache.
+    contexts: Dict[str, DeployContext] = {}
+
+    def context_for(item) -> DeployContext:
+        workspace = assignment.for_region(item.region_code, s.workspace_id)
+        if workspace.name not in contexts:
+            ws_settings = dataclasses.replace(s, workspace_id=workspace.workspace_id)
+            contexts[workspace.name] = dataclasses.replace(
+                base,
+                s=ws_settings,
+                catalog=WorkspaceCatalog(ws_settings, token, session),
+                registry=registry.for_workspace(workspace.workspace_id),
+                workspace=workspace,
+                slots=asyncio.Semaphore(max(1, workspace.deploy_concurrency or budget)),
+            )
+        return contexts[workspace.name]
+
+    try:
+        result = asyncio.run(_deploy_all(context_for, plan, workers))
+    finally:
+        base.state.save()
+        registry.save()
+
+    result.changed_models = dict(base.changed_models)
+    result.rewritten = sorted(base.rewritten)
+    per_workspace: Dict[str, int] = {}
+    for workspace in result.workspaces.values():
+        per_workspace[workspace.name] = per_workspace.get(workspace.name, 0) + 1
+    result.stats = {
+        "rate_limits": {name: vars(st) for name, st in limiter.stats().items()},
+        "operation_polls": base.tracker.poll_count,
+        "operation_wait_s": round(base.tracker.wait_s, 3),
+        "workspaces": dict(sorted(per_workspace.items())),
+        "token_requests": token.fetch_count,
+    }
+    log(f"Deployed {len(result.deployed)} region(s), {len(result.unchanged)} unchanged, {len(result.failures)} failed")
+    if assignment.configured:
+        log("Regions per workspace: " + ", ".join(f"{name}: {count}" for name, count in result.stats["workspaces"].items()))
+    log(f"Encoded parts: {part_cache.misses} encoded, {part_cache.hits} reused from cache")
+    log(f"Fabric API throttling: {limiter.summary()}")
+    for region, error in result.failures.items():
+        log(f"  {region}: {error}")
+    return result
+
+
+def deploy(plan, deployer: Callable = deploy_definition, *, max_workers: Optional[int] = None, force: bool = False, verify_remote: bool = False, rendered: Optional[Mapping[str, RenderedRegion]] = None, assignment: Optional[WorkspaceAssignment] = None) -> DeployResult:
+    return get_deploy(plan, deployer=deployer, max_workers=max_workers, force=force, verify_remote=verify_remote, rendered=rendered, assignment=assignment)
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+from utils import load_json, save_json
+
+
+DEPLOY_STATE_FILE = Path(".state/deploy_state.json")
+
+_JSON_SUFFIXES = (".json", ".pbir", ".pbism", ".platform")
+_TEXT_SUFFIXES = (".tmdl", ".dax", ".m", ".txt")
+
+
+def hash_parts(parts: Iterable[Tuple[str, bytes]]) -> str:
+    """
+    Stable hash of definition parts given as (relative path, content) pairs, independent of
+    the order in which the parts are produced.
+    """
+    return hash_part_digests((path, hashlib.sha256(content).hexdigest()) for path, content in parts)
+
+
+def hash_part_digests(parts: Iterable[Tuple[str, str]]) -> str:
+    """
+    Same as hash_parts, from (relative path, sha256 hex digest of the content) pairs.
+    """
+    entries = sorted(parts)
+    digest = hashlib.sha256()
+    for path, content_hash in entries:
+        digest.update(f"{path}\0{content_hash}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def normalize_part(path: str, content: bytes) -> bytes:
+    """
+    Content in the form used to compare local and service definitions: JSON with sorted keys and
+    no whitespace, text without BOM, with LF line endings and no trailing newlines. Other parts
+    (images, ...) are compared as is.
+    """
+    if path.endswith(_JSON_SUFFIXES):
+        try:
+            data = json.loads(content.decode("utf-8-sig"))
+        except ValueError:
+            return content
+        return json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if path.endswith(_TEXT_SUFFIXES):
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            return content
+        return text.replace("\r\n", "\n").rstrip("\n").encode("utf-8")
+    return content
+
+
+def definitions_match(local: Mapping[str, bytes], remote: Mapping[str, bytes]) -> bool:
+    """
+    Whether a local definition matches the one returned by getDefinition. Only the paths the
+    service returns are compared: it leaves out local-only files (.pbi/, DAXQueries/, TMDLScripts/...).
+    """
+    if not remote or not set(remote) <= set(local):
+        return False
+    return all(normalize_part(path, local[path]) == normalize_part(path, content) for path, content in remote.items())
+
+
+class DeployState:
+    """
+    Last successfully deployed definition hash per Fabric item id.
+    """
+
+    def __init__(self, path: Path = DEPLOY_STATE_FILE) -> None:
+        self._path = path
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            self._items = dict(load_json(path).get("items", {}))
+
+    def get_hash(self, item_id: str) -> Optional[str]:
+        with self._lock:
+            return (self._items.get(item_id) or {}).get("hash")
+
+    def record(self, item_id: str, item_type: str, display_name: str, definition_hash: str) -> None:
+        with self._lock:
+            self._items[item_id] = {"type": item_type, "displayName": display_name, "hash": definition_hash}
+
+    def save(self) -> None:
+        with self._lock:
+            items = dict(sorted(self._items.items()))
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        save_json(self._path, {"items": items})
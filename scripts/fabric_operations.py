@@ -0,0 +1,154 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from token_provider import TokenProvider
+from tracing import span
+
+
+SUCCEEDED_STATUSES = ("succeeded", "success", "completed")
+FAILED_STATUSES = ("failed", "cancelled", "canceled", "disabled")
+
+
+class OperationFailed(RuntimeError):
+    pass
+
+
+class OperationTimeout(RuntimeError):
+    pass
+
+
+def get_sleep_from_retry_after(value: Optional[str], default_s: int) -> int:
+    if not value:
+        return default_s
+    value = value.strip()
+    if value.isdigit():
+        return max(1, int(value))
+    return default_s
+
+
+def operation_status(data: Dict[str, Any]) -> str:
+    return (data.get("status") or data.get("state") or "").lower()
+
+
+@dataclass(order=True)
+class _PendingOperation:
+    due: float
+    seq: int
+    url: str = field(compare=False)
+    deadline: float = field(compare=False)
+    timeout_s: int = field(compare=False)
+    future: "asyncio.Future[Dict[str, Any]]" = field(compare=False)
+    # Context of the waiter, so polls are attributed to it (tracing spans) rather than to the runner.
+    context: contextvars.Context = field(compare=False, default_factory=contextvars.copy_context)
+
+
+class OperationTracker:
+    """
+    Watches any number of Fabric long-running operations from a single asyncio task.
+
+    Each operation is polled on its own schedule (its Retry-After header, or `default_sleep_s`)
+    until it succeeds, fails or passes its deadline. Polls run in worker threads only for the
+    duration of the HTTP call, so waiting operations do not hold a thread each. At most
+    `max_concurrent_polls` status requests are in flight at once. `poll_count` and `wait_s`
+    (summed over operations) describe how much of a run was spent waiting on the service.
+    """
+
+    def __init__(self, session: requests.Session, token: TokenProvider, *, default_sleep_s: int = 5, max_concurrent_polls: int = 8, request_timeout_s: int = 60) -> None:
+        self._session = session
+        self._token = token
+        self._default_sleep_s = default_sleep_s
+        self._request_timeout_s = request_timeout_s
+        self._max_concurrent_polls = max_concurrent_polls
+        self._heap: List[_PendingOperation] = []
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._poll_slots: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._polls: set = set()
+        self.poll_count = 0
+        self.wait_s = 0.0
+
+    async def wait(self, op_url: str, *, timeout_s: int) -> Dict[str, Any]:
+        """
+        Registers the operation and returns its final status payload. Raises OperationFailed
+        or OperationTimeout.
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        future: asyncio.Future = loop.create_future()
+        with span("operation.wait", category="wait", operation=op_url.rsplit("/", 1)[-1]):
+            self._schedule(_PendingOperation(now, next(self._seq), op_url, now + timeout_s, timeout_s, future))
+            try:
+                return await future
+            finally:
+                self.wait_s += loop.time() - now
+
+    def _schedule(self, op: _PendingOperation) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+            self._poll_slots = asyncio.Semaphore(self._max_concurrent_polls)
+        heapq.heappush(self._heap, op)
+        self._wake.set()
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            op = self._heap[0]
+            delay = op.due - loop.time()
+            if delay > 0:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if op.future.done():
+                continue
+            if loop.time() > op.deadline:
+                op.future.set_exception(OperationTimeout(f"Operation did not finish within {op.timeout_s}s: {op.url}"))
+                continue
+
+            task = loop.create_task(self._poll(op), context=op.context)
+            self._polls.add(task)
+            task.add_done_callback(self._polls.discard)
+
+    async def _poll(self, op: _PendingOperation) -> None:
+        self.poll_count += 1
+        async with self._poll_slots:
+            try:
+                data, retry_after = await asyncio.to_thread(self._get_status, op.url)
+            except Exception as exc:
+                if not op.future.done():
+                    op.future.set_exception(exc)
+                return
+
+        if op.future.done():
+            return
+        status = operation_status(data)
+        if status in SUCCEEDED_STATUSES:
+            op.future.set_result(data)
+            return
+        if status in FAILED_STATUSES:
+            op.future.set_exception(OperationFailed(f"Operation failed: {data}"))
+            return
+
+        loop = asyncio.get_running_loop()
+        sleep_s = get_sleep_from_retry_after(retry_after, self._default_sleep_s)
+        op.due = min(loop.time() + sleep_s, op.deadline)
+        op.seq = next(self._seq)
+        self._schedule(op)
+
+    def _get_status(self, op_url: str) -> Tuple[Dict[str, Any], Optional[str]]:
+        r = self._session.get(op_url, auth=self._token, timeout=self._request_timeout_s)
+        r.raise_for_status()
+        return r.json(), r.headers.get("Retry-After")
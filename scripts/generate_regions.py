@@ -1,14 +1,216 @@
+import argparse
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pathlib import Path
+
+import tracing
+from change_scope import SCRIPT_POLICIES, affected_regions, explicit_scope
 from config_reader import get_template_info  
-from models_manager import get_expected_reports
-from report_creator import create_model_and_report
-from deploy import deploy
+from dax_lint import SEVERITIES, lint_model, log_findings, parse_lint_options
+from generation_manifest import hash_rendered, hash_snapshot, load_manifest, record_regions, region_files, rendered_files, save_manifest, split_unchanged
+from models_manager import get_expected_reports, get_region_settings
+from region_output import OUTPUT_MODES
+from report_creator import EXECUTOR_KINDS, create_model_and_report
+from template_snapshot import load_template_snapshot
+from utils import die, log
+from workspaces import load_workspace_assignment
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generate regional PBIP reports from the template and deploy them to Fabric.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of regions generated concurrently (default: 1, serial).")
+    parser.add_argument("--executor", choices=EXECUTOR_KINDS, default="thread", help="Worker pool used when --workers > 1.")
+    parser.add_argument("--output-mode", choices=OUTPUT_MODES, default="copy", help="How template files a region does not rewrite are placed in its folders (default: copy). Falls back to copy when links are not possible.")
+    parser.add_argument("--deploy-workers", type=int, default=None, help="Maximum number of regions deployed concurrently (default: FABRIC_DEPLOY_CONCURRENCY or 1).")
+    parser.add_argument("--pipeline", action="store_true", help="Deploy each region as soon as it is generated instead of after all regions are generated.")
+    parser.add_argument("--pipeline-queue", type=int, default=8, help="Maximum number of generated regions waiting for deploy in --pipeline mode (default: 8).")
+    parser.add_argument("--refresh", action="store_true", help="After deploy, refresh the semantic models whose definition changed, largest regions first.")
+    parser.add_argument("--refresh-workers", type=int, default=None, help="Maximum number of refreshes running at once (default: FABRIC_REFRESH_CONCURRENCY or 2).")
+    parser.add_argument("--dax-fail-on", choices=SEVERITIES + ("none",), default=None, help="Stop before generation when the DAX linter reports a finding of this severity or higher (default: dax_lint.fail_on of the template config, error).")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument("--regions", nargs="+", default=None, metavar="CODE", help="Only generate and deploy these regions.")
+    scope.add_argument("--changed-since", default=None, metavar="RANGE", help="Only generate and deploy the regions affected by the changes in this git range (BASE, BASE..HEAD or BASE...HEAD).")
+    parser.add_argument("--script-changes", choices=SCRIPT_POLICIES, default="all", help="With --changed-since, whether a change under scripts/ affects every region or none (default: all).")
+    parser.add_argument("--generate-only", action="store_true", help="Generate the regions without deploying them.")
+    parser.add_argument("--force", action="store_true", help="Regenerate and redeploy every region, ignoring the generation manifest and the deploy state.")
+    parser.add_argument("--trace", type=Path, default=None, metavar="PATH", help="Record timing spans of every phase and HTTP call, write them as a Chrome trace (chrome://tracing, Perfetto) to PATH and print a summary.")
+    parser.add_argument("--verify-remote", action="store_true", help="Compare with the definition stored in Fabric when the deploy state has no record of an item.")
+    return parser.parse_args(argv)
+
+
+def _put(handoff: queue.Queue, item, cancelled: threading.Event) -> None:
+    while not cancelled.is_set():
+        try:
+            handoff.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def run_sequential(args, template, snapshot, pending, plans, assignment, previous_files):
+    with tracing.span("generate"):
+        result = create_model_and_report(template, pending, workers=args.workers, executor=args.executor, snapshot=snapshot, output_mode=args.output_mode, previous_files=previous_files)
+    if not result.ok:
+        details = "\n".join(f"  {region}: {error}" for region, error in result.failures.items())
+        die(f"Generation failed for {len(result.failures)} region(s):\n{details}")
+    if args.generate_only:
+        return result, None
+    # Imported here: requests and the Fabric client are not needed to generate.
+    from deploy import deploy
+    with tracing.span("deploy"):
+        deploy_result = deploy(plans, max_workers=args.deploy_workers, force=args.force, verify_remote=args.verify_remote, rendered=result.rendered, assignment=assignment)
+    return result, deploy_result
+
+
+def run_pipelined(args, template, snapshot, pending, unchanged, assignment, previous_files):
+    """
+    Generation feeds deploy through a bounded queue: a region is deployed as soon as it is
+    written, while the remaining regions are still being generated. Unchanged regions are
+    queued first. A region that fails to generate is reported and never reaches deploy.
+    """
+    from deploy import deploy
+
+    handoff: queue.Queue = queue.Queue(maxsize=max(1, args.pipeline_queue))
+    cancelled = threading.Event()
+    rendered = {}
+
+    def on_generated(plan, region) -> None:
+        rendered[plan.region_code] = region
+        _put(handoff, plan, cancelled)
+
+    def produce():
+        try:
+            for plan in unchanged:
+                _put(handoff, plan, cancelled)
+            with tracing.span("generate"):
+                return create_model_and_report(template, pending, workers=args.workers, executor=args.executor, snapshot=snapshot, output_mode=args.output_mode, on_generated=on_generated, previous_files=previous_files)
+        finally:
+            _put(handoff, None, cancelled)
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline") as producer:
+        generation = producer.submit(produce)
+        try:
+            with tracing.span("deploy"):
+                deploy_result = deploy(iter(handoff.get, None), max_workers=args.deploy_workers, force=args.force, verify_remote=args.verify_remote, rendered=rendered, assignment=assignment)
+        finally:
+            cancelled.set()
+        result = generation.result()
+
+    for region, error in result.failures.items():
+        log(f"Generation failed for {region}: {error}")
+    return result, deploy_result
+
+
+def lint_dax(args, template, snapshot) -> None:
+    """
+    Lints the template measures once, before they are copied to every region.
+    """
+    try:
+        options = parse_lint_options(template.dax_lint)
+    except ValueError as exc:
+        die(str(exc))
+    fail_on = args.dax_fail_on or options.fail_on
+    result = lint_model(snapshot.model_index, options)
+    log_findings(result)
+    failing = result.failing(None if fail_on == "none" else fail_on)
+    if failing:
+        die(f"{len(failing)} DAX lint finding(s) at or above {fail_on}; fix the template measures or change dax_lint in the template config")
+
+
+def select_regions(args, template, plans):
+    """
+    Plans of the regions in scope: those given with --regions, those affected by the
+    --changed-since range, or every region.
+    """
+    if args.regions is None and args.changed_since is None:
+        return plans
+    try:
+        if args.regions is not None:
+            scope = explicit_scope(args.regions, [p.region_code for p in plans])
+        else:
+            scope = affected_regions(args.changed_since, [template.template_model, template.template_report], args.script_changes)
+    except ValueError as exc:
+        die(str(exc))
+    for region, reason in sorted(scope.reasons.items()):
+        log(f"In scope: {'all regions' if region == '*' else region} ({reason})")
+    selected = scope.filter(plans)
+    if args.changed_since is not None and not scope.everything:
+        log(f"{len(selected)} of {len(plans)} region(s) affected by {args.changed_since}")
+    return selected
+
+
+def run(args) -> None:
+    with tracing.span("config"):
+        template = get_template_info()
+        plans = select_regions(args, template, get_expected_reports())
+        try:
+            assignment = None if args.generate_only else load_workspace_assignment()
+        except ValueError as exc:
+            die(str(exc))
+    if not plans:
+        log("No region affected, nothing to do")
+        return
+
+    with tracing.span("manifest.check"):
+        snapshot = load_template_snapshot(template)
+        template_hash = hash_snapshot(snapshot)
+        manifest = load_manifest()
+        output_hashes = {}
+        if args.force:
+            pending, unchanged = plans, []
+        else:
+            pending, unchanged = split_unchanged(template, template_hash, plans, manifest, output_hashes)
+    log(f"Generating {len(pending)} region(s), {len(unchanged)} unchanged")
+    # Files of the last generation, so files a region no longer has are removed and no others.
+    previous_files = {p.region_code: region_files(manifest, p.region_code) for p in pending}
+
+    if pending:
+        with tracing.span("lint"):
+            lint_dax(args, template, snapshot)
+
+    if args.pipeline and not args.generate_only:
+        result, deploy_result = run_pipelined(args, template, snapshot, pending, unchanged, assignment, previous_files)
+    else:
+        result, deploy_result = run_sequential(args, template, snapshot, pending, plans, assignment, previous_files)
+
+    # Recorded after deploy, which rewrites definition.pbir of every region it publishes.
+    with tracing.span("manifest.record"):
+        output_hashes.update((region, hash_rendered(rendered)) for region, rendered in result.rendered.items())
+        output_files = {region: rendered_files(rendered) for region, rendered in result.rendered.items()}
+        for region in deploy_result.rewritten if deploy_result else ():
+            output_hashes.pop(region, None)
+        record_regions(manifest, template, template_hash, [p for p in plans if p.region_code not in result.failures], output_hashes, output_files)
+        save_manifest(manifest)
+
+    if deploy_result is None:
+        return
+
+    if args.refresh:
+        from refresh import refresh_models
+        with tracing.span("refresh"):
+            refresh_result = refresh_models(deploy_result.changed_models, get_region_settings(), concurrency=args.refresh_workers, workspaces=deploy_result.workspaces)
+        if not refresh_result.ok:
+            die(f"Refresh failed for {len(refresh_result.failures)} region(s)")
+
+    if not result.ok or not deploy_result.ok:
+        die(f"Generation failed for {len(result.failures)} region(s), deploy failed for {len(deploy_result.failures)} region(s)")
+
 
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.trace:
+        return run(args)
 
-def main():
-    template = get_template_info()
-    plans = get_expected_reports()
-    create_model_and_report(template, plans)
-    deploy(plans)
+    tracer = tracing.enable()
+    try:
+        with tracing.span("run"):
+            run(args)
+    finally:
+        tracer.write_chrome_trace(args.trace)
+        tracer.log_summary()
+        log(f"Trace written to {args.trace}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+import hashlib
+import json
+from dataclasses import asdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from config_reader import PowerBiTemplateConfig
+from incremental_refresh import parse_policies, range_window
+from models_manager import ExpectedPbiReportInfo
+from template_snapshot import RenderedRegion, TemplateSnapshot
+from utils import load_json, save_json
+
+
+MANIFEST_FILE = Path(".state/generation_manifest.json")
+
+MANIFEST_VERSION = 2
+
+# Plan fields describing the state of the working tree rather than generation inputs.
+_NON_INPUT_FIELDS = ("model_exist", "report_exist", "settings")
+
+# Region settings that change the generated files (others, like refresh priority, do not).
+GENERATION_SETTINGS = ("incremental_refresh", "parameters", "slim_model")
+
+# Modules whose code decides the generated files: a change to any of them regenerates every region.
+GENERATOR_MODULES = (
+    "config_reader.py", "generation_manifest.py", "incremental_refresh.py", "model_slimming.py",
+    "models_manager.py", "region_output.py", "region_predicates.py", "report_creator.py",
+    "template_index.py", "template_snapshot.py", "tmdl.py", "utils.py",
+)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _update_digest(digest: "hashlib._Hash", index: int, files: Iterable[Tuple[str, bytes]]) -> None:
+    for rel_path, content in files:
+        digest.update(f"{index}:{rel_path}\0{_sha256(content)}\0".encode("utf-8"))
+
+
+def hash_tree(*roots: Path) -> str:
+    digest = hashlib.sha256()
+    for index, root in enumerate(roots):
+        if not root.exists():
+            digest.update(f"{index}:<missing>\0".encode("utf-8"))
+            continue
+        files = sorted((p.relative_to(root).as_posix(), p) for p in root.rglob("*") if not p.is_dir())
+        _update_digest(digest, index, ((rel_path, p.read_bytes()) for rel_path, p in files))
+    return digest.hexdigest()
+
+
+def hash_rendered(rendered: RenderedRegion) -> str:
+    # Same value as region_output_hash over rendered_files once the region is written, without reading it back.
+    digest = hashlib.sha256()
+    for index, files in enumerate((rendered.model_parts(), rendered.report_parts())):
+        _update_digest(digest, index, files)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def generator_hash() -> str:
+    scripts_dir = Path(__file__).resolve().parent
+    digest = hashlib.sha256()
+    _update_digest(digest, 0, ((name, (scripts_dir / name).read_bytes()) for name in GENERATOR_MODULES))
+    return digest.hexdigest()
+
+
+def hash_snapshot(snapshot: TemplateSnapshot) -> str:
+    # Same value as hash_tree over the template folders, without reading them again.
+    digest = hashlib.sha256()
+    for index, files in enumerate((snapshot.model_files, snapshot.report_files)):
+        _update_digest(digest, index, sorted(files.items()))
+    return digest.hexdigest()
+
+
+def region_config_inputs(plan: ExpectedPbiReportInfo) -> Dict[str, Any]:
+    inputs = {k: str(v) for k, v in asdict(plan).items() if k not in _NON_INPUT_FIELDS}
+    # Only present when set, so regions without settings keep their recorded hash.
+    settings = {k: plan.settings[k] for k in GENERATION_SETTINGS if plan.settings.get(k)}
+    if settings:
+        inputs["settings"] = settings
+    return dict(sorted(inputs.items()))
+
+
+def region_inputs_hash(template: PowerBiTemplateConfig, template_hash: str, plan: ExpectedPbiReportInfo) -> str:
+    inputs = {
+        "manifest_version": MANIFEST_VERSION,
+        "generator": generator_hash(),
+        "template_hash": template_hash,
+        "template_parameter": template.template_model_parameter,
+        "region": region_config_inputs(plan),
+    }
+    if template.region_predicates:
+        inputs["region_predicates"] = template.region_predicates
+    policies = parse_policies(plan.settings)
+    if policies:
+        # Unpinned RangeStart / RangeEnd follow the date: a new period regenerates the region.
+        inputs["range_window"] = [day.isoformat() for day in range_window(policies)]
+    return _sha256(json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+
+def _output_roots(plan: ExpectedPbiReportInfo) -> Tuple[Tuple[str, Path], ...]:
+    return ("model", plan.expected_model_path), ("report", plan.expected_report_path)
+
+
+def rendered_files(rendered: RenderedRegion) -> Dict[str, List[str]]:
+    return {"model": [rel_path for rel_path, _ in rendered.model_parts()], "report": [rel_path for rel_path, _ in rendered.report_parts()]}
+
+
+def tree_files(plan: ExpectedPbiReportInfo) -> Dict[str, List[str]]:
+    files: Dict[str, List[str]] = {}
+    for key, root in _output_roots(plan):
+        files[key] = sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if not p.is_dir()) if root.exists() else []
+    return files
+
+
+def region_output_hash(plan: ExpectedPbiReportInfo, files: Mapping[str, List[str]]) -> str:
+    """
+    Hash of the region's generated files (`files`, as recorded in the manifest). Other files in
+    the region folders, such as local .pbi/ settings, do not count.
+    """
+    digest = hashlib.sha256()
+    for index, (key, root) in enumerate(_output_roots(plan)):
+        for rel_path in files.get(key, []):
+            path = root / rel_path
+            if path.is_file():
+                _update_digest(digest, index, [(rel_path, path.read_bytes())])
+            else:
+                digest.update(f"{index}:{rel_path}\0<missing>\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def region_files(manifest: Mapping[str, Any], region_code: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Files last generated for the region, or None when the manifest has no record of it.
+    """
+    entry = manifest.get("regions", {}).get(region_code) or {}
+    return manifest.get("file_sets", {}).get(entry.get("files"))
+
+
+def load_manifest(path: Path = MANIFEST_FILE) -> Dict[str, Any]:
+    if not path.exists():
+        return {"version": MANIFEST_VERSION, "regions": {}, "file_sets": {}}
+    data = load_json(path)
+    if data.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "regions": {}, "file_sets": {}}
+    data.setdefault("regions", {})
+    data.setdefault("file_sets", {})
+    return data
+
+
+def save_manifest(manifest: Dict[str, Any], path: Path = MANIFEST_FILE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_json(path, manifest)
+
+
+def split_unchanged(template: PowerBiTemplateConfig, template_hash: str, plans: Iterable[ExpectedPbiReportInfo], manifest: Dict[str, Any], output_hashes: Optional[Dict[str, str]] = None) -> Tuple[List[ExpectedPbiReportInfo], List[ExpectedPbiReportInfo]]:
+    """
+    Returns (plans to generate, unchanged plans). A region is unchanged when its inputs hash
+    matches the manifest and its generated files still hash to the recorded value. The output
+    hashes of unchanged regions are added to `output_hashes`, for record_regions.
+    """
+    pending: List[ExpectedPbiReportInfo] = []
+    unchanged: List[ExpectedPbiReportInfo] = []
+    regions = manifest.get("regions", {})
+
+    for plan in plans:
+        entry = regions.get(plan.region_code) or {}
+        if entry.get("inputs") != region_inputs_hash(template, template_hash, plan):
+            pending.append(plan)
+            continue
+        files = region_files(manifest, plan.region_code)
+        output_hash = region_output_hash(plan, files) if files is not None else None
+        if output_hash is not None and entry.get("output") == output_hash:
+            unchanged.append(plan)
+            if output_hashes is not None:
+                output_hashes[plan.region_code] = output_hash
+        else:
+            pending.append(plan)
+    return pending, unchanged
+
+
+def record_regions(manifest: Dict[str, Any], template: PowerBiTemplateConfig, template_hash: str, plans: Iterable[ExpectedPbiReportInfo], output_hashes: Optional[Mapping[str, str]] = None, output_files: Optional[Mapping[str, Mapping[str, List[str]]]] = None) -> None:
+    """
+    Records the inputs and output hashes of `plans`, and the files generated for them. Output
+    hashes already known (of rendered regions, or computed by split_unchanged) are taken from
+    `output_hashes`; others are read from disk. Files come from `output_files` (rendered regions),
+    the previous record, or else the region folders as they are.
+    Regions with the same files share one entry of "file_sets".
+    """
+    regions = manifest.setdefault("regions", {})
+    file_sets = manifest.setdefault("file_sets", {})
+    output_hashes = output_hashes or {}
+    output_files = output_files or {}
+    for plan in plans:
+        files = output_files.get(plan.region_code) or region_files(manifest, plan.region_code) or tree_files(plan)
+        files_key = _sha256(json.dumps(files, sort_keys=True).encode("utf-8"))[:16]
+        file_sets[files_key] = dict(files)
+        regions[plan.region_code] = {
+            "inputs": region_inputs_hash(template, template_hash, plan),
+            "output": output_hashes.get(plan.region_code) or region_output_hash(plan, files),
+            "files": files_key,
+        }
+    manifest["regions"] = dict(sorted(regions.items()))
+    used = {entry.get("files") for entry in regions.values()}
+    manifest["file_sets"] = {key: file_sets[key] for key in sorted(file_sets) if key in used}
@@ -0,0 +1,239 @@
+import calendar
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import tmdl
+from template_index import TemplateIndex
+from utils import decode_text
+
+
+GRANULARITIES = ("day", "month", "quarter", "year")
+
+RANGE_PARAMETERS = ("RangeStart", "RangeEnd")
+
+FILTER_STEP = '#"Incremental Refresh Filter"'
+
+_LINEAGE_NAMESPACE = uuid.UUID("5b0f6c1e-3d1a-4c4b-9a59-6c7e3f1d2a10")
+
+_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+
+
+@dataclass(frozen=True)
+class IncrementalRefreshPolicy:
+    table: str
+    date_column: str
+    rolling_window_periods: int
+    incremental_periods: int
+    rolling_window_granularity: str = "year"
+    incremental_granularity: str = "month"
+    range_start: Optional[date] = None
+    range_end: Optional[date] = None
+
+
+def parse_policies(region_settings: Mapping[str, Any]) -> List[IncrementalRefreshPolicy]:
+    """
+    Policies from the "incremental_refresh" section of a region's settings, e.g.
+    {"Sales_fct": {"date_column": "Month_Year", "rolling_window_periods": 3, "incremental_periods": 3}}.
+    Optional "range_start" / "range_end" (ISO dates) pin the RangeStart / RangeEnd values.
+    """
+    policies = []
+    for table, cfg in sorted((region_settings.get("incremental_refresh") or {}).items()):
+        if not cfg:
+            continue
+        missing = [k for k in ("date_column", "rolling_window_periods", "incremental_periods") if k not in cfg]
+        if missing:
+            raise ValueError(f"Incremental refresh of `{table}` is missing: {', '.join(missing)}")
+        policy = IncrementalRefreshPolicy(
+            table=table,
+            date_column=cfg["date_column"],
+            rolling_window_periods=int(cfg["rolling_window_periods"]),
+            incremental_periods=int(cfg["incremental_periods"]),
+            rolling_window_granularity=cfg.get("rolling_window_granularity", "year"),
+            incremental_granularity=cfg.get("incremental_granularity", "month"),
+            range_start=_parse_date(table, "range_start", cfg.get("range_start")),
+            range_end=_parse_date(table, "range_end", cfg.get("range_end")),
+        )
+        for granularity in (policy.rolling_window_granularity, policy.incremental_granularity):
+            if granularity not in GRANULARITIES:
+                raise ValueError(f"Unknown granularity `{granularity}` for `{table}`, expected one of: {', '.join(GRANULARITIES)}")
+        try:
+            range_window([policy])
+        except ValueError as exc:
+            raise ValueError(f"Incremental refresh of `{table}`: {exc}") from None
+        policies.append(policy)
+    return policies
+
+
+def _parse_date(table: str, key: str, value: Optional[str]) -> Optional[date]:
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Incremental refresh of `{table}`: {key} `{value}` is not an ISO date (YYYY-MM-DD)") from None
+
+
+def _period_start(day: date, granularity: str) -> date:
+    if granularity == "day":
+        return day
+    month = (day.month - 1) // _MONTHS[granularity] * _MONTHS[granularity] + 1
+    return date(day.year, month, 1)
+
+
+def _add_periods(day: date, granularity: str, periods: int) -> date:
+    if granularity == "day":
+        return day + timedelta(days=periods)
+    index = day.year * 12 + day.month - 1 + periods * _MONTHS[granularity]
+    year, month = index // 12, index % 12 + 1
+    # A pinned month end (e.g. March 31) lands on the last day of a shorter target month.
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def range_window(policies: List[IncrementalRefreshPolicy], today: Optional[date] = None) -> Tuple[date, date]:
+    """
+    RangeStart / RangeEnd used when the model is opened locally (the service replaces them for
+    every partition): the policies' incremental periods up to the end of the current one, unless
+    pinned with range_start / range_end. Covers every policy when there are several.
+    """
+    today = today or date.today()
+    starts, ends = [], []
+    for policy in policies:
+        granularity = policy.incremental_granularity
+        end = policy.range_end or _add_periods(_period_start(today, granularity), granularity, 1)
+        start = policy.range_start or _add_periods(end, granularity, -policy.incremental_periods)
+        if start >= end:
+            raise ValueError(f"range_start {start.isoformat()} is not before range_end {end.isoformat()}")
+        starts.append(start)
+        ends.append(end)
+    return min(starts), max(ends)
+
+
+def _m_field(name: str) -> str:
+    return f"[{name}]" if re.fullmatch(r"[A-Za-z0-9_ ]+", name) else '[#"' + name.replace('"', '""') + '"]'
+
+
+def table_object(doc: tmdl.TmdlDocument) -> tmdl.TmdlObject:
+    table = doc.find("table")
+    if table is None:
+        raise ValueError("No table declared in the file")
+    return table
+
+
+def partition_source(doc: tmdl.TmdlDocument) -> Tuple[int, int]:
+    """
+    (first, end) line indexes of the M expression of the table's single `= m` partition.
+    """
+    partitions = [p for p in table_object(doc).iter("partition") if p.expression == "m"]
+    if len(partitions) != 1:
+        raise ValueError(f"Expected exactly one M partition, found {len(partitions)}")
+    source = doc.property_lines(partitions[0], "source")
+    if source is None:
+        raise ValueError("M partition without a source expression")
+    return source
+
+
+def _filtered_expression(expression: List[str], date_column: str) -> List[str]:
+    in_index = max((i for i, line in enumerate(expression) if line.strip() == "in"), default=None)
+    if in_index is None or in_index + 1 >= len(expression):
+        raise ValueError("Partition source is not a let ... in expression")
+    result_step = expression[in_index + 1].strip()
+    if result_step == FILTER_STEP:
+        return expression
+
+    last_step = in_index - 1
+    while last_step > 0 and not expression[last_step].strip():
+        last_step -= 1
+    indent = expression[last_step][: len(expression[last_step]) - len(expression[last_step].lstrip())]
+    column = f"DateTime.From({_m_field(date_column)})"
+    filter_line = f"{indent}{FILTER_STEP} = Table.SelectRows({result_step}, each {column} >= RangeStart and {column} < RangeEnd)"
+    result_indent = expression[in_index + 1][: len(expression[in_index + 1]) - len(expression[in_index + 1].lstrip())]
+    return (
+        expression[:last_step]
+        + [expression[last_step] + ",", filter_line]
+        + expression[last_step + 1:in_index + 1]
+        + [f"{result_indent}{FILTER_STEP}"]
+        + expression[in_index + 2:]
+    )
+
+
+def apply_refresh_policy(text: str, policy: IncrementalRefreshPolicy) -> str:
+    """
+    Filters the table's M partition on RangeStart <= date column < RangeEnd and adds a basic
+    refreshPolicy with the same source expression. The service creates the rolling window
+    partitions on the first refresh and afterwards only reprocesses the incremental ones.
+    """
+    doc = tmdl.parse(text)
+    first, end = partition_source(doc)
+    expression = _filtered_expression(doc.lines[first:end], policy.date_column)
+    lines = list(doc.lines)
+    lines[first:end] = expression
+
+    doc = tmdl.parse("\n".join(lines))
+    existing = table_object(doc).find("refreshPolicy")
+    if existing is not None:
+        doc = tmdl.parse(doc.without([existing]))
+    table = table_object(doc)
+    lines = list(doc.lines)
+
+    block = [
+        "\trefreshPolicy",
+        "\t\tpolicyType: basic",
+        f"\t\trollingWindowGranularity: {policy.rolling_window_granularity}",
+        f"\t\trollingWindowPeriods: {policy.rolling_window_periods}",
+        f"\t\tincrementalGranularity: {policy.incremental_granularity}",
+        f"\t\tincrementalPeriods: {policy.incremental_periods}",
+        "\t\tsourceExpression =",
+        *expression,
+        "",
+    ]
+    # Right after the table-level properties, before the first column / measure / partition.
+    at = table.children[0].start if table.children else table.end
+    lines[at:at] = block
+    return "\n".join(lines)
+
+
+def _m_datetime(day: date) -> str:
+    return f"#datetime({day.year}, {day.month}, {day.day}, 0, 0, 0)"
+
+
+def add_range_parameters(expressions_tmdl: str, window: Tuple[date, date]) -> str:
+    """
+    Declares the RangeStart / RangeEnd DateTime parameters incremental refresh filters on, with
+    the `window` values, unless the model already has them.
+    """
+    doc = tmdl.parse(expressions_tmdl)
+    text = expressions_tmdl.rstrip("\n")
+    for name, value in zip(RANGE_PARAMETERS, window):
+        if doc.find("expression", name) is not None:
+            continue
+        text += (
+            f"\n\nexpression {name} = {_m_datetime(value)} meta [IsParameterQuery=true, Type=\"DateTime\", IsParameterQueryRequired=true]\n"
+            f"\tlineageTag: {uuid.uuid5(_LINEAGE_NAMESPACE, name)}\n"
+            f"\n\tannotation PBI_ResultType = DateTime"
+        )
+    return text + "\n"
+
+
+def render_incremental_refresh(index: TemplateIndex, overlay: Mapping[str, bytes], expressions_rel: str, policies: List[IncrementalRefreshPolicy], today: Optional[date] = None) -> Dict[str, bytes]:
+    """
+    Overlay entries (table files and expressions.tmdl) applying `policies` on top of the template
+    model and the region's `overlay`.
+    """
+    if not policies:
+        return {}
+
+    def current(rel_path: str) -> str:
+        return decode_text(overlay[rel_path]) if rel_path in overlay else index.texts[rel_path]
+
+    result: Dict[str, bytes] = {}
+    for policy in policies:
+        rel_path = index.table_file(policy.table)
+        try:
+            result[rel_path] = apply_refresh_policy(current(rel_path), policy).encode("utf-8")
+        except ValueError as exc:
+            raise ValueError(f"Cannot add incremental refresh to `{policy.table}`: {exc}") from exc
+    result[expressions_rel] = add_range_parameters(current(expressions_rel), range_window(policies, today)).encode("utf-8")
+    return result
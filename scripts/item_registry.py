@@ -0,0 +1,68 @@
+import copy
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from definition_payload import PartSource, read_part
+from utils import load_json, save_json
+
+
+ITEM_REGISTRY_FILE = Path(".state/item_registry.json")
+
+
+def platform_logical_id(parts: Iterable[Tuple[str, PartSource]]) -> Optional[str]:
+    for rel_path, source in parts:
+        if rel_path == ".platform":
+            return (json.loads(read_part(source)).get("config") or {}).get("logicalId")
+    return None
+
+
+class ItemRegistry:
+    """
+    Fabric item ids resolved in earlier runs, per workspace, region and item type, together with
+    the logicalId of the local folder they were deployed from. Lets a run update known items
+    without listing the workspace; an id the service no longer knows is dropped with forget().
+    """
+
+    def __init__(self, workspace_id: str, path: Path = ITEM_REGISTRY_FILE) -> None:
+        self._path = path
+        self._workspace_id = workspace_id
+        self._workspaces: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            self._workspaces = dict(load_json(path).get("workspaces", {}))
+
+    def for_workspace(self, workspace_id: str) -> "ItemRegistry":
+        """
+        View of the same registry for another workspace; saving either saves both.
+        """
+        view = copy.copy(self)
+        view._workspace_id = workspace_id
+        return view
+
+    def _regions(self) -> Dict[str, Dict[str, Any]]:
+        return self._workspaces.setdefault(self._workspace_id, {})
+
+    def get_id(self, region_code: str, item_type: str) -> Optional[str]:
+        with self._lock:
+            entry = (self._regions().get(region_code) or {}).get(item_type) or {}
+            return entry.get("id")
+
+    def record(self, region_code: str, item_type: str, item_id: str, display_name: str, logical_id: Optional[str]) -> None:
+        with self._lock:
+            self._regions().setdefault(region_code, {})[item_type] = {
+                "id": item_id,
+                "displayName": display_name,
+                "logicalId": logical_id,
+            }
+
+    def forget(self, region_code: str, item_type: str) -> None:
+        with self._lock:
+            (self._regions().get(region_code) or {}).pop(item_type, None)
+
+    def save(self) -> None:
+        with self._lock:
+            workspaces = {ws: dict(sorted(regions.items())) for ws, regions in sorted(self._workspaces.items())}
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        save_json(self._path, {"workspaces": workspaces})
@@ -0,0 +1,653 @@
+import argparse
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+import tmdl
+from template_index import TemplateIndex
+from utils import die, log
+
+
+MODEL_FILE = "definition/model.tmdl"
+RELATIONSHIPS_FILE = "definition/relationships.tmdl"
+CULTURES_DIR = "definition/cultures/"
+ROLES_DIR = "definition/roles/"
+PERSPECTIVES_DIR = "definition/perspectives/"
+
+# Tables Power BI Desktop adds for auto date/time.
+AUTO_DATE_PREFIXES = ("LocalDateTable_", "DateTableTemplate_")
+
+TIME_INTELLIGENCE_ANNOTATION = "__PBI_TimeIntelligenceEnabled"
+
+ColumnRef = Tuple[str, str]
+
+_COLUMN_REF = re.compile(r"^('(?:[^']|'')*'|[^.']+)\.(.+)$")
+
+_DAX_COMMENTS = re.compile(r"//[^\n]*|--[^\n]*|/\*.*?\*/", re.DOTALL)
+_DAX_STRINGS = re.compile(r'"(?:[^"]|"")*"')
+_DAX_QUALIFIED = re.compile(r"('(?:[^']|'')+'|[A-Za-z_][A-Za-z0-9_.]*)\s*\[((?:[^\]]|\]\])+)\]")
+_DAX_BRACKETED = re.compile(r"\[((?:[^\]]|\]\])+)\]")
+_DAX_QUOTED_TABLE = re.compile(r"'((?:[^']|'')+)'")
+_DAX_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_.\-]*")
+
+
+@dataclass(frozen=True)
+class SlimmingOptions:
+    disable_auto_date: bool = False
+    keep: Tuple[str, ...] = ()
+    table_rows: Tuple[Tuple[str, float], ...] = ()
+
+
+def parse_slimming_options(region_settings: Mapping[str, Any]) -> Optional[SlimmingOptions]:
+    """
+    Options from the "slim_model" entry of a region's settings: true, or e.g.
+    {"disable_auto_date": true, "keep": ["Sales_fct[Product ID]"], "table_rows": {"Sales_fct": 250000000}}.
+    None when the region is not slimmed.
+    """
+    cfg = region_settings.get("slim_model")
+    if not cfg:
+        return None
+    if cfg is True:
+        return SlimmingOptions()
+    return SlimmingOptions(
+        disable_auto_date=bool(cfg.get("disable_auto_date", False)),
+        keep=tuple(cfg.get("keep") or ()),
+        table_rows=tuple(sorted((cfg.get("table_rows") or {}).items())),
+    )
+
+
+@dataclass
+class SlimmingReport:
+    removed_tables: List[str] = field(default_factory=list)
+    removed_columns: Dict[str, List[str]] = field(default_factory=dict)
+    removed_hierarchies: List[str] = field(default_factory=list)
+    auto_date_disabled: bool = False
+    stored_columns: int = 0
+    # Share of stored column data (columns of import tables, weighted by table rows when known) removed.
+    estimated_saving: float = 0.0
+
+    def summary(self) -> str:
+        columns = sum(len(c) for c in self.removed_columns.values())
+        auto_date = ", auto date/time disabled" if self.auto_date_disabled else ""
+        return (
+            f"removed {len(self.removed_tables)} table(s), {columns} of {self.stored_columns} stored column(s){auto_date}; "
+            f"estimated {self.estimated_saving:.0%} less column data"
+        )
+
+
+@dataclass
+class _Table:
+    name: str
+    rel_path: str
+    doc: tmdl.TmdlDocument
+    obj: tmdl.TmdlObject
+
+    @property
+    def columns(self) -> Dict[str, tmdl.TmdlObject]:
+        return {c.name: c for c in self.obj.iter("column")}
+
+    @property
+    def measures(self) -> Dict[str, tmdl.TmdlObject]:
+        return {m.name: m for m in self.obj.iter("measure")}
+
+    @property
+    def partition_kind(self) -> str:
+        partition = self.obj.find("partition")
+        return partition.expression if partition else ""
+
+    @property
+    def is_auto_date(self) -> bool:
+        return self.name.startswith(AUTO_DATE_PREFIXES)
+
+    @property
+    def prunable(self) -> bool:
+        # Only columns of Power Query tables can be dropped one by one; calculated tables and
+        # field parameters produce their columns from one expression and are kept or dropped whole.
+        return self.partition_kind == "m" and not self.is_auto_date
+
+
+@dataclass
+class _Relationship:
+    obj: tmdl.TmdlObject
+    from_column: ColumnRef
+    to_column: ColumnRef
+    both_directions: bool
+
+
+def split_column_ref(ref: str) -> ColumnRef:
+    """
+    `'Table name'.Column` or `Table.'Column name'` -> (table, column).
+    """
+    match = _COLUMN_REF.match(ref.strip())
+    if not match:
+        raise ValueError(f"Not a column reference: {ref}")
+    return tmdl.unquote(match.group(1)), tmdl.unquote(match.group(2))
+
+
+class _Model:
+    """
+    What slimming needs from a TemplateIndex: its tables with their documents, the relationships
+    and the measure names. Nothing is parsed again.
+    """
+
+    def __init__(self, index: TemplateIndex) -> None:
+        self.index = index
+        self.tables = {name: _Table(name, rel_path, index.documents[rel_path], obj) for name, (rel_path, obj) in index.tables.items()}
+        self.relationships_doc = index.documents.get(RELATIONSHIPS_FILE)
+        self.relationships: List[_Relationship] = []
+        for obj in self.relationships_doc.objects if self.relationships_doc else ():
+            if obj.kind == "relationship" and "fromColumn" in obj.properties:
+                self.relationships.append(_Relationship(
+                    obj,
+                    split_column_ref(obj.properties["fromColumn"]),
+                    split_column_ref(obj.properties["toColumn"]),
+                    obj.properties.get("crossFilteringBehavior") == "bothDirections",
+                ))
+        self.measure_names: Set[str] = {name for _, name in index.measures}
+
+
+def dax_references(expression: str, index: _Model, home_table: Optional[str] = None) -> Tuple[Set[str], Set[ColumnRef], Set[ColumnRef]]:
+    """
+    (tables, columns, measures) a DAX expression refers to. Unqualified [Name] references that
+    are not measures are resolved conservatively: to the home table when it has such a column,
+    otherwise to every table that has one (iterators bring columns of any table into scope).
+    """
+    text = _DAX_STRINGS.sub('""', _DAX_COMMENTS.sub(" ", expression))
+    tables: Set[str] = set()
+    columns: Set[ColumnRef] = set()
+    measures: Set[ColumnRef] = set()
+
+    def add(table: str, name: str) -> None:
+        target = index.tables.get(table)
+        if target is None:
+            return
+        tables.add(table)
+        if name in target.columns:
+            columns.add((table, name))
+        elif name in target.measures:
+            measures.add((table, name))
+
+    for match in _DAX_QUALIFIED.finditer(text):
+        add(tmdl.unquote(match.group(1)), match.group(2).replace("]]", "]"))
+    remainder = _DAX_QUALIFIED.sub(" ", text)
+
+    for match in _DAX_BRACKETED.finditer(remainder):
+        name = match.group(1).replace("]]", "]")
+        if name in index.measure_names:
+            for table in index.tables.values():
+                if name in table.measures:
+                    measures.add((table.name, name))
+            continue
+        home = index.tables.get(home_table) if home_table else None
+        if home is not None and name in home.columns:
+            columns.add((home_table, name))
+            continue
+        columns.update((table.name, name) for table in index.tables.values() if name in table.columns)
+    remainder = _DAX_BRACKETED.sub(" ", remainder)
+
+    for match in _DAX_QUOTED_TABLE.finditer(remainder):
+        name = match.group(1).replace("''", "'")
+        if name in index.tables:
+            tables.add(name)
+    for match in _DAX_IDENTIFIER.finditer(_DAX_QUOTED_TABLE.sub(" ", remainder)):
+        if match.group(0) in index.tables:
+            tables.add(match.group(0))
+    return tables, columns, measures
+
+
+@dataclass
+class ReportReferences:
+    tables: Set[str] = field(default_factory=set)
+    columns: Set[ColumnRef] = field(default_factory=set)
+    measures: Set[ColumnRef] = field(default_factory=set)
+    hierarchies: Set[ColumnRef] = field(default_factory=set)
+    # Columns whose auto date/time hierarchy (variation) is used, with the files using it.
+    variations: Dict[ColumnRef, Set[str]] = field(default_factory=dict)
+
+
+def _entity(expression: Any, aliases: Mapping[str, str]) -> Optional[str]:
+    source = (expression or {}).get("SourceRef") if isinstance(expression, dict) else None
+    if not isinstance(source, dict):
+        return None
+    return source.get("Entity") or aliases.get(source.get("Source", ""))
+
+
+def _collect(node: Any, aliases: Dict[str, str], refs: ReportReferences, rel_path: str) -> None:
+    if isinstance(node, list):
+        for item in node:
+            _collect(item, aliases, refs, rel_path)
+        return
+    if not isinstance(node, dict):
+        return
+
+    if isinstance(node.get("From"), list):
+        aliases = {**aliases, **{f["Name"]: f["Entity"] for f in node["From"] if isinstance(f, dict) and "Name" in f and "Entity" in f}}
+    for key, value in node.items():
+        if not isinstance(value, dict):
+            continue
+        if key in ("Column", "Measure") and "Property" in value:
+            entity = _entity(value.get("Expression"), aliases)
+            if entity:
+                (refs.columns if key == "Column" else refs.measures).add((entity, value["Property"]))
+        elif key == "Hierarchy" and "Hierarchy" in value:
+            expression = value.get("Expression") or {}
+            variation = expression.get("PropertyVariationSource")
+            if isinstance(variation, dict):
+                entity = _entity(variation.get("Expression"), aliases)
+                if entity:
+                    refs.columns.add((entity, variation.get("Property", "")))
+                    refs.variations.setdefault((entity, variation.get("Property", "")), set()).add(rel_path)
+            else:
+                entity = _entity(expression, aliases)
+                if entity:
+                    refs.hierarchies.add((entity, value["Hierarchy"]))
+        elif key == "SourceRef" and value.get("Entity"):
+            refs.tables.add(value["Entity"])
+
+    # Desktop often stores the date hierarchy of a column only in the query reference.
+    query_ref = node.get("queryRef")
+    field_node = node.get("field")
+    if isinstance(query_ref, str) and ".Variation." in query_ref and isinstance(field_node, dict) and "Column" in field_node:
+        entity = _entity(field_node["Column"].get("Expression"), aliases)
+        if entity:
+            refs.variations.setdefault((entity, field_node["Column"].get("Property", "")), set()).add(rel_path)
+
+    for value in node.values():
+        if isinstance(value, (dict, list)):
+            _collect(value, aliases, refs, rel_path)
+
+
+def report_references(report_files: Mapping[str, bytes]) -> ReportReferences:
+    """
+    Tables, columns, measures and hierarchies used by the visuals, filters and bookmarks of a
+    report definition (every JSON file of the report).
+    """
+    refs = ReportReferences()
+    for rel_path, content in sorted(report_files.items()):
+        if not rel_path.endswith(".json"):
+            continue
+        try:
+            data = json.loads(content)
+        except ValueError:
+            continue
+        _collect(data, {}, refs, rel_path)
+    refs.tables.update(t for t, _ in refs.columns | refs.measures | refs.hierarchies)
+    return refs
+
+
+class _Graph:
+    """
+    Objects of the model that must stay, grown from the roots along every reference.
+    """
+
+    def __init__(self, index: _Model, options: SlimmingOptions) -> None:
+        self.index = index
+        self.options = options
+        self.tables: Set[str] = set()
+        self.columns: Set[ColumnRef] = set()
+        self.hierarchies: Set[ColumnRef] = set()
+
+    def keep_dax(self, expression: str, home_table: Optional[str] = None) -> None:
+        tables, columns, measures = dax_references(expression, self.index, home_table)
+        for table in tables:
+            self.keep_table(table)
+        for ref in columns:
+            self.keep_column(ref)
+        for ref in measures:
+            self.keep_table(ref[0])
+
+    def keep_table(self, name: str) -> None:
+        table = self.index.tables.get(name)
+        if table is None or name in self.tables:
+            return
+        self.tables.add(name)
+        # Every measure stays, and with it everything it refers to.
+        for measure in table.measures.values():
+            self.keep_dax(measure.expression, name)
+            for child in measure.iter():
+                if child.kind in ("formatStringDefinition", "detailRowsDefinition", "kpi") and child.expression:
+                    self.keep_dax(child.expression, name)
+        if not table.prunable:
+            for column in table.columns:
+                self.keep_column((name, column))
+            for hierarchy in table.obj.iter("hierarchy"):
+                self.hierarchies.add((name, hierarchy.name))
+            partition = table.obj.find("partition")
+            if partition is not None and partition.expression == "calculated":
+                self.keep_dax(partition.properties.get("source", ""), name)
+        for column in table.columns.values():
+            if column.properties.get("isKey") == "true":
+                self.keep_column((name, column.name))
+
+    def keep_column(self, ref: ColumnRef) -> None:
+        table = self.index.tables.get(ref[0])
+        if table is None or ref in self.columns or ref[1] not in table.columns:
+            return
+        self.keep_table(ref[0])
+        self.columns.add(ref)
+        column = table.columns[ref[1]]
+        if column.expression:
+            self.keep_dax(column.expression, ref[0])
+        for key in ("sortByColumn", "groupByColumn"):
+            if key in column.properties:
+                self.keep_column((ref[0], tmdl.unquote(column.properties[key])))
+        for variation in column.iter("variation"):
+            if not self.options.disable_auto_date and "defaultHierarchy" in variation.properties:
+                self.keep_table(split_column_ref(variation.properties["defaultHierarchy"])[0])
+
+    def keep_hierarchy(self, ref: ColumnRef) -> None:
+        table = self.index.tables.get(ref[0])
+        hierarchy = table.obj.find("hierarchy", ref[1]) if table else None
+        if hierarchy is None:
+            return
+        self.hierarchies.add(ref)
+        for level in hierarchy.iter("level"):
+            if "column" in level.properties:
+                self.keep_column((ref[0], tmdl.unquote(level.properties["column"])))
+
+
+def _connecting_tables(index: _Model, kept: Set[str], removable: Set[str]) -> Set[str]:
+    """
+    Tables among `removable` that connect kept tables through relationships. Unreferenced tables
+    are peeled off while they hang on at most one relationship; whatever remains links two or more
+    kept tables (like a bridge table) and has to stay for filters to propagate.
+    """
+    remaining = set(kept) | set(removable)
+    candidates = set(removable)
+    changed = True
+    while changed:
+        changed = False
+        for table in sorted(candidates):
+            links = [r for r in index.relationships if table in (r.from_column[0], r.to_column[0])
+                     and {r.from_column[0], r.to_column[0]} <= remaining]
+            if len(links) <= 1 and not any(r.both_directions for r in links):
+                remaining.discard(table)
+                candidates.discard(table)
+                changed = True
+    return candidates
+
+
+def _removed_linguistic_members(data: Dict[str, Any], tables: Set[str], columns: Set[ColumnRef]) -> Tuple[Set[str], Set[str]]:
+    """
+    Keys of the linguistic metadata entities bound to removed tables or columns, and of the
+    relationships that refer to them.
+    """
+    entities = data.get("Entities") or {}
+    removed_keys = set()
+    for key, entity in entities.items():
+        binding = (entity or {}).get("Definition", {}).get("Binding", {})
+        table = binding.get("ConceptualEntity")
+        if table in tables or (table, binding.get("ConceptualProperty")) in columns:
+            removed_keys.add(key)
+    if not removed_keys:
+        return set(), set()
+
+    def refers_to_removed(rel: Dict[str, Any]) -> bool:
+        if rel.get("Binding", {}).get("ConceptualEntity") in tables:
+            return True
+        return any((role.get("Target") or {}).get("Entity") in removed_keys for role in (rel.get("Roles") or {}).values())
+
+    relationships = data.get("Relationships") or {}
+    return removed_keys, {k for k, v in relationships.items() if refers_to_removed(v)}
+
+
+_JSON = json.JSONDecoder()
+
+
+def _skip_space(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+def _json_members(text: str, start: int) -> List[Tuple[str, int, int, int]]:
+    """
+    Members of the JSON object opening at text[start] as (key, key start, value start, value end).
+    """
+    members = []
+    i = _skip_space(text, start + 1)
+    while text[i] != "}":
+        key, key_end = _JSON.raw_decode(text, i)
+        value_start = _skip_space(text, _skip_space(text, key_end) + 1)
+        _, value_end = _JSON.raw_decode(text, value_start)
+        members.append((key, i, value_start, value_end))
+        i = _skip_space(text, value_end)
+        if text[i] == ",":
+            i = _skip_space(text, i + 1)
+    return members
+
+
+def _drop_members(text: str, start: int, removed: Set[str]) -> str:
+    """
+    `text` without the `removed` members of the JSON object opening at text[start]. The other
+    members keep their layout, so only the removed entries show in a diff.
+    """
+    members = _json_members(text, start)
+    kept = [m for m in members if m[0] not in removed]
+    if len(kept) == len(members):
+        return text
+    if not kept:
+        return text[:start + 1] + text[members[-1][3]:].lstrip(" \t\r\n")
+    separator = text[members[0][3]:members[1][1]]
+    body = separator.join(text[m[1]:m[3]] for m in kept)
+    return text[:members[0][1]] + body + text[members[-1][3]:]
+
+
+def _prune_culture(doc: tmdl.TmdlDocument, tables: Set[str], columns: Set[ColumnRef]) -> Optional[str]:
+    """
+    Culture text without the linguistic metadata of removed tables and columns, or None when
+    nothing refers to them.
+    """
+    culture = doc.find("cultureInfo")
+    metadata = culture.find("linguisticMetadata") if culture else None
+    if metadata is None or not metadata.expression.startswith("{"):
+        return None
+    entities, relationships = _removed_linguistic_members(json.loads(metadata.expression), tables, columns)
+    if not entities:
+        return None
+
+    # The expression runs from the line after the declaration up to the object's properties.
+    first = last = metadata.start + 1
+    while last < metadata.end and (not doc.lines[last].strip() or tmdl.depth(doc.lines[last]) >= metadata.depth + 2):
+        last += 1
+    while last > first and not doc.lines[last - 1].strip():
+        last -= 1
+    indent = "\t" * (metadata.depth + 2)
+    source = "\n".join(line[len(indent):] if line.startswith(indent) else line for line in doc.lines[first:last])
+
+    top = _json_members(source, _skip_space(source, 0))
+    # Later members first, so the positions of earlier ones stay valid.
+    for key, _, value_start, _ in sorted(top, key=lambda m: m[2], reverse=True):
+        removed = {"Entities": entities, "Relationships": relationships}.get(key)
+        if removed and source[value_start] == "{":
+            source = _drop_members(source, value_start, removed)
+    body = [indent + line if line else line for line in source.split("\n")]
+    return "\n".join(doc.lines[:first] + body + doc.lines[last:])
+
+
+def _prune_model(text: str, removed_tables: Set[str], disable_auto_date: bool) -> str:
+    doc = tmdl.parse(text)
+    removed = [o for o in doc.objects if o.kind == "ref table" and o.name in removed_tables]
+    lines_text = doc.without(removed)
+    doc = tmdl.parse(lines_text)
+    lines = list(doc.lines)
+
+    order = doc.find("annotation", "PBI_QueryOrder")
+    if order is not None and removed_tables:
+        try:
+            queries = json.loads(order.expression)
+        except ValueError:
+            queries = None
+        if isinstance(queries, list):
+            lines[order.start] = f"annotation PBI_QueryOrder = {json.dumps([q for q in queries if q not in removed_tables], ensure_ascii=False, separators=(',', ':'))}"
+
+    if disable_auto_date:
+        flag = doc.find("annotation", TIME_INTELLIGENCE_ANNOTATION)
+        if flag is not None:
+            lines[flag.start] = f"annotation {TIME_INTELLIGENCE_ANNOTATION} = 0"
+        else:
+            lines[len(lines) - 1:len(lines) - 1] = [f"annotation {TIME_INTELLIGENCE_ANNOTATION} = 0", ""]
+    return "\n".join(lines)
+
+
+@dataclass
+class SlimmingPlan:
+    report: SlimmingReport
+    overlay: Dict[str, Optional[bytes]]
+
+
+def slim_model(model_index: TemplateIndex, report_files: Mapping[str, bytes], options: SlimmingOptions, *, extra_columns: Iterable[ColumnRef] = ()) -> SlimmingPlan:
+    """
+    Removes from the model what the report cannot reach: the reference graph starts from the
+    fields used by visuals, filters and bookmarks (plus `options.keep` and `extra_columns`) and
+    follows measures (all of which stay), calculated columns and tables, sort-by columns,
+    hierarchies, relationships and auto date/time variations. Tables that are not reachable are
+    dropped unless they connect reachable tables; Power Query tables lose unreachable columns.
+    With `options.disable_auto_date` the auto date/time tables and variations are removed too.
+    The result is an overlay on the files of `model_index` in which removed files map to None.
+    """
+    if any(rel_path.startswith(PERSPECTIVES_DIR) for rel_path in model_index.texts):
+        raise ValueError("Model slimming does not support perspectives")
+    index = _Model(model_index)
+    refs = report_references(report_files)
+
+    if options.disable_auto_date and refs.variations:
+        used = ", ".join(f"{t}[{c}] ({', '.join(sorted(files))})" for (t, c), files in sorted(refs.variations.items()))
+        raise ValueError(f"Cannot disable auto date/time, the report uses the date hierarchy of: {used}")
+
+    graph = _Graph(index, options)
+    for table in refs.tables:
+        graph.keep_table(table)
+    for ref in refs.columns | set(extra_columns):
+        graph.keep_column(ref)
+    for ref in refs.measures:
+        graph.keep_table(ref[0])
+    for ref in refs.hierarchies:
+        graph.keep_hierarchy(ref)
+    for entry in options.keep:
+        if "[" in entry:
+            table, _, column = entry.partition("[")
+            graph.keep_column((tmdl.unquote(table), column.rstrip("]")))
+        else:
+            graph.keep_table(tmdl.unquote(entry))
+    for rel_path, doc in model_index.documents.items():
+        if rel_path.startswith(ROLES_DIR):
+            for obj in doc.objects:
+                for permission in obj.iter("tablePermission"):
+                    graph.keep_table(permission.name)
+                    graph.keep_dax(permission.expression, permission.name)
+    if not options.disable_auto_date:
+        for table in index.tables.values():
+            if table.is_auto_date and table.name.startswith("DateTableTemplate_"):
+                graph.keep_table(table.name)
+
+    # Tables that link kept tables stay, then every relationship between kept tables keeps its keys.
+    auto_date = {t for t in index.tables if index.tables[t].is_auto_date} if options.disable_auto_date else set()
+    removable = set(index.tables) - graph.tables - auto_date
+    for table in _connecting_tables(index, graph.tables, removable):
+        graph.keep_table(table)
+    while True:
+        before = (len(graph.tables), len(graph.columns))
+        for rel in index.relationships:
+            if rel.from_column[0] in graph.tables and rel.to_column[0] in graph.tables:
+                graph.keep_column(rel.from_column)
+                graph.keep_column(rel.to_column)
+        if (len(graph.tables), len(graph.columns)) == before:
+            break
+
+    removed_tables = set(index.tables) - graph.tables
+    report = SlimmingReport(removed_tables=sorted(removed_tables), auto_date_disabled=options.disable_auto_date)
+    overlay: Dict[str, Optional[bytes]] = {}
+    removed_relationships = {r.obj.name for r in index.relationships if r.from_column[0] in removed_tables or r.to_column[0] in removed_tables}
+    removed_columns: Set[ColumnRef] = set()
+
+    for name, table in sorted(index.tables.items()):
+        if name in removed_tables:
+            overlay[table.rel_path] = None
+            continue
+        removed = []
+        for column in table.obj.iter("column"):
+            if (name, column.name) not in graph.columns:
+                removed.append(column)
+                removed_columns.add((name, column.name))
+                report.removed_columns.setdefault(name, []).append(column.name)
+            else:
+                removed.extend(v for v in column.iter("variation") if v.properties.get("relationship") in removed_relationships)
+        for hierarchy in table.obj.iter("hierarchy"):
+            levels = [tmdl.unquote(level.properties.get("column", "")) for level in hierarchy.iter("level")]
+            if (name, hierarchy.name) not in graph.hierarchies and any((name, c) not in graph.columns for c in levels):
+                removed.append(hierarchy)
+                report.removed_hierarchies.append(f"{name}.{hierarchy.name}")
+        if removed:
+            overlay[table.rel_path] = table.doc.without(removed).encode("utf-8")
+
+    if removed_relationships:
+        doc = index.relationships_doc
+        overlay[RELATIONSHIPS_FILE] = doc.without([o for o in doc.objects if o.kind == "relationship" and o.name in removed_relationships]).encode("utf-8")
+    if MODEL_FILE in model_index.texts and (removed_tables or options.disable_auto_date):
+        overlay[MODEL_FILE] = _prune_model(model_index.texts[MODEL_FILE], removed_tables, options.disable_auto_date).encode("utf-8")
+    for rel_path, doc in model_index.documents.items():
+        if rel_path.startswith(CULTURES_DIR):
+            pruned = _prune_culture(doc, removed_tables, removed_columns)
+            if pruned is not None:
+                overlay[rel_path] = pruned.encode("utf-8")
+
+    _estimate(report, index, graph, dict(options.table_rows))
+    return SlimmingPlan(report, overlay)
+
+
+def _estimate(report: SlimmingReport, index: _Model, graph: _Graph, table_rows: Mapping[str, float]) -> None:
+    # Stored columns: all columns of import tables. Each column of a table weighs the table's
+    # row count when given, 1 otherwise; calculated columns are stored like any other.
+    total = removed = 0.0
+    for name, table in index.tables.items():
+        if table.partition_kind not in ("m", "calculated"):
+            continue
+        weight = float(table_rows.get(name, 1))
+        for column in table.columns:
+            report.stored_columns += 1
+            total += weight
+            if (name, column) not in graph.columns:
+                removed += weight
+    report.estimated_saving = removed / total if total else 0.0
+
+
+def render_model_slimming(model_files: Mapping[str, bytes], overlay: Mapping[str, Optional[bytes]], report_files: Mapping[str, bytes], options: SlimmingOptions, *, extra_columns: Iterable[ColumnRef] = ()) -> SlimmingPlan:
+    """
+    slim_model on top of the files the region already rewrites (`overlay`).
+    """
+    current = {rel_path: overlay.get(rel_path, content) for rel_path, content in model_files.items() if overlay.get(rel_path, content) is not None}
+    return slim_model(TemplateIndex(current), report_files, options, extra_columns=extra_columns)
+
+
+def main(argv=None) -> None:
+    from config_reader import get_template_info
+    from template_snapshot import load_template_snapshot
+
+    parser = argparse.ArgumentParser(description="Report what model slimming would remove from the template model.")
+    parser.add_argument("--disable-auto-date", action="store_true", help="Also remove the auto date/time tables.")
+    parser.add_argument("--keep", nargs="*", default=[], help="Tables or Table[Column] to keep regardless of references.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    snapshot = load_template_snapshot(get_template_info())
+    try:
+        plan = slim_model(snapshot.model_index, snapshot.report_files, SlimmingOptions(args.disable_auto_date, tuple(args.keep)))
+    except ValueError as exc:
+        die(str(exc))
+    if args.json:
+        print(json.dumps(vars(plan.report), indent=2, ensure_ascii=False))
+        return
+    for table in plan.report.removed_tables:
+        log(f"table    {table}")
+    for table, columns in sorted(plan.report.removed_columns.items()):
+        for column in columns:
+            log(f"column   {table}[{column}]")
+    for hierarchy in plan.report.removed_hierarchies:
+        log(f"hierarchy {hierarchy}")
+    log(f"Slimming would have {plan.report.summary()}")
+
+
+if __name__ == "__main__":
+    main()
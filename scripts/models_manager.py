@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Callable
+from typing import Any, Dict, List, Callable
 from pprint import pprint
 from utils import load_data, get_nested
 
@@ -25,6 +25,9 @@ class ExpectedPbiReportInfo:
     model_exist: bool
     report_exist: bool
 
+    # The region's entry in "region_settings" (see get_region_settings).
+    settings: Dict[str, Any] = field(default_factory=dict)
+
 
 def get_all_expected_pbi_attributes(region: str, config_path: Path = REGION_CONFIG_FILE, loader: Callable = load_data) -> Dict[str, str | Path]:
     data = loader(config_path)
@@ -49,10 +52,21 @@ def if_report_exist(expected_report_path : Path) -> bool:
     return expected_report_path.exists()
 
 
+def get_region_settings(region_config_path: Path | str = REGION_CONFIG_FILE) -> Dict[str, Dict]:
+    """
+    Optional per-region settings from the "region_settings" section of the region config, e.g.
+    {"region_settings": {"MENAT": {"size": 250000000}}}. Regions without an entry get {}.
+    """
+    data = load_data(region_config_path)
+    settings = get_nested(data, "region_settings", default={}) or {}
+    return {region: dict(settings.get(region) or {}) for region in data.get("regions", [])}
+
+
 def get_expected_reports(region_config_path: Path | str = REGION_CONFIG_FILE) -> List[ExpectedPbiReportInfo]:
     result: List[ExpectedPbiReportInfo] = []
     regions_config_data = load_data(region_config_path)
     regions = regions_config_data.get("regions", [])
+    region_settings = get_region_settings(region_config_path)
     for region in regions:
         all_expected_pbi_attributes  = get_all_expected_pbi_attributes(region)
         model_exist = if_model_exist(all_expected_pbi_attributes["expected_model_path"])
@@ -68,6 +82,7 @@ def get_expected_reports(region_config_path: Path | str = REGION_CONFIG_FILE) ->
             expected_report_definition = all_expected_pbi_attributes["expected_report_definition"],
             model_exist = model_exist,
             report_exist = report_exist,
+            settings = region_settings[region],
         )
         result.append(info)
     return result
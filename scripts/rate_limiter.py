@@ -0,0 +1,220 @@
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from tracing import span
+
+
+@dataclass(frozen=True)
+class EndpointLimit:
+    """
+    Request budget of one endpoint class: `rate` requests per second to start with, bursts of up to
+    `burst` requests, and never more than `max_rate` or less than `min_rate` requests per second.
+    """
+    rate: float
+    burst: int = 1
+    max_rate: Optional[float] = None
+    min_rate: float = 0.05
+
+
+DEFAULT_LIMITS: Dict[str, EndpointLimit] = {
+    "list_items": EndpointLimit(rate=2.0, burst=4, max_rate=8.0),
+    "create_item": EndpointLimit(rate=1.0, burst=4, max_rate=4.0),
+    "update_definition": EndpointLimit(rate=2.0, burst=4, max_rate=8.0),
+    "get_definition": EndpointLimit(rate=1.0, burst=2, max_rate=4.0),
+    "operations": EndpointLimit(rate=5.0, burst=10, max_rate=20.0),
+    "refresh": EndpointLimit(rate=1.0, burst=2, max_rate=4.0),
+    "refresh_status": EndpointLimit(rate=5.0, burst=10, max_rate=20.0),
+    "other": EndpointLimit(rate=5.0, burst=10, max_rate=20.0),
+}
+
+
+def endpoint_class(method: str, url: str) -> str:
+    path = urlparse(url).path.rstrip("/")
+    method = method.upper()
+    if "/operations/" in path:
+        return "operations"
+    if "/refreshes" in path:
+        return "refresh" if method == "POST" else "refresh_status"
+    if path.endswith("/updateDefinition"):
+        return "update_definition"
+    if path.endswith("/getDefinition"):
+        return "get_definition"
+    if path.endswith(("/items", "/semanticModels", "/reports")):
+        return "create_item" if method == "POST" else "list_items"
+    return "other"
+
+
+def parse_retry_after(value: Optional[str], default_s: float) -> float:
+    """
+    Retry-After as seconds; the header may carry a number of seconds or an HTTP date.
+    """
+    if not value:
+        return default_s
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default_s
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0
+    throttled: int = 0
+    wait_s: float = 0.0
+    rate: float = 0.0
+
+
+class _Bucket:
+    def __init__(self, limit: EndpointLimit) -> None:
+        self.limit = limit
+        self.rate = limit.rate
+        self.max_rate = limit.max_rate or limit.rate
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.stats = EndpointStats(rate=limit.rate)
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(float(self.limit.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class AdaptiveRateLimiter:
+    """
+    Token buckets shared by every request of a run, one per endpoint class (see endpoint_class).
+
+    The rate of a class adapts AIMD-style: each successful request raises it by `increase_step`
+    of its starting rate, up to `max_rate`; each 429 halves it and pauses the whole class for the
+    response's Retry-After, so all workers back off together instead of each one on its own.
+    Time spent waiting for a token or a pause is counted per class (see stats()).
+    """
+
+    def __init__(self, limits: Optional[Dict[str, EndpointLimit]] = None, *, increase_step: float = 0.05, decrease_factor: float = 0.5, default_retry_after_s: float = 5.0, clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep) -> None:
+        self._limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self._increase_step = increase_step
+        self._decrease_factor = decrease_factor
+        self._default_retry_after_s = default_retry_after_s
+        self._clock = clock
+        self._sleep = sleep
+        self._buckets: Dict[str, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, name: str) -> _Bucket:
+        bucket = self._buckets.get(name)
+        if bucket is None:
+            limit = self._limits.get(name) or self._limits.get("other") or DEFAULT_LIMITS["other"]
+            bucket = self._buckets[name] = _Bucket(limit)
+            bucket.updated = self._clock()
+        return bucket
+
+    def acquire(self, name: str) -> float:
+        """
+        Blocks until a request of the class may be sent. Returns the time waited.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                bucket = self._bucket(name)
+                now = self._clock()
+                bucket.refill(now)
+                if now >= bucket.paused_until and bucket.tokens >= 1.0:
+                    bucket.tokens -= 1.0
+                    bucket.stats.requests += 1
+                    bucket.stats.wait_s += waited
+                    return waited
+                delay = max(bucket.paused_until - now, (1.0 - bucket.tokens) / bucket.rate)
+            self._sleep(delay)
+            waited += delay
+
+    def on_success(self, name: str) -> None:
+        with self._lock:
+            bucket = self._bucket(name)
+            bucket.rate = min(bucket.max_rate, bucket.rate + self._increase_step * bucket.limit.rate)
+            bucket.stats.rate = bucket.rate
+
+    def on_throttled(self, name: str, retry_after: Optional[str]) -> float:
+        """
+        Records a 429 and returns the pause applied to the class.
+        """
+        pause = parse_retry_after(retry_after, self._default_retry_after_s)
+        with self._lock:
+            bucket = self._bucket(name)
+            now = self._clock()
+            bucket.rate = max(bucket.limit.min_rate, bucket.rate * self._decrease_factor)
+            bucket.tokens = min(bucket.tokens, 0.0)
+            bucket.paused_until = max(bucket.paused_until, now + pause)
+            bucket.stats.throttled += 1
+            bucket.stats.rate = bucket.rate
+        return pause
+
+    def stats(self) -> Dict[str, EndpointStats]:
+        with self._lock:
+            return {name: EndpointStats(**vars(b.stats)) for name, b in sorted(self._buckets.items())}
+
+    def summary(self) -> str:
+        parts = [
+            f"{name}: {st.requests} req, {st.throttled}x 429, waited {st.wait_s:.1f}s, rate {st.rate:.2f}/s"
+            for name, st in self.stats().items()
+        ]
+        return "; ".join(parts) or "no requests"
+
+
+def _body_size(data) -> int:
+    # Streaming definition payloads know their length; form data (dicts) is not counted.
+    if data is None or isinstance(data, dict):
+        return 0
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+class RateLimitedSession(requests.Session):
+    """
+    requests.Session whose requests to Fabric pass through a shared AdaptiveRateLimiter.
+
+    A 429 response is fed back to the limiter and the request is re-sent once the class may send
+    again, up to `max_throttle_retries` times; the last 429 response is returned as is. Request
+    bodies must be re-iterable (bytes, dicts or DefinitionPayloadStream). Requests to other hosts
+    (the Entra ID token endpoint) are not limited.
+    """
+
+    def __init__(self, limiter: AdaptiveRateLimiter, *, host: str, max_throttle_retries: int = 5) -> None:
+        super().__init__()
+        self.limiter = limiter
+        self._host = host
+        self._max_throttle_retries = max_throttle_retries
+
+    def request(self, method, url, *args, **kwargs):
+        if urlparse(url).netloc != self._host:
+            with span("http external", category="http", method=method) as sp:
+                r = super().request(method, url, *args, **kwargs)
+                sp.set(status=r.status_code)
+                return r
+
+        name = endpoint_class(method, url)
+        data = kwargs.get("data", args[1] if len(args) > 1 else None)
+        with span(f"http {name}", category="http", method=method, path=urlparse(url).path) as sp:
+            for attempt in range(self._max_throttle_retries + 1):
+                sp.add_sleep(self.limiter.acquire(name))
+                r = super().request(method, url, *args, **kwargs)
+                sp.set(status=r.status_code, attempts=attempt + 1, bytes_sent=_body_size(data))
+                if r.status_code != 429:
+                    if r.ok:
+                        self.limiter.on_success(name)
+                    return r
+                self.limiter.on_throttled(name, r.headers.get("Retry-After"))
+                if attempt < self._max_throttle_retries:
+                    r.close()
+            return r
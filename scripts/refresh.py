@@ -0,0 +1,171 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import requests
+
+from deploy import POWERBI_SCOPE, SUPPORT_THREADS, Settings, get_token_provider, make_session
+from fabric_operations import OperationTracker
+from rate_limiter import AdaptiveRateLimiter
+from token_provider import TokenProvider
+from tracing import span
+from utils import load_json, log, save_json
+from workspaces import DEFAULT_WORKSPACE, Workspace
+
+
+REFRESH_STATE_FILE = Path(".state/refresh_state.json")
+
+DEFAULT_REFRESH_BODY: Dict[str, Any] = {"type": "full", "commitMode": "transactional", "retryCount": 1}
+
+
+@dataclass
+class RefreshOutcome:
+    region_code: str
+    model_id: str
+    status: str
+    workspace: str = DEFAULT_WORKSPACE
+    queued_s: float = 0.0
+    duration_s: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class RefreshResult:
+    outcomes: List[RefreshOutcome] = field(default_factory=list)
+    wall_s: float = 0.0
+
+    @property
+    def failures(self) -> Dict[str, str]:
+        return {o.region_code: o.error or o.status for o in self.outcomes if o.status != "Completed"}
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def refresh_priority(region_code: str, region_settings: Mapping[str, Any], last_durations: Mapping[str, float]) -> tuple:
+    """
+    Sort key, largest first: an explicit `refresh_priority`, then the region `size` (rows), then the
+    duration of its last refresh. Starting the longest refreshes first shortens the whole stage.
+    """
+    return (
+        -float(region_settings.get("refresh_priority", 0)),
+        -float(region_settings.get("size", 0)),
+        -float(last_durations.get(region_code, 0.0)),
+        region_code,
+    )
+
+
+def load_refresh_durations(path: Path = REFRESH_STATE_FILE) -> Dict[str, float]:
+    if not path.exists():
+        return {}
+    return {k: float(v) for k, v in load_json(path).get("durations", {}).items()}
+
+
+def save_refresh_durations(durations: Mapping[str, float], path: Path = REFRESH_STATE_FILE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_json(path, {"durations": dict(sorted(durations.items()))})
+
+
+def _refresh_url(s: Settings, workspace_id: str, model_id: str) -> str:
+    return f"{s.powerbi_base_url}/groups/{workspace_id}/datasets/{model_id}/refreshes"
+
+
+def _start_refresh(s: Settings, token: TokenProvider, session: requests.Session, workspace_id: str, model_id: str, body: Dict[str, Any]) -> str:
+    """
+    Starts an enhanced refresh and returns the URL its status is polled at.
+    """
+    url = _refresh_url(s, workspace_id, model_id)
+    r = session.post(url, auth=token, json=body, timeout=s.timeout_s)
+    if r.status_code != 202:
+        raise RuntimeError(f"Failed to start refresh. HTTP {r.status_code}\n\n{r.text}")
+    location = r.headers.get("Location")
+    if location:
+        return location
+    request_id = r.headers.get("x-ms-request-id") or r.headers.get("RequestId")
+    if not request_id:
+        raise RuntimeError("Refresh accepted without a Location or request id to poll")
+    return f"{url}/{request_id}"
+
+
+async def _refresh_region(s: Settings, token: TokenProvider, session: requests.Session, tracker: OperationTracker, slots: asyncio.Semaphore, workspace: Workspace, region_code: str, model_id: str, body: Dict[str, Any]) -> RefreshOutcome:
+    queued_at = time.monotonic()
+    async with slots:
+        started_at = time.monotonic()
+        outcome = RefreshOutcome(region_code, model_id, "Failed", workspace.name, queued_s=started_at - queued_at)
+        with span("refresh.region", region=region_code, workspace=workspace.name):
+            try:
+                status_url = await asyncio.to_thread(_start_refresh, s, token, session, workspace.workspace_id, model_id, body)
+                log(f"[{region_code}] Refresh started")
+                data = await tracker.wait(status_url, timeout_s=s.refresh_timeout_s)
+                outcome.status = data.get("status") or "Completed"
+            except Exception as exc:
+                outcome.error = f"{type(exc).__name__}: {exc}"
+        outcome.duration_s = time.monotonic() - started_at
+        log(f"[{region_code}] Refresh {outcome.status.lower()} after {outcome.duration_s:.0f}s")
+        return outcome
+
+
+async def _refresh_all(s: Settings, token: TokenProvider, session: requests.Session, models: List[tuple], workspaces: Mapping[str, Workspace], concurrency: int, body: Dict[str, Any]) -> List[RefreshOutcome]:
+    tracker = OperationTracker(session, token, default_sleep_s=s.op_default_sleep_s, request_timeout_s=s.timeout_s)
+    # One budget per workspace: each capacity runs at most its refresh_concurrency refreshes.
+    slots = {ws.name: asyncio.Semaphore(max(1, ws.refresh_concurrency or concurrency)) for ws in workspaces.values()}
+    # Tasks are created in priority order and the semaphores are FIFO, so refreshes start in that order.
+    tasks = [
+        asyncio.create_task(_refresh_region(s, token, session, tracker, slots[workspaces[region_code].name], workspaces[region_code], region_code, model_id, body))
+        for region_code, model_id in models
+    ]
+    return list(await asyncio.gather(*tasks))
+
+
+def refresh_models(models: Mapping[str, str], region_settings: Optional[Mapping[str, Mapping[str, Any]]] = None, *, concurrency: Optional[int] = None, body: Optional[Dict[str, Any]] = None, workspaces: Optional[Mapping[str, Workspace]] = None) -> RefreshResult:
+    """
+    Refreshes the semantic models given as {region: model id} through the Power BI enhanced
+    refresh API, at most `concurrency` at once (default: Settings.refresh_concurrency) so the
+    capacity is not saturated. Queued regions start largest first (see refresh_priority).
+    Completion is polled through an OperationTracker; durations are kept for later priorities.
+    `workspaces` ({region: workspace}, as in DeployResult.workspaces) refreshes each model in its
+    workspace, with one budget per workspace; without it every model is in FABRIC_WORKSPACE_ID.
+    """
+    result = RefreshResult()
+    if not models:
+        log("No semantic models to refresh")
+        return result
+
+    s = Settings.from_env(workspace_required=not workspaces)
+    default = Workspace(DEFAULT_WORKSPACE, s.workspace_id)
+    workspaces = {region: (workspaces or {}).get(region) or default for region in models}
+    workers = max(1, concurrency or s.refresh_concurrency)
+    used = {ws.name: ws for ws in workspaces.values()}
+    in_flight = sum(ws.refresh_concurrency or workers for ws in used.values())
+    session = make_session(s, AdaptiveRateLimiter(), base_url=s.powerbi_base_url, pool_size=in_flight + SUPPORT_THREADS)
+    with span("refresh.token"):
+        token = get_token_provider(s, session=session, scope=POWERBI_SCOPE)
+
+    region_settings = region_settings or {}
+    durations = load_refresh_durations()
+    ordered = sorted(models.items(), key=lambda kv: refresh_priority(kv[0], region_settings.get(kv[0]) or {}, durations))
+    log(f"Refreshing {len(ordered)} semantic model(s), {workers} at a time" + (f" per workspace ({', '.join(sorted(used))})" if len(used) > 1 else ""))
+
+    start = time.monotonic()
+    result.outcomes = asyncio.run(_refresh_all(s, token, session, ordered, workspaces, workers, body or DEFAULT_REFRESH_BODY))
+    result.wall_s = time.monotonic() - start
+
+    for outcome in result.outcomes:
+        if outcome.status == "Completed":
+            durations[outcome.region_code] = round(outcome.duration_s, 1)
+    save_refresh_durations(durations)
+
+    log_refresh_summary(result)
+    return result
+
+
+def log_refresh_summary(result: RefreshResult) -> None:
+    log(f"{'region':<20} {'workspace':<12} {'status':<10} {'queued s':>9} {'refresh s':>10}")
+    for o in sorted(result.outcomes, key=lambda o: o.duration_s, reverse=True):
+        log(f"{o.region_code:<20} {o.workspace:<12} {o.status:<10} {o.queued_s:>9.0f} {o.duration_s:>10.0f}")
+    log(f"Refreshed {len(result.outcomes) - len(result.failures)} model(s), {len(result.failures)} failed, in {result.wall_s:.0f}s")
+    for region, error in result.failures.items():
+        log(f"  {region}: {error}")
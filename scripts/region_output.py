@@ -0,0 +1,137 @@
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Iterable, Mapping, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from utils import log
+
+
+OUTPUT_MODES = ("copy", "hardlink", "reflink")
+
+# ioctl request number of FICLONE (linux/fs.h): share the extents of another file, copy-on-write.
+_FICLONE = 0x40049409
+
+_fallback_logged = set()
+_fallback_lock = threading.Lock()
+
+
+def _temp_path(path: Path) -> Path:
+    # Created like open() would (0666 less the umask, applied by the kernel), not owner-only like mkstemp.
+    for _ in range(100):
+        tmp = path.parent / f".{path.name}.{uuid.uuid4().hex[:12]}.tmp"
+        try:
+            fd = os.open(tmp, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return tmp
+    raise FileExistsError(f"No free temporary file name next to {path}")
+
+
+def _replace(tmp: Path, path: Path) -> None:
+    try:
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def write_if_changed(path: Path, content: bytes) -> bool:
+    """
+    Atomically replaces the file with `content` (temporary file + rename) unless it already holds
+    exactly that content as a file of its own. Returns whether the file was written.
+    """
+    if path.is_file() and os.stat(path).st_nlink == 1 and path.stat().st_size == len(content) and path.read_bytes() == content:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(path)
+    try:
+        tmp.write_bytes(content)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _replace(tmp, path)
+    return True
+
+
+def _log_fallback(mode: str, exc: OSError) -> None:
+    with _fallback_lock:
+        if mode in _fallback_logged:
+            return
+        _fallback_logged.add(mode)
+    log(f"Output mode '{mode}' not available here ({exc.strerror or exc}); copying files instead")
+
+
+def _hardlink(source: Path, tmp: Path) -> None:
+    tmp.unlink()
+    os.link(source, tmp)
+
+
+def _reflink(source: Path, tmp: Path) -> None:
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with source.open("rb") as src, tmp.open("wb") as dst:
+        fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+
+
+def link_or_copy(source: Path, path: Path, content: bytes, mode: str) -> bool:
+    """
+    Places `source` at `path` as a hardlink or reflink, falling back to writing `content` (the
+    bytes of `source`) when links are not possible, e.g. across file systems. Returns whether
+    the file was written.
+    """
+    if mode == "copy":
+        return write_if_changed(path, content)
+    if mode == "hardlink" and path.exists() and os.path.samefile(source, path):
+        return False
+    if mode == "reflink" and path.is_file() and os.stat(path).st_nlink == 1 and path.stat().st_size == len(content) and path.read_bytes() == content:
+        # Already a private file with the right content; whether it still shares extents does not matter.
+        return False
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _temp_path(path)
+    try:
+        (_hardlink if mode == "hardlink" else _reflink)(source, tmp)
+    except OSError as exc:
+        tmp.unlink(missing_ok=True)
+        _log_fallback(mode, exc)
+        return write_if_changed(path, content)
+    _replace(tmp, path)
+    return True
+
+
+def write_region_tree(root: Path, source_root: Path, base: Mapping[str, bytes], overlay: Mapping[str, Optional[bytes]], mode: str = "copy", previous: Iterable[str] = ()) -> int:
+    """
+    Writes one region folder: files rewritten for the region (`overlay`) always get private copies,
+    the other template files (`base`, read from `source_root`) are linked according to `mode`.
+    Files the overlay maps to None, and files of the previous generation (`previous`) the region
+    no longer has (e.g. removed from the template), are removed; other files in the folder, such
+    as local .pbi/ settings, are left alone. Returns the number of files written or removed.
+    """
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode `{mode}`, expected one of: {', '.join(OUTPUT_MODES)}")
+    written = 0
+    for rel_path in sorted(set(base) | set(overlay)):
+        path = root / rel_path
+        if rel_path in overlay and overlay[rel_path] is None:
+            if path.exists():
+                path.unlink()
+                written += 1
+        elif rel_path in overlay:
+            written += write_if_changed(path, overlay[rel_path])
+        else:
+            written += link_or_copy(source_root / rel_path, path, base[rel_path], mode)
+    expected = set(base) | set(overlay)
+    for rel_path in sorted(set(previous) - expected):
+        path = root / rel_path
+        if path.is_file():
+            path.unlink()
+            written += 1
+    return written
+
@@ -0,0 +1,142 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+import tmdl
+from incremental_refresh import IncrementalRefreshPolicy, partition_source
+from template_index import TemplateIndex
+from utils import decode_text
+
+
+# M quoted identifiers (`#"..."`, matched first so their quotes are skipped whole) and string literals.
+_M_QUOTED = re.compile(r'#"(?:[^"]|"")*"|"(?:[^"]|"")*"')
+
+_SELECT = re.compile(r"\s*SELECT\b", re.IGNORECASE)
+
+# Queries a WHERE clause can be appended to directly; anything else is wrapped in a derived table.
+_PLAIN_SELECT = re.compile(r"SELECT\s+\*\s+FROM\s+(\w+|`[^`]+`)(\.(\w+|`[^`]+`))*", re.IGNORECASE)
+
+# Separates SQL text from the M expressions spliced into it (see _m_literal).
+_SPLICE = "\0"
+
+RANGE_FORMAT = "yyyy-MM-dd HH:mm:ss"
+
+
+@dataclass(frozen=True)
+class RegionPredicate:
+    """
+    Region filter rendered into a table's native SQL query: `column = <region>`, or with a lookup
+    table `column IN (SELECT lookup_key FROM lookup_table WHERE region_column = <region>)`.
+    `range_column` is the source column RangeStart / RangeEnd are applied to when the region
+    has an incremental refresh policy on the table.
+    """
+    table: str
+    column: str
+    lookup_table: Optional[str] = None
+    lookup_key: Optional[str] = None
+    region_column: str = "Region"
+    range_column: Optional[str] = None
+
+    def condition(self, region: str) -> str:
+        if self.lookup_table is None:
+            return f"{self.column} = {region}"
+        return f"{self.column} IN (SELECT {self.lookup_key} FROM {self.lookup_table} WHERE {self.region_column} = {region})"
+
+
+def parse_region_predicates(config: Mapping[str, Any]) -> List[RegionPredicate]:
+    """
+    Predicates from the "region_predicates" section of the template config, e.g.
+    {"Sales_fct": {"column": "Country", "lookup": {"table": "sales.countryhubregion", "key": "Kraj"}}}.
+    """
+    predicates = []
+    for table, cfg in sorted((config or {}).items()):
+        if not cfg:
+            continue
+        if "column" not in cfg:
+            raise ValueError(f"Region predicate of `{table}` is missing: column")
+        lookup = cfg.get("lookup") or {}
+        missing = [k for k in ("table", "key") if lookup and k not in lookup]
+        if missing:
+            raise ValueError(f"Region predicate lookup of `{table}` is missing: {', '.join(missing)}")
+        predicates.append(RegionPredicate(
+            table=table,
+            column=cfg["column"],
+            lookup_table=lookup.get("table"),
+            lookup_key=lookup.get("key"),
+            region_column=lookup.get("region_column", "Region"),
+            range_column=cfg.get("range_column"),
+        ))
+    return predicates
+
+
+def _splice(m_expression: str) -> str:
+    return f"'{_SPLICE}{m_expression}{_SPLICE}'"
+
+
+def _m_literal(sql: str) -> str:
+    """
+    M expression for `sql`: string literals joined with `&` to the spliced M expressions.
+    """
+    parts = sql.split(_SPLICE)
+    pieces = []
+    for i, part in enumerate(parts):
+        if i % 2:
+            pieces.append(part)
+        elif part or i == 0:
+            pieces.append('"' + part.replace('"', '""') + '"')
+    return " & ".join(pieces)
+
+
+def filtered_sql(sql: str, conditions: List[str]) -> str:
+    sql = sql.strip().rstrip(";").rstrip()
+    where = " AND ".join(conditions)
+    if _PLAIN_SELECT.fullmatch(sql):
+        return f"{sql} WHERE {where}"
+    return f"SELECT * FROM ({sql}) AS region_source WHERE {where}"
+
+
+def apply_region_predicate(text: str, predicate: RegionPredicate, parameter_name: str, policy: Optional[IncrementalRefreshPolicy] = None) -> str:
+    """
+    Rewrites the native SQL query of the table's M partition so the source returns only the rows
+    of the region in `parameter_name` (and, with `policy` and a range_column, of the refreshed range).
+    The query must be a single string literal, e.g. `SQL = "SELECT * FROM sales.sales"`.
+    """
+    doc = tmdl.parse(text)
+    first, end = partition_source(doc)
+    lines = list(doc.lines)
+    expression = "\n".join(lines[first:end])
+
+    strings = [m for m in _M_QUOTED.finditer(expression) if not m.group(0).startswith("#")]
+    queries = [m for m in strings if _SELECT.match(m.group(0)[1:])]
+    if len(queries) != 1:
+        raise ValueError(f"Expected exactly one native SQL query, found {len(queries)}")
+    query = queries[0]
+    if expression[:query.start()].rstrip().endswith("&") or expression[query.end():].lstrip().startswith("&"):
+        raise ValueError("The native SQL query is built by concatenation; filter it in the template instead")
+
+    region = _splice(f"Text.Replace({parameter_name}, \"'\", \"''\")")
+    conditions = [predicate.condition(region)]
+    if policy and predicate.range_column:
+        for bound, op in (("RangeStart", ">="), ("RangeEnd", "<")):
+            conditions.append(f"{predicate.range_column} {op} " + _splice(f'DateTime.ToText({bound}, "{RANGE_FORMAT}")'))
+    sql = query.group(0)[1:-1].replace('""', '"')
+    expression = expression[:query.start()] + _m_literal(filtered_sql(sql, conditions)) + expression[query.end():]
+
+    lines[first:end] = expression.split("\n")
+    return "\n".join(lines)
+
+
+def render_region_predicates(index: TemplateIndex, overlay: Mapping[str, bytes], predicates: List[RegionPredicate], parameter_name: str, policies: Iterable[IncrementalRefreshPolicy] = ()) -> Dict[str, bytes]:
+    """
+    Overlay entries (table files) applying `predicates` on top of the template model and the region's `overlay`.
+    """
+    by_table = {p.table: p for p in policies}
+    result: Dict[str, bytes] = {}
+    for predicate in predicates:
+        rel_path = index.table_file(predicate.table)
+        text = decode_text(overlay[rel_path]) if rel_path in overlay else index.texts[rel_path]
+        try:
+            result[rel_path] = apply_region_predicate(text, predicate, parameter_name, by_table.get(predicate.table)).encode("utf-8")
+        except ValueError as exc:
+            raise ValueError(f"Cannot add the region predicate to `{predicate.table}`: {exc}") from exc
+    return result
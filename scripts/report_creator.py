@@ -1,49 +1,165 @@
-import shutil
+import json
 import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
 
 from config_reader import PowerBiTemplateConfig
+from incremental_refresh import parse_policies, render_incremental_refresh
+from model_slimming import parse_slimming_options, render_model_slimming
 from models_manager import ExpectedPbiReportInfo
-from utils import load_json, save_json, ensure_platform_structure
+from region_output import OUTPUT_MODES, write_region_tree
+from region_predicates import parse_region_predicates, render_region_predicates
+from template_snapshot import RenderedRegion, TemplateSnapshot, load_template_snapshot
+from tracing import span
+from utils import ensure_platform_structure, json_to_bytes, load_json, log
 
 
 LOGICAL_ID_NAMESPACE = uuid.UUID("aaaaaaaa-bbbb-cccc-dddd-eeeeeeeeeeee")
 
+EXECUTOR_KINDS = ("thread", "process")
+
+
+@dataclass
+class GenerationResult:
+    generated: List[str] = field(default_factory=list)
+    failures: Dict[str, str] = field(default_factory=dict)
+    rendered: Dict[str, RenderedRegion] = field(default_factory=dict)
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+def create_model_and_report(template: PowerBiTemplateConfig, plans: List[ExpectedPbiReportInfo], *, workers: int = 1, executor: str = "thread", snapshot: Optional[TemplateSnapshot] = None, output_mode: str = "copy", on_generated: Optional[Callable[[ExpectedPbiReportInfo, RenderedRegion], None]] = None, previous_files: Optional[Mapping[str, Mapping[str, List[str]]]] = None) -> GenerationResult:
+    """
+    Generates the model and report folders of every plan. The template is read once into a
+    snapshot and every region is rendered in memory as an overlay of the files it rewrites,
+    then written to disk. With workers > 1 regions are generated concurrently; each region
+    only touches its own folders, so the output is the same as in the serial run.
+    Files the region does not rewrite are copied, hardlinked or reflinked from the template
+    according to `output_mode` (see region_output.write_region_tree).
+    Failures are collected per region. `on_generated` is called in the calling thread as soon
+    as each region has been written successfully. `previous_files` (region code -> {"model": [...],
+    "report": [...]}, see generation_manifest.region_files) are the files of the last generation,
+    removed when a region no longer has them.
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode `{output_mode}`, expected one of: {', '.join(OUTPUT_MODES)}")
+    snapshot = snapshot or load_template_snapshot(template)
+    result = GenerationResult()
+    previous_files = previous_files or {}
+
+    if workers <= 1 or len(plans) <= 1:
+        for plan in plans:
+            _collect(result, snapshot, plan, on_generated, _run_region, template, snapshot, plan, output_mode, previous_files.get(plan.region_code))
+        return result
+
+    if executor == "process":
+        # Each worker process receives the snapshot once instead of with every region.
+        pool: Executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(snapshot,))
+        submit = lambda plan: pool.submit(_run_region_in_worker, template, plan, output_mode, previous_files.get(plan.region_code))
+    elif executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generate")
+        submit = lambda plan: pool.submit(_run_region, template, snapshot, plan, output_mode, previous_files.get(plan.region_code))
+    else:
+        raise ValueError(f"Unknown executor kind `{executor}`, expected one of: {', '.join(EXECUTOR_KINDS)}")
+
+    with pool:
+        futures = {submit(plan): plan for plan in plans}
+        for future in as_completed(futures):
+            _collect(result, snapshot, futures[future], on_generated, future.result)
+    return result
+
+
+_worker_snapshot: Optional[TemplateSnapshot] = None
+
+
+def _init_worker(snapshot: TemplateSnapshot) -> None:
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+
+def _run_region_in_worker(template: PowerBiTemplateConfig, plan: ExpectedPbiReportInfo, output_mode: str, previous: Optional[Mapping[str, List[str]]] = None) -> Tuple[Dict[str, bytes], Dict[str, bytes]]:
+    return _run_region(template, _worker_snapshot, plan, output_mode, previous)
 
-def create_model_and_report(template: PowerBiTemplateConfig, plans: List[ExpectedPbiReportInfo]) -> None:
-    for plan in plans:
-        _create_or_update_model(template, plan)
-        _create_or_update_report(template, plan)
 
+def _collect(result: GenerationResult, snapshot: TemplateSnapshot, plan: ExpectedPbiReportInfo, on_generated, fn, *args) -> None:
+    try:
+        model_overlay, report_overlay = fn(*args)
+    except Exception as exc:
+        result.failures[plan.region_code] = f"{type(exc).__name__}: {exc}"
+        return
 
-def _create_or_update_model(template: PowerBiTemplateConfig, plan: ExpectedPbiReportInfo) -> None:
+    rendered = RenderedRegion(snapshot, model_overlay, report_overlay)
+    result.generated.append(plan.region_code)
+    result.rendered[plan.region_code] = rendered
+    if on_generated:
+        on_generated(plan, rendered)
 
-    existing_logical_id: Optional[str] = None
 
-    if getattr(plan, "model_exist", False) and plan.model_platform.exists():
-        old_platform = load_json(plan.model_platform)
-        existing_logical_id = old_platform.get("config", {}).get("logicalId")
+def _run_region(template: PowerBiTemplateConfig, snapshot: TemplateSnapshot, plan: ExpectedPbiReportInfo, output_mode: str = "copy", previous: Optional[Mapping[str, List[str]]] = None) -> Tuple[Dict[str, bytes], Dict[str, bytes]]:
+    previous = previous or {}
+    with span("generate.region", region=plan.region_code):
+        with span("generate.render"):
+            rendered = render_region(template, snapshot, plan)
+        with span("generate.write", output_mode=output_mode):
+            write_region_tree(plan.expected_model_path, template.template_model, snapshot.model_files, rendered.model_overlay, output_mode, previous.get("model", ()))
+            write_region_tree(plan.expected_report_path, template.template_report, snapshot.report_files, rendered.report_overlay, output_mode, previous.get("report", ()))
+    return rendered.model_overlay, rendered.report_overlay
 
 
-    shutil.copytree(template.template_model, plan.expected_model_path, dirs_exist_ok=True)
+def render_region(template: PowerBiTemplateConfig, snapshot: TemplateSnapshot, plan: ExpectedPbiReportInfo) -> RenderedRegion:
+    return RenderedRegion(
+        snapshot,
+        model_overlay=_render_model_overlay(template, snapshot, plan),
+        report_overlay=_render_report_overlay(snapshot, plan),
+    )
 
-    get_update_model_platform(plan, existing_logical_id)
-    get_update_model_definition(template, plan)
 
+def _rel(path: Path, root: Path) -> str:
+    return path.relative_to(root).as_posix()
 
-def _create_or_update_report(template: PowerBiTemplateConfig, plan: ExpectedPbiReportInfo) -> None:
 
-    existing_logical_id: Optional[str] = None
+def _existing_logical_id(exists: bool, platform_path: Path) -> Optional[str]:
+    if exists and platform_path.exists():
+        old_platform = load_json(platform_path)
+        return old_platform.get("config", {}).get("logicalId")
+    return None
 
-    if getattr(plan, "report_exist", False) and plan.expected_report_platform.exists():
-        old_platform = load_json(plan.expected_report_platform)
-        existing_logical_id = old_platform.get("config", {}).get("logicalId")
 
-    shutil.copytree(template.template_report, plan.expected_report_path, dirs_exist_ok=True)
+def _render_model_overlay(template: PowerBiTemplateConfig, snapshot: TemplateSnapshot, plan: ExpectedPbiReportInfo) -> Dict[str, Optional[bytes]]:
+    existing_logical_id = _existing_logical_id(getattr(plan, "model_exist", False), plan.model_platform)
 
-    get_update_report_platform(plan, existing_logical_id)
-    _update_report_definition(plan)
+    platform_rel = _rel(plan.model_platform, plan.expected_model_path)
+    definition_rel = _rel(plan.model_definition, plan.expected_model_path)
+    overlay = {
+        platform_rel: render_model_platform(snapshot.model_files[platform_rel], plan, existing_logical_id),
+    }
+    overlay.update(snapshot.model_index.render_parameters(model_parameter_values(template, plan)))
+    policies = parse_policies(plan.settings)
+    region_predicates = parse_region_predicates(template.region_predicates)
+    overlay.update(render_region_predicates(snapshot.model_index, overlay, region_predicates, template.parameter_name, policies))
+    overlay.update(render_incremental_refresh(snapshot.model_index, overlay, definition_rel, policies))
+
+    slimming_options = parse_slimming_options(plan.settings)
+    if slimming_options:
+        slimming = render_model_slimming(snapshot.model_files, overlay, snapshot.report_files, slimming_options, extra_columns=[(p.table, p.date_column) for p in policies])
+        overlay.update(slimming.overlay)
+        log(f"[{plan.region_code}] Model slimming {slimming.report.summary()}")
+    return overlay
+
+
+def _render_report_overlay(snapshot: TemplateSnapshot, plan: ExpectedPbiReportInfo) -> Dict[str, bytes]:
+    existing_logical_id = _existing_logical_id(getattr(plan, "report_exist", False), plan.expected_report_platform)
+
+    platform_rel = _rel(plan.expected_report_platform, plan.expected_report_path)
+    definition_rel = _rel(plan.expected_report_definition, plan.expected_report_path)
+    return {
+        platform_rel: render_report_platform(snapshot.report_files[platform_rel], plan, existing_logical_id),
+        definition_rel: _render_report_definition(snapshot.report_files[definition_rel], plan),
+    }
 
 
 def _generate_region_logical_id(plan: ExpectedPbiReportInfo, kind: str) -> str:
@@ -51,8 +167,8 @@ def _generate_region_logical_id(plan: ExpectedPbiReportInfo, kind: str) -> str:
     return str(uuid.uuid5(LOGICAL_ID_NAMESPACE, name_for_id))
 
 
-def get_update_model_platform(plan: ExpectedPbiReportInfo, existing_logical_id: Optional[str]) -> None:
-    platform = ensure_platform_structure(load_json(plan.model_platform))
+def render_model_platform(content: bytes, plan: ExpectedPbiReportInfo, existing_logical_id: Optional[str]) -> bytes:
+    platform = ensure_platform_structure(json.loads(content))
 
     platform["config"]["displayName"] = plan.report_name
     platform["metadata"]["displayName"] = plan.report_name
@@ -62,21 +178,21 @@ def get_update_model_platform(plan: ExpectedPbiReportInfo, existing_logical_id:
     else:
         platform["config"]["logicalId"] = _generate_region_logical_id(plan, kind="model")
 
-    save_json(plan.model_platform, platform)
+    return json_to_bytes(platform)
 
 
-def get_update_model_definition(template: PowerBiTemplateConfig, plan: ExpectedPbiReportInfo) -> None:
-    with plan.model_definition.open("r", encoding="utf-8") as f:
-        txt = f.read()
+def model_parameter_values(template: PowerBiTemplateConfig, plan: ExpectedPbiReportInfo) -> Dict[str, Any]:
+    """
+    The template parameter gets the region code; "parameters" in the region settings set any
+    other model parameter (or override it), e.g. {"MENAT": {"parameters": {"Currency": "USD"}}}.
+    """
+    values: Dict[str, Any] = {template.parameter_name: plan.region_code}
+    values.update(plan.settings.get("parameters") or {})
+    return values
 
-    txt = txt.replace(template.template_model_parameter, plan.region_code)
 
-    with plan.model_definition.open("w", encoding="utf-8") as f:
-        f.write(txt)
-
-
-def get_update_report_platform(plan: ExpectedPbiReportInfo, existing_logical_id: Optional[str]) -> None:
-    platform = ensure_platform_structure(load_json(plan.expected_report_platform))
+def render_report_platform(content: bytes, plan: ExpectedPbiReportInfo, existing_logical_id: Optional[str]) -> bytes:
+    platform = ensure_platform_structure(json.loads(content))
 
     platform["config"]["displayName"] = plan.report_name
     platform["metadata"]["displayName"] = plan.report_name
@@ -86,17 +202,15 @@ def get_update_report_platform(plan: ExpectedPbiReportInfo, existing_logical_id:
     else:
         platform["config"]["logicalId"] = _generate_region_logical_id(plan, kind="report")
 
-    save_json(plan.expected_report_platform, platform)
-
+    return json_to_bytes(platform)
 
-def _update_report_definition(plan: ExpectedPbiReportInfo) -> None:
 
-    path = Path(plan.expected_report_definition)
-    definition = load_json(path)
+def _render_report_definition(content: bytes, plan: ExpectedPbiReportInfo) -> bytes:
+    definition = json.loads(content)
 
     model_folder_name = plan.expected_model_path.name
     relative_path = Path("..") / model_folder_name
 
     definition["datasetReference"]["byPath"]["path"] = relative_path.as_posix()
 
-    save_json(path, definition)
+    return json_to_bytes(definition)
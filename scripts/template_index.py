@@ -0,0 +1,122 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import tmdl
+from utils import decode_text
+
+
+TABLES_DIR = "definition/tables/"
+
+# `expression Name = ` up to the parameter value.
+_EXPRESSION_DECLARATION = re.compile(r"\s*expression\s+(?:'(?:[^']|'')*'|[^\s=]+)\s*=\s*")
+
+# Parameter value: a text literal, or any other M literal (number, #date(...), true) up to `meta [`.
+_PARAMETER_VALUE = re.compile(r'"(?:[^"]|"")*"|[^\s"].*?(?=\s+meta\s*\[)')
+
+
+@dataclass(frozen=True)
+class ParameterSpan:
+    """
+    Location of a parameter's current value (the literal before `meta [...]`) in a model file.
+    """
+    name: str
+    rel_path: str
+    start: int
+    end: int
+    value: str
+    is_text: bool
+
+
+def m_text(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def find_parameter(doc: tmdl.TmdlDocument, obj: tmdl.TmdlObject, rel_path: str = "") -> Optional[ParameterSpan]:
+    """
+    The value span of `obj` when it is a parameter expression (`meta [IsParameterQuery=true, ...]`).
+    """
+    if obj.kind != "expression" or "IsParameterQuery=true" not in obj.expression.replace(" ", ""):
+        return None
+    line = doc.lines[obj.start]
+    declaration = _EXPRESSION_DECLARATION.match(line)
+    value = _PARAMETER_VALUE.match(line, declaration.end()) if declaration else None
+    if not value:
+        return None
+    literal = value.group(0)
+    is_text = literal.startswith('"')
+    return ParameterSpan(
+        name=obj.name,
+        rel_path=rel_path,
+        start=doc.offset(obj.start, value.start()),
+        end=doc.offset(obj.start, value.end()),
+        value=literal[1:-1].replace('""', '"') if is_text else literal,
+        is_text=is_text,
+    )
+
+
+class TemplateIndex:
+    """
+    Expressions, tables, partitions and measures of the template model, parsed once per run,
+    with the location of every parameter value so regions are rendered by substitution.
+    """
+
+    def __init__(self, model_files: Mapping[str, bytes]) -> None:
+        self.texts: Dict[str, str] = {}
+        self.documents: Dict[str, tmdl.TmdlDocument] = {}
+        self.expressions: Dict[str, Tuple[str, tmdl.TmdlObject]] = {}
+        self.tables: Dict[str, Tuple[str, tmdl.TmdlObject]] = {}
+        self.partitions: Dict[str, Tuple[str, tmdl.TmdlObject]] = {}
+        self.measures: Dict[Tuple[str, str], Tuple[str, tmdl.TmdlObject]] = {}
+        self.parameters: Dict[str, ParameterSpan] = {}
+
+        for rel_path, content in sorted(model_files.items()):
+            if not rel_path.endswith(".tmdl"):
+                continue
+            text = decode_text(content)
+            doc = tmdl.parse(text)
+            self.texts[rel_path] = text
+            self.documents[rel_path] = doc
+            for obj in doc.objects:
+                if obj.kind == "expression":
+                    self.expressions[obj.name] = (rel_path, obj)
+                    parameter = find_parameter(doc, obj, rel_path)
+                    if parameter:
+                        self.parameters[obj.name] = parameter
+                elif obj.kind == "table":
+                    self.tables[obj.name] = (rel_path, obj)
+                    for partition in obj.iter("partition"):
+                        self.partitions[partition.name] = (rel_path, partition)
+                    for measure in obj.iter("measure"):
+                        self.measures[(obj.name, measure.name)] = (rel_path, measure)
+
+    def table_file(self, table: str) -> str:
+        if table not in self.tables:
+            raise ValueError(f"Table `{table}` not found in the template model")
+        return self.tables[table][0]
+
+    def render_parameters(self, values: Mapping[str, Any]) -> Dict[str, bytes]:
+        """
+        Files holding the given parameters, with each value written over its indexed span only.
+        Every file is rebuilt in one pass, whatever the number of parameters.
+        """
+        unknown = sorted(set(values) - set(self.parameters))
+        if unknown:
+            raise ValueError(f"Unknown model parameter(s): {', '.join(unknown)}")
+
+        edits: Dict[str, List[Tuple[int, int, str]]] = {}
+        for name, value in values.items():
+            span = self.parameters[name]
+            literal = m_text(str(value)) if span.is_text else str(value)
+            edits.setdefault(span.rel_path, []).append((span.start, span.end, literal))
+
+        result: Dict[str, bytes] = {}
+        for rel_path, file_edits in edits.items():
+            text = self.texts[rel_path]
+            pieces, position = [], 0
+            for start, end, literal in sorted(file_edits):
+                pieces += [text[position:start], literal]
+                position = end
+            pieces.append(text[position:])
+            result[rel_path] = "".join(pieces).encode("utf-8")
+        return result
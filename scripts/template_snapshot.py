@@ -0,0 +1,63 @@
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional, Tuple
+
+from config_reader import PowerBiTemplateConfig
+from template_index import TemplateIndex
+
+
+def read_tree(root: Path) -> Mapping[str, bytes]:
+    files = {
+        p.relative_to(root).as_posix(): p.read_bytes()
+        for p in root.rglob("*")
+        if not p.is_dir()
+    }
+    return MappingProxyType(dict(sorted(files.items())))
+
+
+@dataclass(frozen=True)
+class TemplateSnapshot:
+    """
+    Contents of the template model and report folders, keyed by path relative to each folder.
+    Loaded once per run and never modified; regions are rendered as overlays on top of it.
+    """
+    model_files: Mapping[str, bytes]
+    report_files: Mapping[str, bytes]
+
+    @cached_property
+    def model_index(self) -> TemplateIndex:
+        return TemplateIndex(self.model_files)
+
+
+def load_template_snapshot(template: PowerBiTemplateConfig) -> TemplateSnapshot:
+    return TemplateSnapshot(
+        model_files=read_tree(template.template_model),
+        report_files=read_tree(template.template_report),
+    )
+
+
+@dataclass
+class RenderedRegion:
+    """
+    One region rendered in memory: the template files plus the few files rewritten for the region.
+    An overlay entry of None removes the template file from the region.
+    """
+    snapshot: TemplateSnapshot
+    model_overlay: Dict[str, Optional[bytes]] = field(default_factory=dict)
+    report_overlay: Dict[str, Optional[bytes]] = field(default_factory=dict)
+
+    def model_parts(self) -> Iterator[Tuple[str, bytes]]:
+        return _merge(self.snapshot.model_files, self.model_overlay)
+
+    def report_parts(self) -> Iterator[Tuple[str, bytes]]:
+        return _merge(self.snapshot.report_files, self.report_overlay)
+
+
+def _merge(base: Mapping[str, bytes], overlay: Mapping[str, Optional[bytes]]) -> Iterator[Tuple[str, bytes]]:
+    for rel_path in sorted(set(base) | set(overlay)):
+        content = overlay[rel_path] if rel_path in overlay else base[rel_path]
+        if content is not None:
+            yield rel_path, content
+
@@ -0,0 +1,203 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Declarations that open a TMDL object; every other line at object level is a property.
+OBJECT_KEYWORDS = frozenset({
+    "annotation", "calculationGroup", "calculationItem", "column", "culture", "cultureInfo", "database",
+    "dataAccessOptions", "expression", "extendedProperty", "formatStringDefinition", "hierarchy", "kpi",
+    "level", "linguisticMetadata", "measure", "model", "partition", "perspective", "queryGroup", "ref",
+    "refreshPolicy", "relationship", "role", "table", "tablePermission", "variation",
+})
+
+_NAME = re.compile(r"'(?:[^']|'')*'|[^\s=]+")
+
+
+def unquote(name: str) -> str:
+    name = name.strip()
+    if len(name) >= 2 and name[0] == "'" and name[-1] == "'":
+        return name[1:-1].replace("''", "'")
+    return name
+
+
+def quote(name: str) -> str:
+    """
+    Name as written in TMDL: bare when it is a plain identifier, single-quoted otherwise.
+    """
+    return name if re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name) else "'" + name.replace("'", "''") + "'"
+
+
+def depth(line: str) -> int:
+    return len(line) - len(line.lstrip("\t"))
+
+
+@dataclass
+class TmdlObject:
+    """
+    One object of a TMDL document: `kind name [= expression]` with its properties and child
+    objects. `start`/`end` are the document lines it spans, trailing blank lines included.
+    """
+    kind: str
+    name: str
+    start: int
+    end: int
+    depth: int
+    expression: str = ""
+    properties: Dict[str, str] = field(default_factory=dict)
+    children: List["TmdlObject"] = field(default_factory=list)
+
+    def find(self, kind: str, name: Optional[str] = None) -> Optional["TmdlObject"]:
+        return next((c for c in self.children if c.kind == kind and (name is None or c.name == name)), None)
+
+    def iter(self, kind: Optional[str] = None) -> Iterator["TmdlObject"]:
+        for child in self.children:
+            if kind is None or child.kind == kind:
+                yield child
+
+    def walk(self) -> Iterator["TmdlObject"]:
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+
+@dataclass
+class TmdlDocument:
+    lines: List[str]
+    objects: List[TmdlObject]
+    _offsets: Optional[List[int]] = field(default=None, repr=False, compare=False)
+
+    def offset(self, line: int, column: int = 0) -> int:
+        """
+        Character offset in text() of `column` on `line`.
+        """
+        if self._offsets is None:
+            offsets, position = [], 0
+            for text in self.lines:
+                offsets.append(position)
+                position += len(text) + 1
+            self._offsets = offsets
+        return self._offsets[line] + column
+
+    def find(self, kind: str, name: Optional[str] = None) -> Optional[TmdlObject]:
+        return next((o for o in self.objects if o.kind == kind and (name is None or o.name == name)), None)
+
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    def property_lines(self, obj: TmdlObject, key: str) -> Optional[Tuple[int, int]]:
+        """
+        (first, end) lines of the multi-line expression of `obj`'s `key =` property, trailing blank
+        lines excluded, or None when `obj` has no such property.
+        """
+        prop_depth = obj.depth + 1
+        for i in range(obj.start + 1, obj.end):
+            line = self.lines[i]
+            if depth(line) == prop_depth and line.strip() == f"{key} =":
+                first = end = i + 1
+                while end < obj.end and (not self.lines[end].strip() or depth(self.lines[end]) >= prop_depth + 1):
+                    end += 1
+                while end > first and not self.lines[end - 1].strip():
+                    end -= 1
+                return first, end
+        return None
+
+    def without(self, removed: List[TmdlObject]) -> str:
+        """
+        Document text with the lines of the `removed` objects (which must not overlap) deleted.
+        """
+        lines = list(self.lines)
+        for obj in sorted(removed, key=lambda o: o.start, reverse=True):
+            del lines[obj.start:obj.end]
+        return "\n".join(lines)
+
+
+def _split_declaration(body: str) -> Tuple[str, str, Optional[str]]:
+    """
+    `kind name = expression` -> (kind, name, expression or None). `ref table X` keeps `table` in the name part.
+    """
+    kind, _, rest = body.partition(" ")
+    if kind == "ref":
+        ref_kind, _, rest = rest.partition(" ")
+        kind = f"ref {ref_kind}"
+    rest = rest.strip()
+    if rest.startswith("="):
+        return kind, "", rest[1:].strip()
+    match = _NAME.match(rest)
+    if not match:
+        return kind, "", None
+    name = unquote(match.group(0))
+    tail = rest[match.end():].strip()
+    if tail.startswith("="):
+        return kind, name, tail[1:].strip()
+    return kind, name, None
+
+
+def _expression_end(lines: List[str], i: int, decl_depth: int, first: str) -> Tuple[int, str]:
+    """
+    Continuation lines of an expression started on line i-1. Returns (next line, expression text).
+    """
+    parts = [first] if first and first != "```" else []
+    if first.startswith("```"):
+        while i < len(lines) and lines[i].strip() != "```":
+            parts.append(lines[i].strip("\t"))
+            i += 1
+        return min(i + 1, len(lines)), "\n".join(parts).strip()
+    while i < len(lines) and (not lines[i].strip() or depth(lines[i]) >= decl_depth + 2):
+        parts.append(lines[i].strip("\t"))
+        i += 1
+    return i, "\n".join(parts).strip()
+
+
+def _parse_block(lines: List[str], i: int, block_depth: int, end: int) -> Tuple[List[TmdlObject], Dict[str, str], int]:
+    objects: List[TmdlObject] = []
+    properties: Dict[str, str] = {}
+    while i < end:
+        line = lines[i]
+        if not line.strip():
+            i += 1
+            continue
+        d = depth(line)
+        if d < block_depth:
+            break
+        body = line.strip()
+        keyword = body.split(" ", 1)[0]
+
+        if keyword in OBJECT_KEYWORDS and not re.match(r"^\w+\s*:", body):
+            kind, name, expression = _split_declaration(body)
+            start = i
+            i += 1
+            text = ""
+            if expression is not None:
+                i, text = _expression_end(lines, i, d, expression)
+            obj_end = i
+            while obj_end < end and (not lines[obj_end].strip() or depth(lines[obj_end]) > d):
+                obj_end += 1
+            children, props, _ = _parse_block(lines, i, d + 1, obj_end)
+            objects.append(TmdlObject(kind, name, start, obj_end, d, text, props, children))
+            i = obj_end
+            continue
+
+        key, sep, value = body.partition(":")
+        if sep and not key.endswith(" ") and " =" not in key:
+            properties[key.strip()] = value.strip()
+            i += 1
+            continue
+        key, sep, value = body.partition("=")
+        if sep:
+            i, text = _expression_end(lines, i + 1, d, value.strip())
+            properties[key.strip()] = text
+            continue
+        # Boolean flags such as `isHidden`.
+        properties[body] = "true"
+        i += 1
+    return objects, properties, i
+
+
+def parse(text: str) -> TmdlDocument:
+    """
+    Parses a TMDL file (tab indented) into its objects. Expressions are kept as text.
+    """
+    lines = text.split("\n")
+    objects, _, _ = _parse_block(lines, 0, 0, len(lines))
+    return TmdlDocument(lines, objects)
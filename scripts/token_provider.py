@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+import requests
+
+
+# Refresh this long before the token expires, so requests in flight never carry an expired token.
+DEFAULT_REFRESH_MARGIN_S = 300.0
+
+
+class TokenProvider(requests.auth.AuthBase):
+    """
+    Access token of a run, cached with its lifetime and fetched again `refresh_margin_s` before it
+    expires. Thread-safe, with a single request in flight: while a token is being refreshed, other
+    callers keep using the current one, or wait for the new one once the current one has expired.
+
+    `fetch` returns the access token and its lifetime in seconds (`expires_in` of the token response).
+    Passed as `auth=` of a request, the bearer header is set each time the request is sent, so
+    requests that waited on the rate limiter or are re-sent after a 429 carry a current token.
+    """
+
+    def __init__(self, fetch: Callable[[], Tuple[str, float]], *, refresh_margin_s: float = DEFAULT_REFRESH_MARGIN_S, clock: Callable[[], float] = time.monotonic) -> None:
+        self._fetch = fetch
+        self._refresh_margin_s = refresh_margin_s
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refreshing = False
+        self.fetch_count = 0
+
+    def get(self) -> str:
+        with self._cond:
+            while True:
+                now = self._clock()
+                if self._token is not None and now < self._refresh_at:
+                    return self._token
+                if not self._refreshing:
+                    self._refreshing = True
+                    break
+                if self._token is not None and now < self._expires_at:
+                    # Someone else is refreshing; the current token is still valid.
+                    return self._token
+                self._cond.wait()
+
+        requested_at = self._clock()
+        try:
+            token, expires_in = self._fetch()
+        except BaseException:
+            with self._cond:
+                self._refreshing = False
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            # Lifetime counted from the request, not from the response.
+            self._token = token
+            self._expires_at = requested_at + expires_in
+            # Tokens shorter-lived than twice the margin are refreshed at half their lifetime.
+            self._refresh_at = requested_at + max(expires_in - self._refresh_margin_s, expires_in / 2)
+            self._refreshing = False
+            self.fetch_count += 1
+            self._cond.notify_all()
+        return token
+
+    def __call__(self, r: requests.PreparedRequest) -> requests.PreparedRequest:
+        r.headers["Authorization"] = f"Bearer {self.get()}"
+        return r
@@ -0,0 +1,168 @@
+import contextvars
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils import log
+
+
+# Tags copied from a span to the spans nested in it.
+INHERITED_TAGS = ("region", "item_type")
+
+
+@dataclass
+class Span:
+    name: str
+    category: str
+    tags: Dict[str, Any]
+    start_ns: int
+    track: str
+    end_ns: int = 0
+    sleep_s: float = 0.0
+
+    def set(self, **tags: Any) -> None:
+        self.tags.update(tags)
+
+    def add_sleep(self, seconds: float) -> None:
+        self.sleep_s += seconds
+
+
+class _NoopSpan:
+    def set(self, **tags: Any) -> None:
+        pass
+
+    def add_sleep(self, seconds: float) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Collects finished spans of one run. Spans tagged with a region are drawn on one track per
+    region (deploy work of a region hops between the event loop and worker threads), the others
+    on one track per thread.
+    """
+
+    def __init__(self) -> None:
+        self.origin_ns = time.perf_counter_ns()
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def finish(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        track_ids: Dict[str, int] = {}
+        counter = itertools.count(1)
+        events: List[Dict[str, Any]] = []
+        for s in spans:
+            if s.track not in track_ids:
+                track_ids[s.track] = next(counter)
+                events.append({"ph": "M", "name": "thread_name", "pid": 1, "tid": track_ids[s.track], "args": {"name": s.track}})
+            args = dict(s.tags)
+            if s.sleep_s:
+                args["sleep_s"] = round(s.sleep_s, 6)
+            events.append({
+                "ph": "X",
+                "name": s.name,
+                "cat": s.category,
+                "pid": 1,
+                "tid": track_ids[s.track],
+                "ts": (s.start_ns - self.origin_ns) / 1000,
+                "dur": (s.end_ns - s.start_ns) / 1000,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.chrome_trace()), encoding="utf-8")
+
+    def summary(self) -> List[Dict[str, Any]]:
+        rows: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            spans = list(self.spans)
+        for s in spans:
+            row = rows.setdefault(s.name, {"name": s.name, "category": s.category, "count": 0, "total_s": 0.0, "max_s": 0.0, "sleep_s": 0.0, "bytes_sent": 0, "errors": 0})
+            duration_s = (s.end_ns - s.start_ns) / 1e9
+            row["count"] += 1
+            row["total_s"] += duration_s
+            row["max_s"] = max(row["max_s"], duration_s)
+            row["sleep_s"] += s.sleep_s
+            row["bytes_sent"] += s.tags.get("bytes_sent") or 0
+            row["errors"] += 1 if "error" in s.tags or (s.tags.get("status") or 0) >= 400 else 0
+        return sorted(rows.values(), key=lambda r: r["total_s"], reverse=True)
+
+    def log_summary(self) -> None:
+        log(f"{'span':<40} {'count':>6} {'total s':>9} {'max s':>8} {'sleep s':>8} {'sent MB':>8} {'errors':>6}")
+        for r in self.summary():
+            log(f"{r['name']:<40} {r['count']:>6} {r['total_s']:>9.2f} {r['max_s']:>8.2f} {r['sleep_s']:>8.2f} {r['bytes_sent'] / 1e6:>8.2f} {r['errors']:>6}")
+
+
+_tracer: Optional[Tracer] = None
+
+
+def enable() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def disable() -> None:
+    global _tracer
+    _tracer = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+@contextmanager
+def span(name: str, category: str = "phase", **tags: Any) -> Iterator[Any]:
+    """
+    Times the enclosed block as a span nested in the current one. Does nothing (and costs next
+    to nothing) unless tracing is enabled.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield _NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    if parent is not None:
+        tags = {**{k: parent.tags[k] for k in INHERITED_TAGS if k in parent.tags}, **tags}
+    track = f"region {tags['region']}" if "region" in tags else f"thread {threading.current_thread().name}"
+    s = Span(name, category, tags, time.perf_counter_ns(), track)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as exc:
+        s.tags["error"] = type(exc).__name__
+        raise
+    finally:
+        s.end_ns = time.perf_counter_ns()
+        _current_span.reset(token)
+        tracer.finish(s)
+
+
+def record_sleep(seconds: float) -> None:
+    """
+    Adds time spent sleeping (backoff, throttling, polling) to the current span.
+    """
+    if _tracer is None:
+        return
+    s = _current_span.get()
+    if s is not None:
+        s.add_sleep(seconds)
@@ -32,6 +32,16 @@ def save_json(path: Path | str, data: Dict[str, Any]) -> None:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
 
+def json_to_bytes(data: Dict[str, Any]) -> bytes:
+    # Same formatting as save_json.
+    return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+
+def decode_text(content: bytes, encoding: str = "utf-8") -> str:
+    # Same newline handling as reading the file in text mode.
+    return content.decode(encoding).replace("\r\n", "\n").replace("\r", "\n")
+
+
 @lru_cache(maxsize=None)
 def _load_data_cached(path_str: str) -> Dict[str, Any]:
     path = Path(path_str)
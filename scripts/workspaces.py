@@ -0,0 +1,126 @@
+import hashlib
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from models_manager import REGION_CONFIG_FILE, get_region_settings
+from utils import get_nested, load_data
+
+
+SHARDING_MODES = ("hash", "round_robin")
+
+DEFAULT_WORKSPACE = "default"
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """
+    A Fabric workspace regions are deployed to, with its own deploy and refresh concurrency
+    budget (None: the run-wide setting). Workspaces on different capacities do not slow each other down.
+    """
+    name: str
+    workspace_id: str
+    deploy_concurrency: Optional[int] = None
+    refresh_concurrency: Optional[int] = None
+
+
+def parse_workspace_catalog(config: Mapping[str, Any]) -> Dict[str, Workspace]:
+    """
+    Workspaces from the "workspaces" section of the region config, e.g.
+    {"emea": {"id": "<workspace id>", "deploy_concurrency": 4, "refresh_concurrency": 2},
+     "apac": {"id_env": "FABRIC_WORKSPACE_APAC"}}. "id_env" reads the id from an environment variable.
+    """
+    catalog = {}
+    for name, cfg in sorted((config or {}).items()):
+        cfg = cfg or {}
+        workspace_id = cfg.get("id") or (os.getenv(cfg["id_env"]) if cfg.get("id_env") else None)
+        if not workspace_id:
+            source = f"environment variable {cfg['id_env']}" if cfg.get("id_env") else '"id"'
+            raise ValueError(f"Workspace `{name}` has no id (set {source})")
+        catalog[name] = Workspace(
+            name=name,
+            workspace_id=workspace_id,
+            deploy_concurrency=int(cfg["deploy_concurrency"]) if cfg.get("deploy_concurrency") else None,
+            refresh_concurrency=int(cfg["refresh_concurrency"]) if cfg.get("refresh_concurrency") else None,
+        )
+    return catalog
+
+
+def _rendezvous(region_code: str, names: Iterable[str]) -> str:
+    # Highest random weight: adding a workspace only moves the regions that now hash to it.
+    return max(names, key=lambda name: hashlib.sha256(f"{name}\0{region_code}".encode("utf-8")).hexdigest())
+
+
+def assign_workspaces(regions: List[str], catalog: Mapping[str, Workspace], region_settings: Mapping[str, Mapping[str, Any]], sharding: str = "hash") -> Dict[str, Workspace]:
+    """
+    Workspace of every region: the "workspace" of its region settings when set, otherwise by
+    `sharding` over the catalog, "hash" (stable per region) or "round_robin" (in region list order).
+    """
+    if sharding not in SHARDING_MODES:
+        raise ValueError(f"Unknown workspace sharding `{sharding}`, expected one of: {', '.join(SHARDING_MODES)}")
+    names = sorted(catalog)
+    assignment: Dict[str, Workspace] = {}
+    unpinned = []
+    for region in regions:
+        pinned = (region_settings.get(region) or {}).get("workspace")
+        if pinned is None:
+            unpinned.append(region)
+        elif pinned not in catalog:
+            raise ValueError(f"Region `{region}` is assigned to unknown workspace `{pinned}`, expected one of: {', '.join(names)}")
+        else:
+            assignment[region] = catalog[pinned]
+    for i, region in enumerate(unpinned):
+        name = _rendezvous(region, names) if sharding == "hash" else names[i % len(names)]
+        assignment[region] = catalog[name]
+    return assignment
+
+
+@dataclass
+class WorkspaceAssignment:
+    """
+    Region -> workspace mapping of a run. Without a "workspaces" section every region goes to
+    the single workspace of FABRIC_WORKSPACE_ID, as `default`.
+    """
+    regions: Dict[str, Workspace] = field(default_factory=dict)
+    catalog: Dict[str, Workspace] = field(default_factory=dict)
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.catalog)
+
+    def for_region(self, region_code: str, default_workspace_id: str = "") -> Workspace:
+        if region_code in self.regions:
+            return self.regions[region_code]
+        if self.configured:
+            # Regions outside the config (e.g. added by a caller) are sharded by hash.
+            return self.catalog[_rendezvous(region_code, sorted(self.catalog))]
+        return Workspace(DEFAULT_WORKSPACE, default_workspace_id)
+
+
+def load_workspace_assignment(region_config_path: Path | str = REGION_CONFIG_FILE) -> WorkspaceAssignment:
+    data = load_data(region_config_path)
+    catalog = parse_workspace_catalog(get_nested(data, "workspaces", default={}))
+    if not catalog:
+        return WorkspaceAssignment()
+    regions = assign_workspaces(
+        data.get("regions", []),
+        catalog,
+        get_region_settings(region_config_path),
+        get_nested(data, "workspace_sharding", default="hash"),
+    )
+    return WorkspaceAssignment(regions, catalog)
+
+
+def interleave(plan: List[Any], assignment: WorkspaceAssignment, default_workspace_id: str = "") -> List[Any]:
+    """
+    Plan reordered to alternate between workspaces, so the first regions in flight spread over
+    every workspace instead of queueing on the budget of the first one.
+    """
+    queues: Dict[str, List[Any]] = {}
+    for item in plan:
+        queues.setdefault(assignment.for_region(item.region_code, default_workspace_id).name, []).append(item)
+    ordered = []
+    for i in range(max((len(q) for q in queues.values()), default=0)):
+        ordered.extend(q[i] for q in queues.values() if i < len(q))
+    return ordered